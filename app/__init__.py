@@ -1,11 +1,22 @@
 import os
 from flask import Flask
-from app.models import db, User
+from app.models import db
 from app.routes.auth import auth_bp
 from app.routes.admin import admin_bp
 from app.routes.doctor import doctor_bp
 from app.routes.patient import patient_bp
 from app.api import api_bp
+from app.async_api import async_api_bp
+from app.search import rebuild_search_index_command
+from app.migrations import init_db_command, create_admin_command, upgrade_indexes_command, explain_indexes_command
+from app.booking import rebuild_slots_command
+from app.bulk_import import import_users_command
+from app.exports import export_command
+from app.lifecycle import lifecycle_command
+from app.stats import rebuild_stats_command
+from app.identity import load_identity
+from app import database, hashing, instrumentation, metrics
+from app.hashing import HashingBusy
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
 from dotenv import load_dotenv
 
@@ -16,13 +27,44 @@ def create_app():
     app=Flask(__name__)
     app.config["SQLALCHEMY_DATABASE_URI"] = os.getenv("SQLALCHEMY_DATABASE_URI")
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = os.getenv("SQLALCHEMY_TRACK_MODIFICATIONS") == "True"
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = database.engine_options(app.config["SQLALCHEMY_DATABASE_URI"])
+    app.config["ASYNC_DATABASE_URI"] = os.getenv("ASYNC_DATABASE_URI")  # unset = derived from the URI above
+    if os.getenv("DATABASE_REPLICA_URI"):
+        # Read-only views are served from here; see app.database
+        app.config["SQLALCHEMY_BINDS"] = {database.REPLICA_BIND: os.getenv("DATABASE_REPLICA_URI")}
     app.config["SECRET_KEY"] = os.getenv("SECRET_KEY")
+    app.config["PASSWORD_HASH_METHOD"] = os.getenv("PASSWORD_HASH_METHOD", "scrypt")
+    app.config["HASH_WORKERS"] = os.getenv("HASH_WORKERS")  # unset = CPUs / WEB_CONCURRENCY, 0 = hash inline
+    app.config["HASH_QUEUE_SIZE"] = os.getenv("HASH_QUEUE_SIZE")
+    app.config["API_BATCH_MAX"] = int(os.getenv("API_BATCH_MAX", 1000))
+    app.config["IMPORT_MAX_BYTES"] = int(os.getenv("IMPORT_MAX_BYTES", 5 * 1024 * 1024))
+    app.config["SQL_INSTRUMENTATION"] = os.getenv("SQL_INSTRUMENTATION", "True") == "True"
+    app.config["SQL_SLOW_MS"] = float(os.getenv("SQL_SLOW_MS", 100))
+    app.config["SQL_LOG_LEVEL"] = os.getenv("SQL_LOG_LEVEL", "INFO")
+    app.config["SQL_NPLUSONE_THRESHOLD"] = int(os.getenv("SQL_NPLUSONE_THRESHOLD", 5))
+    app.config["METRICS_DIR"] = os.getenv("METRICS_DIR")  # shared by all workers; unset = this process only
 
     app.register_blueprint(auth_bp)
     app.register_blueprint(admin_bp)
     app.register_blueprint(doctor_bp)
     app.register_blueprint(patient_bp)
     app.register_blueprint(api_bp)
+    app.register_blueprint(async_api_bp)
+    metrics.init_app(app)
+
+    hashing.configure(app)
+    app.register_error_handler(HashingBusy, lambda e: ("Server is busy, please try again.", 503, {"Retry-After": "2"}))
+
+    app.cli.add_command(init_db_command)
+    app.cli.add_command(create_admin_command)
+    app.cli.add_command(rebuild_search_index_command)
+    app.cli.add_command(upgrade_indexes_command)
+    app.cli.add_command(explain_indexes_command)
+    app.cli.add_command(rebuild_slots_command)
+    app.cli.add_command(import_users_command)
+    app.cli.add_command(export_command)
+    app.cli.add_command(lifecycle_command)
+    app.cli.add_command(rebuild_stats_command)
 
     login_manager = LoginManager()
     login_manager.init_app(app)
@@ -32,13 +74,15 @@ def create_app():
 
     @login_manager.user_loader
     def load_user(user_id):
-        return User.query.get(int(user_id))
+        return load_identity(int(user_id))
 
 
 
+    # No database I/O here: engines connect lazily, so a preloaded app can be
+    # forked into workers. Schema and admin setup are the init-db and
+    # create-admin commands.
     db.init_app(app)
-    with app.app_context():
-        db.create_all()
-        User.make_admin()
-    
+    database.init_app(app)
+    instrumentation.init_app(app)
+
     return app
\ No newline at end of file
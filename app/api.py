@@ -1,21 +1,47 @@
-from flask import Blueprint, request, jsonify
-from app.models import db, User, Patient, Doctor, Appointment, AP_Status, Doc_Status, UserRole
-from werkzeug.security import generate_password_hash
+from flask import Blueprint, request, jsonify, current_app
+from app.models import db, User, Patient, Doctor, Department, Appointment, AP_Status, Doc_Status, UserRole, \
+    Treatment
+from app.pagination import keyset_paginate
+from app import booking, history, schedules, stats, versions
+from datetime import date, datetime
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload, selectinload
+from app.hashing import hash_password
+from app.database import reads_from_replica
 
 api_bp = Blueprint("api_bp", __name__, url_prefix="/api/v1")
 
 # ---------------- DOCTOR API ----------------
 
-@api_bp.route("/doctors", methods=["GET"])
-def get_doctors():
-    """Retrieve all available doctors."""
-    doctors = Doctor.query.all()
-    return jsonify([{
+def doctor_json(d):
+    return {
         "id": d.id,
         "name": d.full_name,
         "specialization": d.department.name,
         "status": d.status.name
-    } for d in doctors]), 200
+    }
+
+def appointment_json(appt):
+    return {
+        "patient": appt.patient.full_name,
+        "doctor": appt.doctor.full_name,
+        "date": appt.date.isoformat(),
+        "status": appt.status.name
+    }
+
+@api_bp.route("/doctors", methods=["GET"])
+@reads_from_replica
+@versions.conditional("doctors", cache_control="public, max-age=0, must-revalidate")
+def get_doctors():
+    """Retrieve doctors, one keyset page at a time (?limit=, ?after=, ?before=)."""
+    doctors = keyset_paginate(
+        Doctor.query.options(joinedload(Doctor.department)), Doctor.id
+    )
+    return jsonify({
+        "doctors": [doctor_json(d) for d in doctors],
+        **doctors.to_dict()
+    }), 200
 
 @api_bp.route("/doctors", methods=["POST"])
 def create_doctor():
@@ -24,7 +50,7 @@ def create_doctor():
     # Create User first
     user = User(
         email=data['email'],
-        password=generate_password_hash(data['password']),
+        password=hash_password(data['password']),
         role=UserRole.DOCTOR
     )
     db.session.add(user)
@@ -44,15 +70,11 @@ def create_doctor():
 # ---------------- APPOINTMENT API ----------------
 
 @api_bp.route("/appointments/<int:id>", methods=["GET"])
+@versions.conditional("appointments", cache_control="private, no-cache")
 def get_appointment(id):
     """Retrieve a single appointment's details."""
     appt = Appointment.query.get_or_404(id)
-    return jsonify({
-        "patient": appt.patient.full_name,
-        "doctor": appt.doctor.full_name,
-        "date": appt.date.isoformat(),
-        "status": appt.status.name
-    }), 200
+    return jsonify(appointment_json(appt)), 200
 
 @api_bp.route("/appointments/<int:id>", methods=["PUT"])
 def update_appointment(id):
@@ -60,18 +82,258 @@ def update_appointment(id):
     appt = Appointment.query.get_or_404(id)
     data = request.json
     
-    if "status" in data:
-        appt.status = AP_Status[data["status"]]
-    if "date" in data:
-        appt.date = data["date"]
+    try:
+        if "status" in data:
+            booking.change_status(appt, AP_Status[data["status"]])
+        if "date" in data:
+            booking.move_to_date(appt, date.fromisoformat(data["date"]))
+    except booking.SlotInvalid as e:
+        db.session.rollback()
+        return jsonify({"message": str(e)}), 400
+    except booking.SlotUnavailable as e:
+        db.session.rollback()
+        return jsonify({"message": str(e)}), 409
         
     db.session.commit()
+    history.invalidate(appt.patient_id)
     return jsonify({"message": "Appointment updated"}), 200
 
 @api_bp.route("/appointments/<int:id>", methods=["DELETE"])
 def delete_appointment(id):
     """Hard delete an appointment record."""
     appt = Appointment.query.get_or_404(id)
+    patient_id = appt.patient_id
+    booking.discard(appt)
     db.session.delete(appt)
     db.session.commit()
-    return jsonify({"message": "Appointment deleted"}), 204
\ No newline at end of file
+    history.invalidate(patient_id)
+    return jsonify({"message": "Appointment deleted"}), 204
+
+# ---------------- BATCH APPOINTMENT API ----------------
+
+def _item_result(index, status, **extra):
+    return {"index": index, "status": status, **extra}
+
+def _is_id(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+def _batch_create(items):
+    """Validate and claim each item's slot, then insert every valid row with one executemany."""
+    results = [None] * len(items)
+    items = [item if isinstance(item, dict) else {} for item in items]
+    doctor_ids = {item.get("doctor_id") for item in items if isinstance(item.get("doctor_id"), str)}
+    doctors = {d.id: d for d in Doctor.query.options(selectinload(Doctor.schedule))
+               .filter(Doctor.id.in_(doctor_ids))}
+    patient_ids = {item.get("patient_id") for item in items if _is_id(item.get("patient_id"))}
+    patients = set(db.session.scalars(select(Patient.id).where(Patient.id.in_(patient_ids))))
+    rows, row_indexes = [], []
+
+    for i, item in enumerate(items):
+        doctor = doctors.get(item.get("doctor_id"))
+        if doctor is None or doctor.status != Doc_Status.AVAILABLE:
+            results[i] = _item_result(i, 404, message="Doctor not found or unavailable")
+            continue
+        if item.get("patient_id") not in patients:
+            results[i] = _item_result(i, 400, message="patient_id must be an existing patient")
+            continue
+        try:
+            day = date.fromisoformat(item["date"])
+            starts = datetime.strptime(item["time"], "%H:%M").time()
+        except (KeyError, TypeError, ValueError):
+            results[i] = _item_result(i, 400, message="date (YYYY-MM-DD) and time (HH:MM) are required")
+            continue
+        schedule = booking.schedule_for(doctor)
+        slot = booking.slot_for_time(schedule, starts)
+        if slot is None:
+            results[i] = _item_result(i, 400, message="Not one of the doctor's slots")
+            continue
+        try:
+            starts_at = booking.check_slot(schedule, day, slot)
+        except booking.SlotInvalid as e:
+            results[i] = _item_result(i, 400, message=str(e))
+            continue
+        if not booking.claim_slot(doctor.id, day, slot):
+            results[i] = _item_result(i, 409, message="Slot already taken")
+            continue
+        rows.append({
+            "patient_id": item["patient_id"],
+            "doctor_id": doctor.id,
+            "date": day,
+            "time": starts_at,
+            "slot": slot,
+            "status": AP_Status.BOOKED,
+        })
+        row_indexes.append(i)
+
+    if rows:
+        schedules.invalidate((row["doctor_id"], row["date"]) for row in rows)
+        ids = db.session.execute(
+            insert(Appointment).returning(Appointment.id, sort_by_parameter_order=True), rows
+        ).scalars().all()
+        stats.add_appointments((row["doctor_id"], row["date"], row["status"]) for row in rows)
+        for i, appt_id in zip(row_indexes, ids):
+            results[i] = _item_result(i, 201, id=appt_id)
+    return results
+
+def _batch_update(items):
+    """Set-based status changes: one UPDATE ... WHERE id IN (...) per target status."""
+    results = [None] * len(items)
+    items = [item if isinstance(item, dict) else {} for item in items]
+    ids = [item.get("id") for item in items if _is_id(item.get("id"))]
+    current = {
+        row.id: row for row in db.session.query(
+            Appointment.id, Appointment.patient_id, Appointment.doctor_id,
+            Appointment.date, Appointment.slot, Appointment.status
+        ).filter(Appointment.id.in_(ids))
+    }
+    by_status, released, moved, touched_patients = {}, [], [], set()
+
+    for i, item in enumerate(items):
+        if not _is_id(item.get("id")):
+            results[i] = _item_result(i, 400, message="id must be an integer")
+            continue
+        row = current.get(item["id"])
+        if row is None:
+            results[i] = _item_result(i, 404, id=item.get("id"), message="Appointment not found")
+            continue
+        if item.get("status") not in AP_Status.__members__:
+            results[i] = _item_result(i, 400, id=row.id, message="Unknown status")
+            continue
+        new_status = AP_Status[item["status"]]
+        if row.slot is not None and new_status != row.status:
+            if new_status == AP_Status.CANCELLED:
+                released.append((row.doctor_id, row.date, row.slot))
+            elif row.status == AP_Status.CANCELLED and not booking.claim_slot(row.doctor_id, row.date, row.slot):
+                results[i] = _item_result(i, 409, id=row.id, message="Slot has been booked by someone else")
+                continue
+        by_status.setdefault(new_status, []).append(row.id)
+        if new_status != row.status:
+            moved.append((row, new_status))
+        touched_patients.add(row.patient_id)
+        results[i] = _item_result(i, 200, id=row.id)
+
+    booking.release_slots(released)
+    stats.add_appointments(((row.doctor_id, row.date, row.status) for row, _ in moved), sign=-1)
+    stats.add_appointments((row.doctor_id, row.date, new_status) for row, new_status in moved)
+    schedules.invalidate(
+        (current[appt_id].doctor_id, current[appt_id].date)
+        for status_ids in by_status.values() for appt_id in status_ids
+    )
+    for new_status, status_ids in by_status.items():
+        db.session.execute(
+            update(Appointment).where(Appointment.id.in_(status_ids)).values(status=new_status)
+            .execution_options(synchronize_session=False)
+        )
+    return results, touched_patients
+
+def _batch_delete(ids):
+    results = [None] * len(ids)
+    current = {
+        row.id: row for row in db.session.query(
+            Appointment.id, Appointment.patient_id, Appointment.doctor_id,
+            Appointment.date, Appointment.slot, Appointment.status
+        ).filter(Appointment.id.in_([appt_id for appt_id in ids if _is_id(appt_id)]))
+    }
+    for i, appt_id in enumerate(ids):
+        if not _is_id(appt_id):
+            results[i] = _item_result(i, 400, message="id must be an integer")
+            continue
+        status = 204 if appt_id in current else 404
+        results[i] = _item_result(i, status, id=appt_id)
+
+    booking.release_slots(
+        (row.doctor_id, row.date, row.slot) for row in current.values() if row.status != AP_Status.CANCELLED
+    )
+    if current:
+        schedules.invalidate((row.doctor_id, row.date) for row in current.values())
+        stats.add_appointments(((row.doctor_id, row.date, row.status) for row in current.values()), sign=-1)
+        stats.forget_treatments(current)
+        # Detach the treatments as db.session.delete() does, or a reused id would inherit them
+        db.session.execute(
+            update(Treatment).where(Treatment.appointment_id.in_(list(current)))
+            .values(appointment_id=None)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.execute(
+            delete(Appointment).where(Appointment.id.in_(list(current)))
+            .execution_options(synchronize_session=False)
+        )
+    return results, {row.patient_id for row in current.values()}
+
+@api_bp.route("/appointments/batch", methods=["POST"])
+def batch_appointments():
+    """
+    Create, re-status and delete many appointments in one transaction.
+    Body: {"create": [{patient_id, doctor_id, date, time}], "update": [{id, status}], "delete": [id, ...]}
+    Each item gets its own result; the whole batch commits or rolls back together.
+    """
+    data = request.json or {}
+    if not isinstance(data, dict):
+        return jsonify({"message": "Body must be an object"}), 400
+    creates, updates, deletes = data.get("create", []), data.get("update", []), data.get("delete", [])
+    if not all(isinstance(ops, list) for ops in (creates, updates, deletes)):
+        return jsonify({"message": "create, update and delete must be lists"}), 400
+    max_items = current_app.config["API_BATCH_MAX"]
+    if len(creates) + len(updates) + len(deletes) > max_items:
+        return jsonify({"message": f"At most {max_items} operations per batch"}), 413
+
+    try:
+        created = _batch_create(creates)
+        updated, patients_updated = _batch_update(updates)
+        deleted, patients_deleted = _batch_delete(deletes)
+        # The set-based statements above bypass the flush hook
+        if any(r["status"] < 300 for r in created + updated + deleted):
+            versions.bump("appointments")
+        if any(r["status"] < 300 for r in updated + deleted):
+            versions.bump("history")
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({"message": "Batch conflicts with existing appointments; nothing was applied"}), 409
+
+    for patient_id in patients_updated | patients_deleted:
+        history.invalidate(patient_id)
+    return jsonify({"create": created, "update": updated, "delete": deleted}), 200
+
+# ---------------- AVAILABILITY API ----------------
+
+def _free_slots_response(doctors):
+    n = max(1, min(request.args.get("n", 5, type=int), 50))
+    slots = booking.next_free_slots(doctors, n=n)
+    return jsonify([{
+        "doctor_id": s.doctor_id,
+        "date": s.date.isoformat(),
+        "slot": s.slot,
+        "starts_at": s.starts_at.isoformat(timespec="minutes")
+    } for s in slots]), 200
+
+@api_bp.route("/doctors/<string:doctor_id>/slots", methods=["GET"])
+def get_doctor_slots(doctor_id):
+    """Next ?n= free slots for one doctor."""
+    doctor = Doctor.query.get_or_404(doctor_id)
+    return _free_slots_response([doctor])
+
+@api_bp.route("/doctors/<string:doctor_id>/schedule", methods=["GET"])
+def get_doctor_schedule(doctor_id):
+    """One doctor's appointments on ?date= (default today), from the prebuilt snapshot when there is one."""
+    Doctor.query.get_or_404(doctor_id)
+    try:
+        day = date.fromisoformat(request.args.get("date", ""))
+    except ValueError:
+        day = date.today()
+    entries, built_at = schedules.day_schedule(doctor_id, day)
+    return jsonify({
+        "doctor_id": doctor_id,
+        "date": day.isoformat(),
+        "built_at": built_at.isoformat(timespec="seconds") if built_at else None,
+        "appointments": entries
+    }), 200
+
+@api_bp.route("/departments/<int:department_id>/slots", methods=["GET"])
+def get_department_slots(department_id):
+    """Next ?n= free slots across the available doctors of a department."""
+    Department.query.get_or_404(department_id)
+    doctors = Doctor.query.options(selectinload(Doctor.schedule)).filter_by(
+        department_id=department_id, status=Doc_Status.AVAILABLE
+    ).all()
+    return _free_slots_response(doctors)
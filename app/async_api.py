@@ -0,0 +1,75 @@
+"""
+Async read endpoints under /api/async/v1, backed by SQLAlchemy asyncio.
+
+They return the same JSON as their /api/v1 twins, but run on an
+AsyncSession so the view awaits the database instead of blocking on it.
+Their ETags change with the same collection versions, but are not
+interchangeable with /api/v1's: the tag includes the request path.
+Writes stay on /api/v1: booking, history and the version counters are built
+on the synchronous db.session.
+
+Under a WSGI server Flask runs each async view in its own event loop on the
+request's worker thread, so the worker is still held for the whole request;
+the concurrency gain needs an ASGI deployment (see benchmarks/concurrency.py
+for the numbers on this stack).
+"""
+import os
+import threading
+from flask import Blueprint, current_app, jsonify, abort
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload, selectinload
+from app.models import Doctor, Appointment
+from app.pagination import keyset_paginate_async
+from app.api import doctor_json, appointment_json
+from app import database, instrumentation, versions
+
+async_api_bp = Blueprint("async_api_bp", __name__, url_prefix="/api/async/v1")
+
+_engine_lock = threading.Lock()
+
+
+def async_session():
+    """This worker's AsyncSession factory, created on first use (per process)."""
+    state = current_app.extensions.get("async_db")
+    if state is None or state[0] != os.getpid():
+        with _engine_lock:
+            state = current_app.extensions.get("async_db")
+            if state is None or state[0] != os.getpid():
+                from sqlalchemy.ext.asyncio import async_sessionmaker
+                uri = current_app.config.get("ASYNC_DATABASE_URI") or \
+                    database.async_database_uri(current_app.config["SQLALCHEMY_DATABASE_URI"])
+                engine = database.make_async_engine(uri)
+                if current_app.config.get("SQL_INSTRUMENTATION", True):
+                    instrumentation.watch(engine.sync_engine, current_app.config.get("SQL_SLOW_MS", 100) / 1000)
+                state = (os.getpid(), async_sessionmaker(engine, expire_on_commit=False))
+                current_app.extensions["async_db"] = state
+    return state[1]()
+
+# ---------------- DOCTOR API ----------------
+
+@async_api_bp.route("/doctors", methods=["GET"])
+@versions.conditional("doctors", cache_control="public, max-age=0, must-revalidate")
+async def get_doctors():
+    """Retrieve doctors, one keyset page at a time (?limit=, ?after=, ?before=)."""
+    async with async_session() as session:
+        doctors = await keyset_paginate_async(
+            session, select(Doctor).options(selectinload(Doctor.department)), Doctor.id
+        )
+    return jsonify({
+        "doctors": [doctor_json(d) for d in doctors],
+        **doctors.to_dict()
+    }), 200
+
+# ---------------- APPOINTMENT API ----------------
+
+@async_api_bp.route("/appointments/<int:id>", methods=["GET"])
+@versions.conditional("appointments", cache_control="private, no-cache")
+async def get_appointment(id):
+    """Retrieve a single appointment's details."""
+    async with async_session() as session:
+        appt = await session.get(
+            Appointment, id, options=[joinedload(Appointment.patient), joinedload(Appointment.doctor)]
+        )
+    if appt is None:
+        abort(404)
+    return jsonify(appointment_json(appt)), 200
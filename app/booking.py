@@ -0,0 +1,326 @@
+"""
+Slot-based booking.
+
+A doctor's day is cut into fixed-length slots from their DoctorSchedule
+(or DEFAULT_SCHEDULE). Which slots are taken is kept as a bitmap per
+(doctor, day) in `slot_days`, so:
+
+  * booking claims a slot with one conditional UPDATE
+    (`SET booked_mask = booked_mask | bit WHERE booked_mask & bit = 0`),
+    backed by the unique (doctor_id, date, slot) index on appointments;
+  * "next free slots" reads one small row per doctor per day instead of
+    scanning the appointments table.
+"""
+from collections import namedtuple
+from datetime import date, datetime, timedelta, time
+import click
+from sqlalchemy import tuple_, update
+from sqlalchemy.orm import selectinload
+from app.models import db, Doctor, DoctorSchedule, SlotDay, Appointment, AP_Status
+from app import schedules
+
+# Bits of a signed 64-bit integer that are safe to use as slot flags
+MAX_SLOTS_PER_DAY = 62
+# How many days of occupancy rows next_free_slots() reads per query
+SCAN_WINDOW_DAYS = 7
+
+DEFAULT_SCHEDULE = {
+    "start_time": time(9, 0),
+    "end_time": time(17, 0),
+    "slot_minutes": 30,
+    "working_days": 0b0011111,
+}
+
+FreeSlot = namedtuple("FreeSlot", ["doctor_id", "date", "slot", "starts_at"])
+
+
+class SlotUnavailable(Exception):
+    """The requested slot does not exist or is already taken."""
+
+
+class SlotInvalid(SlotUnavailable):
+    """The doctor has no such slot, or it is in the past."""
+
+
+# ---------------- SCHEDULE ----------------
+
+def schedule_for(doctor):
+    """The doctor's schedule, or a detached default one."""
+    return doctor.schedule or DoctorSchedule(**DEFAULT_SCHEDULE)
+
+
+def _minutes(t):
+    return t.hour * 60 + t.minute
+
+
+def slot_count(schedule):
+    count = (_minutes(schedule.end_time) - _minutes(schedule.start_time)) // schedule.slot_minutes
+    return max(0, min(count, MAX_SLOTS_PER_DAY))
+
+
+def full_mask(schedule):
+    return (1 << slot_count(schedule)) - 1
+
+
+def slot_start(schedule, slot):
+    minutes = _minutes(schedule.start_time) + slot * schedule.slot_minutes
+    return time(minutes // 60, minutes % 60)
+
+
+def slot_for_time(schedule, t):
+    """Slot index starting exactly at `t`, or None if `t` is not a slot boundary."""
+    offset = _minutes(t) - _minutes(schedule.start_time)
+    if offset < 0 or offset % schedule.slot_minutes:
+        return None
+    slot = offset // schedule.slot_minutes
+    return slot if slot < slot_count(schedule) else None
+
+
+def works_on(schedule, day):
+    return bool(schedule.working_days & (1 << day.weekday()))
+
+
+def check_slot(schedule, day, slot):
+    """Start of `slot` on `day`; SlotInvalid unless the doctor has that slot and it is still ahead."""
+    if not works_on(schedule, day) or not 0 <= slot < slot_count(schedule):
+        raise SlotInvalid("The doctor does not see patients at that time.")
+    starts_at = datetime.combine(day, slot_start(schedule, slot))
+    if starts_at <= datetime.now():
+        raise SlotInvalid("That slot is in the past.")
+    return starts_at
+
+
+# ---------------- OCCUPANCY ----------------
+
+def _ensure_day(doctor_id, day):
+    dialect = db.engine.dialect.name
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    elif dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        if db.session.get(SlotDay, (doctor_id, day)) is None:
+            db.session.add(SlotDay(doctor_id=doctor_id, date=day, booked_mask=0))
+            db.session.flush()
+        return
+    db.session.execute(
+        insert(SlotDay).values(doctor_id=doctor_id, date=day, booked_mask=0).on_conflict_do_nothing()
+    )
+
+
+def claim_slot(doctor_id, day, slot):
+    """Atomically mark the slot taken; False if someone else holds it."""
+    _ensure_day(doctor_id, day)
+    bit = 1 << slot
+    result = db.session.execute(
+        update(SlotDay)
+        .where(
+            SlotDay.doctor_id == doctor_id,
+            SlotDay.date == day,
+            SlotDay.booked_mask.op("&")(bit) == 0,
+        )
+        .values(booked_mask=SlotDay.booked_mask.op("|")(bit))
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+def release_slot(doctor_id, day, slot):
+    if slot is None:
+        return
+    db.session.execute(
+        update(SlotDay)
+        .where(SlotDay.doctor_id == doctor_id, SlotDay.date == day)
+        .values(booked_mask=SlotDay.booked_mask.op("&")(~(1 << slot)))
+        .execution_options(synchronize_session=False)
+    )
+
+
+# ---------------- BOOKING ----------------
+
+def book_slot(patient_id, doctor, day, slot):
+    """Claim `slot` on `day` and add the BOOKED appointment (caller commits)."""
+    starts_at = check_slot(schedule_for(doctor), day, slot)
+    if not claim_slot(doctor.id, day, slot):
+        raise SlotUnavailable("That slot has just been taken, please pick another.")
+
+    appointment = Appointment(
+        patient_id=patient_id,
+        doctor_id=doctor.id,
+        date=day,
+        time=starts_at,
+        slot=slot,
+        status=AP_Status.BOOKED
+    )
+    db.session.add(appointment)
+    db.session.flush()
+    return appointment
+
+
+def change_status(appointment, new_status):
+    """Move an appointment to `new_status`, freeing or re-claiming its slot."""
+    old_status = appointment.status
+    if old_status == new_status:
+        return
+    if appointment.slot is not None:
+        if new_status == AP_Status.CANCELLED:
+            release_slot(appointment.doctor_id, appointment.date, appointment.slot)
+        elif old_status == AP_Status.CANCELLED:
+            if not claim_slot(appointment.doctor_id, appointment.date, appointment.slot):
+                raise SlotUnavailable("That slot has been booked by someone else.")
+    appointment.status = new_status
+
+
+def move_to_date(appointment, day):
+    """Keep the same slot but on another day, if the doctor has it then and it is free."""
+    if day == appointment.date:
+        return
+    schedule = schedule_for(appointment.doctor)
+    if appointment.slot is not None:
+        check_slot(schedule, day, appointment.slot)
+    elif not works_on(schedule, day) or day < date.today():
+        # Legacy rows without a slot can only be checked by day
+        raise SlotInvalid("The doctor does not see patients on that day.")
+    if appointment.slot is not None and appointment.status != AP_Status.CANCELLED:
+        if not claim_slot(appointment.doctor_id, day, appointment.slot):
+            raise SlotUnavailable("That slot is not free on the new date.")
+        release_slot(appointment.doctor_id, appointment.date, appointment.slot)
+    if appointment.time is not None:
+        appointment.time = datetime.combine(day, appointment.time.time())
+    appointment.date = day
+
+
+def release_slots(rows):
+    """Free many (doctor_id, date, slot) slots with one UPDATE per doctor-day."""
+    masks = {}
+    for doctor_id, day, slot in rows:
+        if slot is not None:
+            masks[(doctor_id, day)] = masks.get((doctor_id, day), 0) | (1 << slot)
+    for (doctor_id, day), mask in masks.items():
+        db.session.execute(
+            update(SlotDay)
+            .where(SlotDay.doctor_id == doctor_id, SlotDay.date == day)
+            .values(booked_mask=SlotDay.booked_mask.op("&")(~mask))
+            .execution_options(synchronize_session=False)
+        )
+
+
+def discard(appointment):
+    """Free the slot of an appointment that is about to be deleted."""
+    if appointment.status != AP_Status.CANCELLED:
+        release_slot(appointment.doctor_id, appointment.date, appointment.slot)
+
+
+# ---------------- AVAILABILITY ----------------
+
+def next_free_slots(doctors, n=5, start=None, horizon_days=60):
+    """
+    The `n` earliest free slots across `doctors`, as FreeSlot tuples.
+    Cost is one occupancy row per doctor per day scanned, independent of
+    how many appointments the doctors have.
+    """
+    now = datetime.now()
+    day = start or now.date()
+    end = day + timedelta(days=horizon_days)
+    schedules = {d.id: schedule_for(d) for d in doctors}
+    found = []
+
+    while day < end and len(found) < n:
+        window_end = min(day + timedelta(days=SCAN_WINDOW_DAYS), end)
+        masks = {
+            (row.doctor_id, row.date): row.booked_mask
+            for row in SlotDay.query.filter(
+                SlotDay.doctor_id.in_(schedules),
+                SlotDay.date >= day,
+                SlotDay.date < window_end,
+            )
+        }
+        while day < window_end and len(found) < n:
+            candidates = []
+            for doctor_id, schedule in schedules.items():
+                if not works_on(schedule, day):
+                    continue
+                free = full_mask(schedule) & ~masks.get((doctor_id, day), 0)
+                while free:
+                    bit = free & -free
+                    free ^= bit
+                    slot = bit.bit_length() - 1
+                    starts_at = datetime.combine(day, slot_start(schedule, slot))
+                    if starts_at > now:
+                        candidates.append(FreeSlot(doctor_id, day, slot, starts_at))
+            candidates.sort(key=lambda s: (s.starts_at, s.doctor_id))
+            found.extend(candidates[:n - len(found)])
+            day += timedelta(days=1)
+
+    return found
+
+
+def backfill_slots():
+    """
+    Set `slot` on legacy appointments from their time (caller commits);
+    returns rows set. Rows off the slot grid keep NULL, and so does the
+    later of two live rows on the same slot, which the unique index would
+    reject; the earliest booking keeps it.
+    """
+    legacy = db.session.query(
+        Appointment.id, Appointment.doctor_id, Appointment.date, Appointment.time, Appointment.status
+    ).filter(
+        Appointment.slot.is_(None), Appointment.doctor_id.isnot(None),
+        Appointment.date.isnot(None), Appointment.time.isnot(None)
+    ).order_by(Appointment.id).all()
+    if not legacy:
+        return 0
+
+    doctors = Doctor.query.options(selectinload(Doctor.schedule))\
+        .filter(Doctor.id.in_({row.doctor_id for row in legacy}))
+    doctor_schedules = {d.id: schedule_for(d) for d in doctors}
+    pairs = sorted({(row.doctor_id, row.date) for row in legacy})
+    taken = set()
+    for start in range(0, len(pairs), 500):
+        taken.update(tuple(row) for row in db.session.query(
+            Appointment.doctor_id, Appointment.date, Appointment.slot
+        ).filter(
+            tuple_(Appointment.doctor_id, Appointment.date).in_(pairs[start:start + 500]),
+            Appointment.slot.isnot(None), Appointment.status != AP_Status.CANCELLED
+        ))
+
+    updates, days = [], set()
+    for row in legacy:
+        schedule = doctor_schedules.get(row.doctor_id)
+        slot = slot_for_time(schedule, row.time.time()) if schedule else None
+        if slot is None:
+            continue
+        if row.status != AP_Status.CANCELLED:
+            if (row.doctor_id, row.date, slot) in taken:
+                continue
+            taken.add((row.doctor_id, row.date, slot))
+        updates.append({"id": row.id, "slot": slot})
+        days.add((row.doctor_id, row.date))
+    if updates:
+        db.session.execute(update(Appointment), updates)
+        schedules.invalidate(days)
+    return len(updates)
+
+
+def rebuild_slot_days():
+    """Backfill legacy slots, then recompute every occupancy bitmap from the live appointments."""
+    backfill_slots()
+    db.session.query(SlotDay).delete()
+    masks = {}
+    rows = db.session.query(Appointment.doctor_id, Appointment.date, Appointment.slot).filter(
+        Appointment.slot.isnot(None), Appointment.status != AP_Status.CANCELLED
+    )
+    for doctor_id, day, slot in rows.yield_per(5000):
+        masks[(doctor_id, day)] = masks.get((doctor_id, day), 0) | (1 << slot)
+    db.session.bulk_insert_mappings(SlotDay, [
+        {"doctor_id": doctor_id, "date": day, "booked_mask": mask}
+        for (doctor_id, day), mask in masks.items()
+    ])
+    db.session.commit()
+    return len(masks)
+
+
+@click.command("rebuild-slots")
+def rebuild_slots_command():
+    """Recompute the per-day slot occupancy bitmaps from the appointments table."""
+    click.echo(f"Rebuilt {rebuild_slot_days()} doctor-days.")
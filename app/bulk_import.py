@@ -0,0 +1,258 @@
+"""
+Bulk import of doctors and patients from CSV or NDJSON.
+
+The input is read one record at a time and never held in memory as a
+whole. Each record is validated against the departments and against
+emails/phones preloaded into sets (plus everything seen earlier in the
+file), so duplicates cost no queries. Valid records are collected into
+chunks; each chunk has its passwords hashed across the hashing pool and
+is written with one executemany per table, then committed.
+
+Bad records do not stop the import: they are returned as an error report
+of {"line", "email", "error"} dicts. If the hashing queue stays full
+(HashingBusy, bounded imports only), the import stops there: chunks
+already committed stay, and every record from the failed chunk on is
+reported as not imported, so the client can resubmit just those.
+"""
+import csv
+import io
+import json
+import click
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+from app.models import db, User, Patient, Doctor, Department, UserRole, Doc_Status
+from app.hashing import HashingBusy, hash_passwords
+from app.search import bulk_documents, insert_documents
+from app import stats, versions
+
+CHUNK_SIZE = 1000
+NOT_IMPORTED = "Not imported: the server is busy hashing passwords, resubmit this record"
+KINDS = ("doctors", "patients")
+FORMATS = ("csv", "ndjson")
+
+REQUIRED = {
+    "doctors": ("email", "password", "full_name", "department_id"),
+    "patients": ("email", "password", "full_name", "gender", "phone", "age"),
+}
+
+
+class RecordError(ValueError):
+    """A record that cannot be imported; the message goes into the error report."""
+
+
+# ---------------- READING ----------------
+
+def format_for(filename, default="csv"):
+    name = (filename or "").lower()
+    if name.endswith((".ndjson", ".jsonl")):
+        return "ndjson"
+    if name.endswith(".csv"):
+        return "csv"
+    return default
+
+
+def read_records(stream, fmt):
+    """Yield (line number, dict) from a text stream, one record at a time."""
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record
+    elif fmt == "ndjson":
+        for line_no, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                record = RecordError(f"Invalid JSON: {e}")
+            yield line_no, record
+    else:
+        raise ValueError(f"Unknown import format: {fmt}")
+
+
+# ---------------- VALIDATION ----------------
+
+def _text(record, field):
+    value = record.get(field)
+    return str(value).strip() if value not in (None, "") else None
+
+
+def _int(record, field, default=None):
+    value = _text(record, field)
+    if value is None:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise RecordError(f"{field} must be a whole number")
+
+
+class Importer:
+    def __init__(self, kind, chunk_size=CHUNK_SIZE, bounded=False):
+        if kind not in KINDS:
+            raise ValueError(f"Unknown import kind: {kind}")
+        self.kind = kind
+        self.chunk_size = chunk_size
+        # Hash through the request queue (see app.hashing.hash_many)
+        self.bounded = bounded
+        self.imported = 0
+        self.errors = []
+        self.busy = False
+        # Existing keys are loaded once; new ones are added as records are accepted
+        self.emails = set(db.session.execute(select(User.email)).scalars())
+        self.phones = set(db.session.execute(select(Patient.phone)).scalars())
+        self.departments = set(db.session.execute(select(Department.id)).scalars())
+
+    def _error(self, line_no, record, message):
+        email = record.get("email") if isinstance(record, dict) else None
+        self.errors.append({"line": line_no, "email": email, "error": message})
+
+    def _validate(self, record):
+        if isinstance(record, RecordError):
+            raise record
+        if not isinstance(record, dict):
+            raise RecordError("Record must be an object")
+        missing = [f for f in REQUIRED[self.kind] if _text(record, f) is None]
+        if missing:
+            raise RecordError("Missing " + ", ".join(missing))
+
+        email = _text(record, "email")
+        if "@" not in email:
+            raise RecordError("Invalid email")
+        if email in self.emails:
+            raise RecordError("Email already registered")
+        row = {"email": email, "password": _text(record, "password"), "full_name": _text(record, "full_name")}
+
+        if self.kind == "doctors":
+            row["department_id"] = _int(record, "department_id")
+            if row["department_id"] not in self.departments:
+                raise RecordError("Unknown department")
+            row["qualification"] = _text(record, "qualification") or "MBBS"
+            row["experience"] = _int(record, "experience", 1)
+        else:
+            row["phone"] = _text(record, "phone")
+            if row["phone"] in self.phones:
+                raise RecordError("Phone already registered")
+            row["gender"] = _text(record, "gender")
+            row["age"] = _int(record, "age")
+            row["address"] = _text(record, "address")
+            row["blood_group"] = _text(record, "blood_group")
+            self.phones.add(row["phone"])
+        self.emails.add(email)
+        return row
+
+    # ---------------- WRITING ----------------
+
+    def _write_chunk(self, chunk):
+        rows = [row for _, row in chunk]
+        passwords = hash_passwords((row["password"] for row in rows), self.bounded)
+        role = UserRole.DOCTOR if self.kind == "doctors" else UserRole.PATIENT
+        user_ids = db.session.execute(
+            insert(User).returning(User.id, sort_by_parameter_order=True),
+            [{"email": row["email"], "password": pw, "role": role} for row, pw in zip(rows, passwords)]
+        ).scalars().all()
+
+        if self.kind == "doctors":
+            profiles = [{
+                "id": f"DOC-{row['department_id']}-{user_id}",
+                "user_id": user_id,
+                "full_name": row["full_name"],
+                "qualification": row["qualification"],
+                "experience": row["experience"],
+                "department_id": row["department_id"],
+                "status": Doc_Status.AVAILABLE,
+            } for row, user_id in zip(rows, user_ids)]
+            db.session.execute(insert(Doctor), profiles)
+            profile_ids = [p["id"] for p in profiles]
+            versions.bump("doctors")
+            stats.add_doctors(p["department_id"] for p in profiles)
+        else:
+            profile_ids = db.session.execute(
+                insert(Patient).returning(Patient.id, sort_by_parameter_order=True),
+                [{
+                    "user_id": user_id,
+                    "full_name": row["full_name"],
+                    "gender": row["gender"],
+                    "phone": row["phone"],
+                    "age": row["age"],
+                    "address": row["address"],
+                    "blood_group": row["blood_group"],
+                } for row, user_id in zip(rows, user_ids)]
+            ).scalars().all()
+
+        docs = []
+        for row, user_id, profile_id in zip(rows, user_ids, profile_ids):
+            docs += bulk_documents(user_id, row["email"], self.kind[:-1], profile_id,
+                                   row["full_name"], row.get("phone"))
+        insert_documents(docs)
+
+    def _flush(self, chunk):
+        if not chunk:
+            return
+        try:
+            self._write_chunk(chunk)
+            db.session.commit()
+            self.imported += len(chunk)
+        except IntegrityError as e:
+            # Someone registered one of these in the meantime; report the whole chunk
+            db.session.rollback()
+            for line_no, row in chunk:
+                self._error(line_no, row, f"Chunk rejected by the database: {e.orig}")
+        except HashingBusy:
+            db.session.rollback()
+            self.busy = True
+            for line_no, row in chunk:
+                self._error(line_no, row, NOT_IMPORTED)
+
+    def run(self, records):
+        chunk = []
+        for line_no, record in records:
+            if self.busy:
+                self._error(line_no, record, NOT_IMPORTED)
+                continue
+            try:
+                chunk.append((line_no, self._validate(record)))
+            except RecordError as e:
+                self._error(line_no, record, str(e))
+                continue
+            if len(chunk) >= self.chunk_size:
+                self._flush(chunk)
+                chunk = []
+        self._flush(chunk)
+        return {"imported": self.imported, "errors": self.errors}
+
+
+def import_records(kind, stream, fmt, chunk_size=CHUNK_SIZE, bounded=False):
+    """Import `kind` ("doctors"/"patients") records from a text stream."""
+    return Importer(kind, chunk_size, bounded).run(read_records(stream, fmt))
+
+
+def write_error_report(errors, stream):
+    writer = csv.DictWriter(stream, fieldnames=["line", "email", "error"])
+    writer.writeheader()
+    writer.writerows(errors)
+
+
+def open_text(binary_stream):
+    """Text view of an uploaded (binary) file; a leading BOM is skipped."""
+    return io.TextIOWrapper(binary_stream, encoding="utf-8-sig", newline="")
+
+
+@click.command("import-users")
+@click.argument("kind", type=click.Choice(KINDS))
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--format", "fmt", type=click.Choice(FORMATS), help="Defaults to the file extension.")
+@click.option("--chunk-size", default=CHUNK_SIZE, show_default=True)
+@click.option("--errors", "errors_path", type=click.Path(dir_okay=False), help="Write rejected rows to this CSV.")
+def import_users_command(kind, path, fmt, chunk_size, errors_path):
+    """Bulk import doctors or patients from a CSV or NDJSON file."""
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        report = import_records(kind, f, fmt or format_for(path), chunk_size)
+    click.echo(f"Imported {report['imported']} {kind}, rejected {len(report['errors'])}.")
+    if errors_path and report["errors"]:
+        with open(errors_path, "w", newline="") as f:
+            write_error_report(report["errors"], f)
+        click.echo(f"Error report written to {errors_path}")
+    elif report["errors"]:
+        for error in report["errors"][:20]:
+            click.echo(f"  line {error['line']}: {error['email']}: {error['error']}")
@@ -0,0 +1,71 @@
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+_MISSING = object()
+
+# Every live cache, for reset_caches()
+_caches = weakref.WeakSet()
+
+
+class TTLCache:
+    """
+    Small in-process LRU cache whose entries expire after `ttl` seconds.
+    Safe to share between the threads of one worker; each worker process
+    keeps its own copy.
+    """
+
+    def __init__(self, maxsize=1024, ttl=30):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        _caches.add(self)
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                return default
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get_or_set(self, key, factory):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = factory()
+            self.set(key, value)
+        return value
+
+    def pop(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+def reset_caches():
+    """
+    Empty every TTLCache in this process. The module-level caches are keyed
+    by row ids, so a process that switches databases (the tests, the
+    benchmarks between scales) must not keep serving from them.
+    """
+    for cache in list(_caches):
+        cache.clear()
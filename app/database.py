@@ -0,0 +1,187 @@
+"""
+Engine configuration and read-replica routing.
+
+`engine_options()` turns DB_* / SQLITE_* environment variables into
+SQLALCHEMY_ENGINE_OPTIONS (pool sizing, pre-ping, statement timeout,
+compiled-statement cache), and `init_app()` applies the SQLite pragmas
+(WAL journal, synchronous, busy timeout) to every new connection.
+
+With DATABASE_REPLICA_URI set, views decorated with `@reads_from_replica`
+run their GET requests against the "replica" bind. Writes always go to
+the primary: RoutingSession sends flushes and INSERT/UPDATE/DELETE
+statements there even inside a replica-routed request. After a client
+commits, its Flask session is pinned to the primary for
+READ_YOUR_WRITES_SECONDS so the next pages show its own changes even if
+the replica lags behind.
+"""
+import os
+import time
+from functools import wraps
+from flask import g, has_request_context, request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.pool import NullPool
+from sqlalchemy.sql.dml import UpdateBase
+
+REPLICA_BIND = "replica"
+READ_YOUR_WRITES_SECONDS = 5
+
+
+def _env_int(name):
+    value = os.getenv(name)
+    return int(value) if value else None
+
+
+def engine_options(uri):
+    """SQLALCHEMY_ENGINE_OPTIONS for `uri`; pool settings only when configured."""
+    options = {"pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "True") == "True"}
+    for env, key in (("DB_POOL_SIZE", "pool_size"), ("DB_MAX_OVERFLOW", "max_overflow"),
+                     ("DB_POOL_TIMEOUT", "pool_timeout"), ("DB_POOL_RECYCLE", "pool_recycle"),
+                     ("DB_QUERY_CACHE_SIZE", "query_cache_size")):
+        value = _env_int(env)
+        if value is not None:
+            options[key] = value
+
+    connect_args = {}
+    timeout_ms = _env_int("DB_STATEMENT_TIMEOUT_MS")
+    if (uri or "").startswith("postgresql") and timeout_ms:
+        connect_args["options"] = f"-c statement_timeout={timeout_ms}"
+    if (uri or "").startswith("sqlite"):
+        cached = _env_int("SQLITE_CACHED_STATEMENTS")
+        if cached is not None:
+            connect_args["cached_statements"] = cached
+    if connect_args:
+        options["connect_args"] = connect_args
+    return options
+
+
+def sqlite_pragmas():
+    return {
+        "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+        "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+        "busy_timeout": _env_int("SQLITE_BUSY_TIMEOUT_MS") or 5000,
+    }
+
+
+def _apply_pragmas(engine, pragmas):
+    @event.listens_for(engine, "connect")
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+def async_database_uri(uri):
+    """`uri` with its async driver: sqlite -> aiosqlite, postgresql -> asyncpg."""
+    scheme, rest = uri.split("://", 1)
+    dialect = scheme.split("+", 1)[0]
+    driver = {"sqlite": "aiosqlite", "postgresql": "asyncpg"}.get(dialect)
+    if driver is None:
+        raise ValueError(f"No async driver configured for {dialect}; set ASYNC_DATABASE_URI")
+    return f"{dialect}+{driver}://{rest}"
+
+
+def make_async_engine(uri):
+    """
+    AsyncEngine for the async API. Flask runs every async view in a new
+    event loop and async driver connections are bound to the loop that
+    opened them, so connections are not pooled across requests.
+    """
+    from sqlalchemy.ext.asyncio import create_async_engine
+    engine = create_async_engine(uri, poolclass=NullPool)
+    if engine.dialect.name == "sqlite":
+        _apply_pragmas(engine.sync_engine, sqlite_pragmas())
+    return engine
+
+
+# ---------------- COUNTERS ----------------
+
+def upsert_insert(dialect_name):
+    """The dialect's insert() construct with ON CONFLICT support, or None."""
+    if dialect_name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    elif dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        return None
+    return insert
+
+
+def increment(conn, table, key, deltas):
+    """Add `deltas` to the counter columns of the row with primary key `key`, creating the row if needed."""
+    insert = upsert_insert(conn.dialect.name)
+    if insert is None:
+        # No upsert here: two first writers of the same key can still collide
+        result = conn.execute(
+            table.update().where(*(table.c[name] == value for name, value in key.items()))
+            .values({name: table.c[name] + delta for name, delta in deltas.items()})
+        )
+        if result.rowcount == 0:
+            conn.execute(table.insert().values(**key, **deltas))
+        return
+    stmt = insert(table).values(**key, **deltas)
+    conn.execute(stmt.on_conflict_do_update(
+        index_elements=list(key),
+        set_={name: table.c[name] + stmt.excluded[name] for name in deltas},
+    ))
+
+
+# ---------------- ROUTING ----------------
+
+def _replica_requested():
+    return has_request_context() and g.get("use_replica", False)
+
+
+def read_bind():
+    """Bind key this request reads from: REPLICA_BIND when routed there, None for the primary."""
+    from app.models import db
+    if _replica_requested() and REPLICA_BIND in db.engines:
+        return REPLICA_BIND
+    return None
+
+
+class RoutingSession(Session):
+    """db.session class that sends reads of replica-routed requests to the replica bind."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and not isinstance(clause, UpdateBase) \
+                and _replica_requested():
+            engine = self._db.engines.get(REPLICA_BIND)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def reads_from_replica(f):
+    """Serve GET requests of this view from the replica unless the client just wrote."""
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        if request.method == "GET" and session.get("db_pinned_until", 0) < time.time():
+            g.use_replica = True
+        return f(*args, **kwargs)
+    return decorated
+
+
+def init_app(app):
+    """Pragmas for SQLite engines and read-your-writes pinning (after db.init_app)."""
+    from app.models import db
+
+    with app.app_context():
+        for engine in db.engines.values():
+            if engine.dialect.name == "sqlite":
+                _apply_pragmas(engine, sqlite_pragmas())
+
+    if REPLICA_BIND not in app.config.get("SQLALCHEMY_BINDS", {}):
+        return
+
+    @event.listens_for(db.session, "after_commit")
+    def _remember_write(db_session):
+        if has_request_context():
+            g.db_wrote = True
+
+    @app.after_request
+    def _pin_to_primary(response):
+        if g.get("db_wrote"):
+            session["db_pinned_until"] = time.time() + READ_YOUR_WRITES_SECONDS
+        return response
@@ -0,0 +1,149 @@
+"""
+Streaming exports of appointments and treatments (billing extracts).
+
+Rows are read as plain column tuples with `yield_per`, which becomes a
+server-side cursor where the driver supports it. They are serialised one
+chunk at a time into CSV or NDJSON, so memory use does not grow with the
+size of the export. The same generator feeds the admin download routes
+(as a streaming response) and the `flask export` command (to a file).
+"""
+import csv
+import enum
+import io
+import json
+import sys
+from datetime import date, datetime
+import click
+from sqlalchemy import select
+from app.models import db, Appointment, Treatment, Patient, Doctor, Department, AP_Status
+
+EXPORT_CHUNK = 1000
+KINDS = ("appointments", "treatments")
+FORMATS = ("csv", "ndjson")
+MIMETYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+
+def _columns(kind):
+    """(name, column) pairs projected for an export."""
+    common = [
+        ("patient_id", Appointment.patient_id),
+        ("patient_name", Patient.full_name),
+        ("doctor_id", Appointment.doctor_id),
+        ("doctor_name", Doctor.full_name),
+        ("department", Department.name),
+    ]
+    if kind == "appointments":
+        return [
+            ("id", Appointment.id),
+            ("date", Appointment.date),
+            ("time", Appointment.time),
+            ("status", Appointment.status),
+            *common,
+            ("created_at", Appointment.created_at),
+        ]
+    return [
+        ("id", Treatment.id),
+        ("appointment_id", Treatment.appointment_id),
+        ("date", Appointment.date),
+        ("status", Appointment.status),
+        *common,
+        ("diagnosis", Treatment.diagnosis),
+        ("prescription", Treatment.prescription),
+        ("follow_up", Treatment.follow_up),
+        ("created_at", Treatment.created_at),
+    ]
+
+
+def export_query(kind, start=None, end=None, department_id=None, status=None):
+    """SELECT of the export columns, filtered by appointment date, department and status."""
+    columns = _columns(kind)
+    stmt = select(*[col.label(name) for name, col in columns])
+    if kind == "treatments":
+        stmt = stmt.select_from(Treatment).join(Appointment, Treatment.appointment_id == Appointment.id)
+    else:
+        stmt = stmt.select_from(Appointment)
+    stmt = stmt.outerjoin(Patient, Appointment.patient_id == Patient.id)\
+        .outerjoin(Doctor, Appointment.doctor_id == Doctor.id)\
+        .outerjoin(Department, Doctor.department_id == Department.id)
+
+    if start:
+        stmt = stmt.where(Appointment.date >= start)
+    if end:
+        stmt = stmt.where(Appointment.date <= end)
+    if department_id:
+        stmt = stmt.where(Doctor.department_id == department_id)
+    if status:
+        stmt = stmt.where(Appointment.status == status)
+    order = Treatment.id if kind == "treatments" else Appointment.id
+    return stmt.order_by(order)
+
+
+def parse_filters(start=None, end=None, department=None, status=None):
+    """Turn raw strings (query args / CLI options) into export_query() kwargs; ValueError if invalid."""
+    if status and status.upper() not in AP_Status.__members__:
+        raise ValueError(f"Unknown status: {status}")
+    return {
+        "start": date.fromisoformat(start) if start else None,
+        "end": date.fromisoformat(end) if end else None,
+        "department_id": int(department) if department else None,
+        "status": AP_Status[status.upper()] if status else None,
+    }
+
+
+def _plain(value):
+    if isinstance(value, enum.Enum):
+        return value.name
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def _chunks(stmt):
+    result = db.session.execute(stmt.execution_options(yield_per=EXPORT_CHUNK))
+    for partition in result.partitions():
+        yield partition
+
+
+def stream_export(kind, fmt, **filters):
+    """Yield the export as text chunks of at most EXPORT_CHUNK rows."""
+    names = [name for name, _ in _columns(kind)]
+    stmt = export_query(kind, **filters)
+    buffer = io.StringIO()
+    if fmt == "csv":
+        writer = csv.writer(buffer)
+        writer.writerow(names)
+    for rows in _chunks(stmt):
+        for row in rows:
+            values = [_plain(v) for v in row]
+            if fmt == "csv":
+                writer.writerow(values)
+            else:
+                buffer.write(json.dumps(dict(zip(names, values))) + "\n")
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+@click.command("export")
+@click.argument("kind", type=click.Choice(KINDS))
+@click.option("--format", "fmt", type=click.Choice(FORMATS), default="csv", show_default=True)
+@click.option("--from", "start", help="First appointment date (YYYY-MM-DD).")
+@click.option("--to", "end", help="Last appointment date (YYYY-MM-DD).")
+@click.option("--department", help="Department id.")
+@click.option("--status", type=click.Choice([s.name for s in AP_Status], case_sensitive=False))
+@click.option("-o", "--output", type=click.Path(dir_okay=False), help="Defaults to stdout.")
+def export_command(kind, fmt, start, end, department, status, output):
+    """Stream appointments or treatments to CSV or NDJSON."""
+    try:
+        filters = parse_filters(start, end, department, status)
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+    out = open(output, "w", newline="") if output else sys.stdout
+    try:
+        for chunk in stream_export(kind, fmt, **filters):
+            out.write(chunk)
+    finally:
+        if output:
+            out.close()
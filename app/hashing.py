@@ -0,0 +1,216 @@
+"""
+Password hashing off the request threads.
+
+Hashing is deliberately slow. Running it inline lets a login burst occupy
+every request worker, and cheap pages queue up behind it. Here hashes run
+in a process pool behind a bounded queue. Every web worker owns a pool, so
+by default the CPUs are split between them: WEB_CONCURRENCY (the web
+worker count, which gunicorn also reads) pools of cpu_count //
+WEB_CONCURRENCY processes each. Once
+`max_pending` jobs are waiting, new ones fail fast with HashingBusy, which
+create_app turns into a 503 with Retry-After. A job that is not done within
+TIMEOUT_SECONDS is answered the same way, but keeps its queue slot until
+its process is actually free.
+
+`verify_and_upgrade()` also rehashes a password on login when it was
+stored with a different method than PASSWORD_HASH_METHOD.
+"""
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from werkzeug.security import check_password_hash, generate_password_hash
+
+DEFAULT_METHOD = "scrypt"
+# Pending jobs allowed per pool process before new ones are rejected
+QUEUE_FACTOR = 4
+TIMEOUT_SECONDS = 10
+LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class HashingBusy(Exception):
+    """The hashing queue is full; the client should retry shortly."""
+
+
+def _hash(password, method):
+    return generate_password_hash(password, method=method)
+
+
+def _check(pwhash, password):
+    return check_password_hash(pwhash, password)
+
+
+def default_workers():
+    """This web worker's share of the CPUs."""
+    web_workers = int(os.getenv("WEB_CONCURRENCY") or 1)
+    return max(1, (os.cpu_count() or 1) // max(1, web_workers))
+
+
+class HashingPool:
+    def __init__(self, workers=None, max_pending=None, method=DEFAULT_METHOD):
+        self.workers = default_workers() if workers is None else workers
+        self.max_pending = max_pending or max(1, self.workers) * QUEUE_FACTOR
+        self.method = method
+        self._prefix = None
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._stats = {
+            "submitted": 0, "rejected": 0, "completed": 0,
+            "in_flight": 0, "peak_in_flight": 0,
+            "latency_sum": 0.0, "latency_max": 0.0,
+            "latency_buckets": [0] * (len(LATENCY_BUCKETS) + 1),
+        }
+
+    def _get_executor(self):
+        # Created lazily, and again after a fork, so every worker process owns its pool
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                self._pid = os.getpid()
+            return self._executor
+
+    def _run(self, fn, *args, wait=False):
+        # wait=True queues for a slot (up to TIMEOUT_SECONDS) instead of failing fast
+        acquired = self._slots.acquire(timeout=TIMEOUT_SECONDS) if wait else self._slots.acquire(blocking=False)
+        if not acquired:
+            with self._lock:
+                self._stats["rejected"] += 1
+            raise HashingBusy("Too many password operations in progress")
+
+        started = time.perf_counter()
+        with self._lock:
+            self._stats["submitted"] += 1
+            self._stats["in_flight"] += 1
+            self._stats["peak_in_flight"] = max(self._stats["peak_in_flight"], self._stats["in_flight"])
+        if self.workers == 0:
+            try:
+                return fn(*args)
+            finally:
+                self._finished(started)
+        try:
+            future = self._get_executor().submit(fn, *args)
+        except BaseException:
+            self._finished(started)
+            raise
+        # The slot is held until the job is done, not until the caller stops waiting
+        future.add_done_callback(lambda _: self._finished(started))
+        try:
+            return future.result(timeout=TIMEOUT_SECONDS)
+        except FutureTimeout:
+            # Not an error in the request: the pool is saturated, so answer like a full queue.
+            # A job still waiting is dropped; one already running cannot be stopped.
+            future.cancel()
+            with self._lock:
+                self._stats["rejected"] += 1
+            raise HashingBusy("Password operation timed out")
+
+    def _finished(self, started):
+        elapsed = time.perf_counter() - started
+        self._slots.release()
+        with self._lock:
+            stats = self._stats
+            stats["in_flight"] -= 1
+            stats["completed"] += 1
+            stats["latency_sum"] += elapsed
+            stats["latency_max"] = max(stats["latency_max"], elapsed)
+            bucket = next((i for i, b in enumerate(LATENCY_BUCKETS) if elapsed <= b), len(LATENCY_BUCKETS))
+            stats["latency_buckets"][bucket] += 1
+
+    def shutdown(self):
+        """Stop this process's pool processes; queued jobs are dropped. A later call starts a new pool."""
+        with self._lock:
+            executor, owned = self._executor, self._pid == os.getpid()
+            self._executor = None
+        # An executor inherited through fork belongs to the parent
+        if executor is not None and owned:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def hash(self, password):
+        return self._run(_hash, password, self.method)
+
+    def check(self, pwhash, password):
+        return self._run(_check, pwhash, password)
+
+    def hash_many(self, passwords, bounded=False):
+        """
+        Hash a batch across every pool process. Unbounded, it bypasses the
+        request queue and is meant for offline jobs (the import-users
+        command). Bounded, for a web worker, each hash takes a queue slot,
+        at most one per pool process at a time, waiting for one rather than
+        failing fast, so logins keep the rest of the queue.
+        """
+        passwords = list(passwords)
+        if bounded:
+            def hash_one(password):
+                return self._run(_hash, password, self.method, wait=True)
+
+            if self.workers == 0:
+                return [hash_one(password) for password in passwords]
+            with ThreadPoolExecutor(max_workers=self.workers) as threads:
+                return list(threads.map(hash_one, passwords))
+        args = [self.method] * len(passwords)
+        if self.workers == 0 or len(passwords) < 2:
+            return list(map(_hash, passwords, args))
+        chunksize = max(1, len(passwords) // (self.workers * 4))
+        return list(self._get_executor().map(_hash, passwords, args, chunksize=chunksize))
+
+    def needs_rehash(self, pwhash):
+        """True when `pwhash` was made with other parameters than `method`."""
+        if self._prefix is None:
+            self._prefix = generate_password_hash("", method=self.method).split("$", 1)[0]
+        return pwhash.split("$", 1)[0] != self._prefix
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats, latency_buckets=list(self._stats["latency_buckets"]))
+        stats["queue_depth"] = stats["in_flight"]
+        stats["max_pending"] = self.max_pending
+        stats["workers"] = self.workers
+        stats["latency_avg"] = stats["latency_sum"] / stats["completed"] if stats["completed"] else 0.0
+        return stats
+
+
+pool = HashingPool(workers=0)
+
+
+def configure(app):
+    """(Re)build the module pool from HASH_WORKERS / HASH_QUEUE_SIZE / PASSWORD_HASH_METHOD."""
+    global pool
+    workers = app.config.get("HASH_WORKERS")
+    # The old pool's processes would otherwise live as long as this one
+    pool.shutdown()
+    pool = HashingPool(
+        workers=None if workers is None else int(workers),
+        max_pending=int(app.config.get("HASH_QUEUE_SIZE") or 0) or None,
+        method=app.config.get("PASSWORD_HASH_METHOD") or DEFAULT_METHOD,
+    )
+
+
+def hash_password(password):
+    return pool.hash(password)
+
+
+def hash_passwords(passwords, bounded=False):
+    return pool.hash_many(passwords, bounded)
+
+
+def verify_password(pwhash, password):
+    return pool.check(pwhash, password)
+
+
+def verify_and_upgrade(user, password):
+    """
+    Check `password` against `user.password`; on success, re-hash it with the
+    configured method if it was stored with an older one (caller commits).
+    """
+    if not verify_password(user.password, password):
+        return False
+    if pool.needs_rehash(user.password):
+        user.password = hash_password(password)
+    return True
+
+
+def stats():
+    return pool.stats()
@@ -0,0 +1,145 @@
+"""
+Per-patient medical history timeline for the doctor views.
+
+The timeline is a denormalised, newest-first list of treatment entries
+(diagnosis, prescription, doctor, appointment date and status) built with
+one projected query and cached per patient. Adding a treatment updates a
+cached timeline in place; appointment status changes drop it. Clinical
+notes are not part of the timeline and are fetched one treatment at a
+time when a doctor expands them.
+
+Cached timelines are stamped with the "history" collection version
+(app.versions), read from the database the timeline is read from. Every
+write that can change a timeline bumps it: ORM writes through the flush
+hook below, set-based statements (the batch API, the lifecycle job) by
+calling `versions.bump("history")`. A worker reloads a timeline whose
+stamp is behind, so writes handled elsewhere show within VERSION_TTL.
+"""
+from flask import request
+from sqlalchemy import and_, event, func, inspect
+from app import versions
+from app.cache import TTLCache
+from app.models import db, Treatment, Appointment, Doctor
+from app.pagination import KeysetPage, decode_cursor, encode_cursor, page_size_arg
+
+HISTORY_PAGE_SIZE = 20
+
+history_cache = TTLCache(maxsize=512, ttl=600)
+
+# Columns shown in (or selecting) timeline entries, besides the treatment's own
+TIMELINE_COLUMNS = {
+    Appointment: ("patient_id", "doctor_id", "date", "status"),
+    Doctor: ("full_name",),
+}
+
+
+class Timeline:
+    def __init__(self, entries):
+        self.entries = entries
+        self.positions = {e["treatment_id"]: i for i, e in enumerate(entries)}
+
+    def prepend(self, entry):
+        # Other entries of the same appointment pick up its new status
+        rest = [
+            dict(e, status=entry["status"]) if e["appointment_id"] == entry["appointment_id"] else e
+            for e in self.entries
+        ]
+        return Timeline([entry] + rest)
+
+
+def _entry(treatment_id, appointment_id, diagnosis, prescription, follow_up,
+           created_at, appointment_date, status, doctor_name, has_notes):
+    return {
+        "treatment_id": treatment_id,
+        "appointment_id": appointment_id,
+        "diagnosis": diagnosis,
+        "prescription": prescription,
+        "follow_up": follow_up,
+        "created_at": created_at,
+        "date": appointment_date,
+        "status": status.value if status else None,
+        "doctor": doctor_name,
+        "has_notes": bool(has_notes),
+    }
+
+
+def _load(patient_id):
+    has_notes = and_(Treatment.notes.isnot(None), func.length(Treatment.notes) > 0)
+    rows = db.session.query(
+        Treatment.id, Treatment.appointment_id, Treatment.diagnosis, Treatment.prescription,
+        Treatment.follow_up, Treatment.created_at, Appointment.date, Appointment.status,
+        Doctor.full_name, has_notes
+    ).join(Appointment, Treatment.appointment_id == Appointment.id)\
+        .outerjoin(Doctor, Appointment.doctor_id == Doctor.id)\
+        .filter(Appointment.patient_id == patient_id)\
+        .order_by(Treatment.created_at.desc(), Treatment.id.desc())
+    return Timeline([_entry(*row) for row in rows])
+
+
+def timeline(patient_id):
+    stamp = versions.current_version("history")
+    cached = history_cache.get(patient_id)
+    if cached is None or cached[0] != stamp:
+        cached = (stamp, _load(patient_id))
+        history_cache.set(patient_id, cached)
+    return cached[1]
+
+
+def record_treatment(treatment, appointment):
+    """Fold a just-committed treatment into the patient's cached timeline."""
+    cached = history_cache.get(appointment.patient_id)
+    if cached is None:
+        return
+    stamp = versions.current_version("history", primary=True)
+    if cached[0] != stamp - 1:
+        # Other writes landed since it was cached; it may be missing them
+        history_cache.pop(appointment.patient_id)
+        return
+    doctor = appointment.doctor
+    history_cache.set(appointment.patient_id, (stamp, cached[1].prepend(_entry(
+        treatment.id, appointment.id, treatment.diagnosis, treatment.prescription,
+        treatment.follow_up, treatment.created_at, appointment.date, appointment.status,
+        doctor.full_name if doctor else None, treatment.notes
+    ))))
+
+
+def invalidate(patient_id):
+    history_cache.pop(patient_id)
+
+
+def _changes_timeline(session, obj):
+    if isinstance(obj, Treatment):
+        return session.is_modified(obj, include_collections=False)
+    state = inspect(obj)
+    return any(state.attrs[name].history.has_changes() for name in TIMELINE_COLUMNS.get(type(obj), ()))
+
+
+@event.listens_for(db.session, "after_flush")
+def _bump_flushed(session, flush_context):
+    # A new appointment has no treatments yet, so booking does not touch any timeline
+    if any(isinstance(obj, Treatment) for obj in session.new) \
+            or any(isinstance(obj, (Treatment, Appointment)) for obj in session.deleted) \
+            or any(_changes_timeline(session, obj) for obj in session.dirty):
+        versions.bump("history")
+
+
+def timeline_page(patient_id, limit=None):
+    """One ?after= / ?before= page of the patient's timeline."""
+    limit = limit or page_size_arg(HISTORY_PAGE_SIZE)
+    current = timeline(patient_id)
+    after = decode_cursor(request.args.get("after", ""))
+    before = decode_cursor(request.args.get("before", ""))
+
+    if before in current.positions:
+        end = current.positions[before]
+        start = max(0, end - limit)
+    elif after in current.positions:
+        start = current.positions[after] + 1
+    else:
+        start = 0
+
+    items = current.entries[start:start + limit]
+    has_next = start + limit < len(current.entries)
+    next_cursor = encode_cursor(items[-1]["treatment_id"]) if items and has_next else None
+    prev_cursor = encode_cursor(items[0]["treatment_id"]) if items and start > 0 else None
+    return KeysetPage(items, next_cursor, prev_cursor, limit)
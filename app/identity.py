@@ -0,0 +1,48 @@
+"""
+Identity cache for the Flask-Login user_loader.
+
+Every authenticated request needs the User row plus its patient/doctor
+profile. They are loaded together once, kept detached in a bounded TTL
+cache, and merged into each request's session with `load=False`, which
+attaches them without touching the database.
+
+Each entry is stamped with the "identities" collection version
+(app.versions), which every ORM write to a user or profile bumps. A hit
+whose stamp is behind is reloaded, so a change made in one worker reaches
+the others within VERSION_TTL seconds. Writers should still call
+`invalidate(user_id)`, which drops this worker's entry at once.
+"""
+from sqlalchemy.orm import Session, joinedload
+from app import versions
+from app.cache import TTLCache
+from app.models import db, User
+
+identity_cache = TTLCache(maxsize=4096, ttl=30)
+
+
+def _load_detached(user_id):
+    # A private session keeps the cached graph out of the request's identity
+    # map; closing it leaves the loaded attributes in place, detached.
+    with Session(db.engine) as session:
+        return session.get(
+            User, user_id,
+            options=[joinedload(User.patient_profile), joinedload(User.doctor_profile)]
+        )
+
+
+def load_identity(user_id):
+    # From the primary: a lagging replica would stamp a stale row as current
+    stamp = versions.current_version("identities", primary=True)
+    cached = identity_cache.get(user_id)
+    if cached is None or cached[0] != stamp:
+        user = _load_detached(user_id)
+        if user is None:
+            return None
+        cached = (stamp, user)
+        identity_cache.set(user_id, cached)
+    return db.session.merge(cached[1], load=False)
+
+
+def invalidate(user_id):
+    if user_id is not None:
+        identity_cache.pop(int(user_id))
@@ -0,0 +1,171 @@
+"""
+Per-request SQL instrumentation.
+
+Engine events time every statement issued while a request is handled and
+collect, per request:
+
+  * the query count and total database time;
+  * the slowest statements, with the shape of their parameters (types,
+    never values);
+  * statements whose SQL text repeats SQL_NPLUSONE_THRESHOLD times or more,
+    flagged as likely N+1s together with the route and the template that
+    was rendering when they ran (lazy loads usually fire from templates).
+
+Statements slower than SQL_SLOW_MS are logged as they finish. At the end of
+the request the summary is written as one JSON line to the "homa.sql"
+logger, which writes to stderr at SQL_LOG_LEVEL unless the deployment has
+given it handlers of its own; in debug mode the summary is also sent back
+as X-DB-* response headers.
+"""
+import heapq
+import json
+import logging
+import time
+from collections import Counter
+from flask import g, has_request_context, request, before_render_template
+from sqlalchemy import event
+from app.models import db
+
+logger = logging.getLogger("homa.sql")
+
+SLOWEST_KEPT = 3
+HEADER_SQL_CHARS = 200
+
+
+class RequestStats:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.shapes = Counter()
+        self.origins = {}
+        self.slowest = []  # min-heap of (seconds, sequence, statement, params shape)
+        self.template = None
+
+    def record(self, statement, params_shape, elapsed):
+        self.count += 1
+        self.total += elapsed
+        self.shapes[statement] += 1
+        self.origins[statement] = self.template
+        entry = (elapsed, self.count, statement, params_shape)
+        if len(self.slowest) < SLOWEST_KEPT:
+            heapq.heappush(self.slowest, entry)
+        else:
+            heapq.heappushpop(self.slowest, entry)
+
+    def repeated(self, threshold):
+        return [
+            {"statement": statement, "count": count, "template": self.origins[statement]}
+            for statement, count in self.shapes.most_common()
+            if count >= threshold
+        ]
+
+    def summary(self, threshold):
+        return {
+            "route": request.endpoint,
+            "method": request.method,
+            "path": request.path,
+            "queries": self.count,
+            "db_ms": round(self.total * 1000, 2),
+            "slowest": [
+                {"ms": round(elapsed * 1000, 2), "statement": statement, "params": shape}
+                for elapsed, _, statement, shape in sorted(self.slowest, reverse=True)
+            ],
+            "n_plus_one": self.repeated(threshold),
+        }
+
+
+def _params_shape(parameters, executemany):
+    if executemany:
+        rows = list(parameters or [])
+        return f"{len(rows)} x " + _params_shape(rows[0] if rows else (), False)
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(f"{k}: {type(v).__name__}" for k, v in parameters.items()) + "}"
+    return "(" + ", ".join(type(v).__name__ for v in parameters or ()) + ")"
+
+
+def _one_line(statement, limit=HEADER_SQL_CHARS):
+    text = " ".join(statement.split())
+    return text if len(text) <= limit else text[:limit - 3] + "..."
+
+
+def _current():
+    return g.get("sql_stats") if has_request_context() else None
+
+
+def watch(engine, slow_seconds):
+    """Time the statements of `engine` (for async engines, pass `.sync_engine`)."""
+    # The start time lives on the statement's execution context: a statement that
+    # raises never reaches after_cursor_execute, and leaves nothing behind on the
+    # pooled connection
+    @event.listens_for(engine, "before_cursor_execute")
+    def _start(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context.homa_started = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _finish(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "homa_started", None)
+        stats = _current()
+        if stats is None or started is None:
+            return
+        elapsed = time.perf_counter() - started
+        shape = _params_shape(parameters, executemany)
+        stats.record(statement, shape, elapsed)
+        if elapsed >= slow_seconds:
+            logger.warning(json.dumps({
+                "event": "slow_query", "route": request.endpoint, "template": stats.template,
+                "ms": round(elapsed * 1000, 2), "statement": _one_line(statement, 1000), "params": shape,
+            }))
+
+
+def _configure_logger(level):
+    logger.setLevel(level)
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        # The lines are JSON already; the root logger would print them a second time
+        logger.propagate = False
+
+
+def init_app(app):
+    """Hook the engine and request lifecycle of `app` (after db.init_app)."""
+    if not app.config.get("SQL_INSTRUMENTATION", True):
+        return
+    threshold = app.config.get("SQL_NPLUSONE_THRESHOLD", 5)
+    _configure_logger(app.config.get("SQL_LOG_LEVEL", "INFO"))
+
+    with app.app_context():
+        # Every bind, so reads routed to the replica are counted too
+        for engine in db.engines.values():
+            watch(engine, app.config.get("SQL_SLOW_MS", 100) / 1000)
+
+    @before_render_template.connect_via(app)
+    def _rendering(sender, template, context, **extra):
+        stats = _current()
+        if stats is not None:
+            stats.template = template.name
+
+    @app.before_request
+    def _begin():
+        g.sql_stats = RequestStats()
+
+    @app.after_request
+    def _report(response):
+        stats = _current()
+        if stats is None:
+            return response
+        summary = stats.summary(threshold)
+        logger.info(json.dumps({"event": "request_sql", "status": response.status_code, **summary}, default=str))
+        if app.debug:
+            response.headers["X-DB-Queries"] = str(summary["queries"])
+            response.headers["X-DB-Time-ms"] = str(summary["db_ms"])
+            if summary["slowest"]:
+                top = summary["slowest"][0]
+                response.headers["X-DB-Slowest"] = f"{top['ms']}ms {_one_line(top['statement'])} {top['params']}"
+            if summary["n_plus_one"]:
+                response.headers["X-DB-N-Plus-One"] = "; ".join(
+                    f"{item['count']}x {_one_line(item['statement'], 120)} @ {item['template'] or 'view'}"
+                    for item in summary["n_plus_one"]
+                )
+        return response
@@ -0,0 +1,84 @@
+"""
+Appointment lifecycle job, `flask --app run lifecycle`; run it from cron
+shortly after midnight.
+
+  1. BOOKED appointments whose day has passed become NO_SHOW. Each chunk of
+     --chunk-size rows is one set-based `UPDATE ... WHERE id IN (SELECT id
+     ... LIMIT n)` over the partial BOOKED index, committed on its own, so
+     an interrupted run keeps its progress and the next one carries on.
+  2. Schedule snapshots of past days are dropped and those of the next
+     --days days are rebuilt (see app.schedules).
+
+Both steps only look at the current state of the tables, so a second run
+changes nothing. Each step reports how many rows it handled per second.
+"""
+import time
+from datetime import date, timedelta
+import click
+from sqlalchemy import select, update
+from app.models import db, Appointment, AP_Status
+from app import schedules, stats, versions
+
+CHUNK_SIZE = 5000
+
+
+def expire_stale(before, chunk_size=CHUNK_SIZE, progress=None):
+    """Mark BOOKED appointments dated before `before` as NO_SHOW, committing per chunk; returns the count."""
+    stale = select(Appointment.id).where(
+        Appointment.status == AP_Status.BOOKED, Appointment.date < before
+    ).limit(chunk_size)
+    total = 0
+    while True:
+        changed = db.session.execute(
+            update(Appointment).where(Appointment.id.in_(stale.scalar_subquery()))
+            .values(status=AP_Status.NO_SHOW)
+            .returning(Appointment.doctor_id, Appointment.date)
+            .execution_options(synchronize_session=False)
+        ).all()
+        if not changed:
+            db.session.rollback()
+            return total
+        # Past days have no schedule snapshots; the ETags, timelines and statistics need updating
+        versions.bump("appointments", "history")
+        stats.add_appointments(((doctor_id, day, AP_Status.BOOKED) for doctor_id, day in changed), sign=-1)
+        stats.add_appointments((doctor_id, day, AP_Status.NO_SHOW) for doctor_id, day in changed)
+        db.session.commit()
+        total += len(changed)
+        if progress:
+            progress(total)
+
+
+def prebuild_schedules(first_day, days):
+    """Drop stale snapshots and rebuild `days` days from `first_day`, committing per day; returns rows written."""
+    schedules.purge_before(date.today())
+    db.session.commit()
+    built = 0
+    for offset in range(days):
+        built += schedules.build_day(first_day + timedelta(days=offset))
+        db.session.commit()
+    return built
+
+
+def _report(label, rows, started):
+    elapsed = time.perf_counter() - started
+    rate = rows / elapsed if elapsed > 0 else 0
+    click.echo(f"{label}: {rows} rows in {elapsed:.2f}s ({rate:,.0f} rows/s)")
+
+
+@click.command("lifecycle")
+@click.option("--before", type=click.DateTime(formats=["%Y-%m-%d"]),
+              help="Expire BOOKED appointments dated before this day (default: today).")
+@click.option("--days", default=1, show_default=True, help="Days of schedules to prebuild, starting tomorrow.")
+@click.option("--chunk-size", default=CHUNK_SIZE, show_default=True, help="Appointments updated per transaction.")
+def lifecycle_command(before, days, chunk_size):
+    """Mark past BOOKED appointments as no-shows and prebuild the next days' schedules."""
+    before = before.date() if before else date.today()
+
+    started = time.perf_counter()
+    expired = expire_stale(before, chunk_size,
+                           progress=lambda total: click.echo(f"  ... {total} marked no-show"))
+    _report("No-shows", expired, started)
+
+    started = time.perf_counter()
+    built = prebuild_schedules(date.today() + timedelta(days=1), days)
+    _report("Schedules", built, started)
@@ -0,0 +1,213 @@
+"""
+Request metrics in the Prometheus text exposition format, served at /metrics.
+
+Request hooks time every view of the app and count, per blueprint:
+
+  * homa_http_request_duration_seconds   histogram (blueprint, endpoint)
+  * homa_http_requests_total             counter (blueprint, status)
+  * homa_http_request_bytes_total        counter (blueprint)
+  * homa_http_response_bytes_total       counter (blueprint)
+  * homa_db_seconds_total / homa_db_queries_total (blueprint), from
+    app.instrumentation when it is enabled
+  * homa_password_hash_* from app.hashing
+
+Updates only touch dicts in memory. With METRICS_DIR set, each worker
+process also writes a snapshot of its own values to a file in that
+directory (at most once per FLUSH_SECONDS), and /metrics sums the files of
+every process, so any worker can answer a scrape for the whole server.
+Files of exited workers are kept so counters never go backwards; clear the
+directory when the server is redeployed.
+"""
+import glob
+import json
+import os
+import threading
+import time
+from flask import g, request, Response
+from app import hashing
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+FLUSH_SECONDS = 1.0
+
+HELP = {
+    "homa_http_request_duration_seconds": ("histogram", "Time spent handling a request."),
+    "homa_http_requests_total": ("counter", "Requests handled, by status code."),
+    "homa_http_request_bytes_total": ("counter", "Request body bytes received."),
+    "homa_http_response_bytes_total": ("counter", "Response body bytes sent (streamed bodies excluded)."),
+    "homa_db_seconds_total": ("counter", "Time spent in SQL statements."),
+    "homa_db_queries_total": ("counter", "SQL statements executed."),
+    "homa_password_hashes_total": ("counter", "Password hash and verify operations completed."),
+    "homa_password_hash_rejected_total": ("counter", "Password operations rejected because the queue was full."),
+    "homa_password_hash_seconds_total": ("counter", "Time spent hashing and verifying passwords."),
+}
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.pid = os.getpid()
+        self.started = time.time_ns()
+        self.counters = {}    # (name, labels) -> value
+        self.histograms = {}  # (name, labels) -> [bucket counts..., +Inf count, sum]
+        self.last_flush = 0.0
+
+    def _check_fork(self):
+        # A forked worker starts its own series instead of re-counting the parent's
+        if self.pid != os.getpid():
+            self._reset()
+
+    def inc(self, name, labels, value=1):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._check_fork()
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, labels, value):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._check_fork()
+            buckets = self.histograms.get(key)
+            if buckets is None:
+                buckets = self.histograms[key] = [0] * (len(DURATION_BUCKETS) + 1) + [0.0]
+            index = next((i for i, b in enumerate(DURATION_BUCKETS) if value <= b), len(DURATION_BUCKETS))
+            buckets[index] += 1
+            buckets[-1] += value
+
+    def snapshot(self):
+        with self._lock:
+            self._check_fork()
+            counters = dict(self.counters)
+            histograms = {k: list(v) for k, v in self.histograms.items()}
+        # Hashing keeps its own per-process stats; they are exported as counters
+        stats = hashing.stats()
+        counters[("homa_password_hashes_total", ())] = stats["completed"]
+        counters[("homa_password_hash_rejected_total", ())] = stats["rejected"]
+        counters[("homa_password_hash_seconds_total", ())] = stats["latency_sum"]
+        return counters, histograms
+
+    # ---------------- MULTI-PROCESS ----------------
+
+    def _path(self, directory):
+        return os.path.join(directory, f"metrics-{self.pid}-{self.started}.json")
+
+    def flush(self, directory, force=False):
+        now = time.monotonic()
+        if not force and now - self.last_flush < FLUSH_SECONDS:
+            return
+        self.last_flush = now
+        counters, histograms = self.snapshot()
+        data = {
+            "counters": [[name, labels, value] for (name, labels), value in counters.items()],
+            "histograms": [[name, labels, values] for (name, labels), values in histograms.items()],
+        }
+        path = self._path(directory)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+
+    def collect(self, directory=None):
+        """Counters and histograms summed over every process (or just this one)."""
+        if not directory:
+            return self.snapshot()
+        self.flush(directory, force=True)
+        counters, histograms = {}, {}
+        for path in glob.glob(os.path.join(directory, "metrics-*.json")):
+            try:
+                with open(path) as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            for name, labels, value in data["counters"]:
+                key = (name, tuple(tuple(pair) for pair in labels))
+                counters[key] = counters.get(key, 0) + value
+            for name, labels, values in data["histograms"]:
+                key = (name, tuple(tuple(pair) for pair in labels))
+                total = histograms.setdefault(key, [0] * len(values))
+                histograms[key] = [a + b for a, b in zip(total, values)]
+        return counters, histograms
+
+
+registry = Registry()
+
+
+# ---------------- EXPOSITION ----------------
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def exposition(counters, histograms):
+    lines = []
+    series = {}
+    for (name, labels), value in counters.items():
+        series.setdefault(name, []).append((labels, value))
+    for (name, labels), values in histograms.items():
+        series.setdefault(name, []).append((labels, values))
+
+    for name in sorted(series):
+        kind, text = HELP.get(name, ("untyped", ""))
+        lines.append(f"# HELP {name} {text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in sorted(series[name], key=lambda s: s[0]):
+            if kind != "histogram":
+                lines.append(f"{name}{_labels(labels)} {value}")
+                continue
+            cumulative = 0
+            for bound, count in zip(DURATION_BUCKETS + ("+Inf",), value[:-1]):
+                cumulative += count
+                lines.append(f"{name}_bucket{_labels(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labels)} {value[-1]}")
+            lines.append(f"{name}_count{_labels(labels)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+# ---------------- FLASK ----------------
+
+def init_app(app):
+    """Time every view of `app` and serve /metrics; call after the blueprints are registered."""
+    directory = app.config.get("METRICS_DIR")
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    @app.before_request
+    def _start_timer():
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def _record(response):
+        started = g.get("metrics_started")
+        if started is None:
+            return response
+        blueprint = request.blueprint or "app"
+        registry.observe("homa_http_request_duration_seconds",
+                         {"blueprint": blueprint, "endpoint": request.endpoint or "none"},
+                         time.perf_counter() - started)
+        registry.inc("homa_http_requests_total", {"blueprint": blueprint, "status": response.status_code})
+        registry.inc("homa_http_request_bytes_total", {"blueprint": blueprint}, request.content_length or 0)
+        if not response.is_streamed:
+            registry.inc("homa_http_response_bytes_total", {"blueprint": blueprint},
+                         response.calculate_content_length() or 0)
+        sql = g.get("sql_stats")
+        if sql is not None:
+            registry.inc("homa_db_seconds_total", {"blueprint": blueprint}, sql.total)
+            registry.inc("homa_db_queries_total", {"blueprint": blueprint}, sql.count)
+        if directory:
+            registry.flush(directory)
+        return response
+
+    def metrics():
+        counters, histograms = registry.collect(directory)
+        return Response(exposition(counters, histograms), mimetype="text/plain; version=0.0.4")
+
+    app.add_url_rule("/metrics", "metrics", metrics)
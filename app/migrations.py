@@ -0,0 +1,211 @@
+"""
+Schema upgrades for databases created before a change to app/models.py.
+
+`db.create_all()` only creates missing tables; columns and indexes declared
+on tables that already exist are skipped. `upgrade_columns()` and
+`upgrade_indexes()` fill that gap, `upgrade_enums()` adds new members
+to native enum types, and `explain_hot_paths()` shows whether
+the hot queries actually use the indexes. `init_db()` runs all of it; it is
+the `flask init-db` deploy step, since create_app() no longer touches the
+database.
+"""
+from datetime import date
+import click
+from sqlalchemy import Enum, inspect, select, text
+from app.models import db, User, Appointment, Treatment, Doctor, Patient, AP_Status
+from app.search import ensure_search_index
+from app.booking import backfill_slots, rebuild_slot_days
+from app.stats import SUMMARY_TABLES, rebuild_stats
+
+
+def missing_columns():
+    """(table, column) pairs declared on the models but absent from the live database."""
+    inspector = inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+    missing = []
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        present = {col["name"] for col in inspector.get_columns(table.name)}
+        missing.extend((table, col) for col in table.columns if col.name not in present)
+    return missing
+
+
+def upgrade_columns():
+    """Add missing nullable columns with ALTER TABLE; returns "table.column" names."""
+    added = []
+    with db.engine.begin() as conn:
+        for table, column in missing_columns():
+            if not column.nullable:
+                raise RuntimeError(f"Cannot add NOT NULL column {table.name}.{column.name} automatically")
+            col_type = column.type.compile(dialect=conn.dialect)
+            conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {col_type}"))
+            added.append(f"{table.name}.{column.name}")
+    return added
+
+
+def missing_indexes():
+    """Indexes declared on the models but absent from the live database."""
+    inspector = inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+    missing = []
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        present = {ix["name"] for ix in inspector.get_indexes(table.name)}
+        missing.extend(ix for ix in table.indexes if ix.name not in present)
+    return missing
+
+
+def upgrade_indexes():
+    """Create any missing indexes; returns the names that were created."""
+    created = []
+    for index in missing_indexes():
+        index.create(db.engine, checkfirst=True)
+        created.append(index.name)
+    return created
+
+
+def upgrade_enums():
+    """Add new enum members to native (PostgreSQL) enum types; returns "type.MEMBER" names."""
+    if db.engine.dialect.name != "postgresql":
+        # Elsewhere enums are plain VARCHAR columns
+        return []
+    added = []
+    types = {
+        column.type.name: column.type for table in db.metadata.sorted_tables for column in table.columns
+        if isinstance(column.type, Enum) and column.type.native_enum
+    }
+    # ALTER TYPE ... ADD VALUE cannot run inside a transaction block on older servers
+    with db.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for name, enum_type in types.items():
+            present = set(conn.execute(text(f"SELECT unnest(enum_range(NULL::{name}))::text")).scalars())
+            for member in enum_type.enums:
+                if member not in present:
+                    conn.execute(text(f"ALTER TYPE {name} ADD VALUE '{member}'"))
+                    added.append(f"{name}.{member}")
+    return added
+
+
+def init_db():
+    """Create missing tables, add missing columns, indexes and enum members, set up the search index, backfill slots."""
+    existing_tables = set(inspect(db.engine).get_table_names())
+    db.create_all()
+    changes = upgrade_columns() + upgrade_indexes() + upgrade_enums()
+    ensure_search_index()
+    if backfill_slots():
+        # Legacy appointments now hold their slots; their bits go into the bitmaps
+        rebuild_slot_days()
+        changes.append("backfilled appointment slots")
+    if not existing_tables.issuperset(SUMMARY_TABLES):
+        # Summary tables added to a database that already has data start from a full rebuild
+        rebuild_stats()
+        changes.append("rebuilt statistics")
+    return changes
+
+
+def hot_path_queries(doctor_id="DOC-0-1", patient_id=1, user_id=1, department_id=1):
+    """The statements behind the dashboards and history pages."""
+    return {
+        "doctor dashboard": select(Appointment)
+            .where(Appointment.doctor_id == doctor_id)
+            .order_by(Appointment.date, Appointment.time),
+        "patient upcoming": select(Appointment)
+            .where(Appointment.patient_id == patient_id, Appointment.status == AP_Status.BOOKED)
+            .order_by(Appointment.date),
+        "medical history": select(Treatment)
+            .join(Appointment, Treatment.appointment_id == Appointment.id)
+            .where(Appointment.patient_id == patient_id),
+        "booked from today": select(Appointment)
+            .where(Appointment.status == AP_Status.BOOKED, Appointment.date >= date.today())
+            .order_by(Appointment.date),
+        "doctors in department": select(Doctor).where(Doctor.department_id == department_id),
+        "patient by user": select(Patient).where(Patient.user_id == user_id),
+        "doctor by user": select(Doctor).where(Doctor.user_id == user_id),
+    }
+
+
+def _compile(stmt):
+    return str(stmt.compile(dialect=db.engine.dialect, compile_kwargs={"literal_binds": True}))
+
+
+def _model_indexes():
+    return [index for table in db.metadata.sorted_tables for index in table.indexes]
+
+
+def _explain_sqlite(without_indexes):
+    # pysqlite does not open a transaction before DDL, so BEGIN/ROLLBACK are
+    # issued by hand to make the DROP INDEX statements reversible.
+    raw = db.engine.raw_connection()
+    sqlite_conn = raw.driver_connection
+    previous = sqlite_conn.isolation_level
+    sqlite_conn.isolation_level = None
+    cursor = sqlite_conn.cursor()
+    plans = {}
+    try:
+        cursor.execute("BEGIN")
+        if without_indexes:
+            for index in _model_indexes():
+                cursor.execute(f'DROP INDEX IF EXISTS "{index.name}"')
+        for name, stmt in hot_path_queries().items():
+            rows = cursor.execute("EXPLAIN QUERY PLAN " + _compile(stmt)).fetchall()
+            plans[name] = [row[-1] for row in rows]
+    finally:
+        cursor.execute("ROLLBACK")
+        sqlite_conn.isolation_level = previous
+        raw.close()
+    return plans
+
+
+def explain_hot_paths(without_indexes=False):
+    """
+    {query name: plan lines}. With `without_indexes`, the model indexes are
+    dropped inside a transaction that is rolled back afterwards, giving the
+    "before" plan without touching the schema.
+    """
+    if db.engine.dialect.name == "sqlite":
+        return _explain_sqlite(without_indexes)
+
+    plans = {}
+    with db.engine.connect() as conn:
+        trans = conn.begin()
+        try:
+            if without_indexes:
+                for index in _model_indexes():
+                    index.drop(conn, checkfirst=True)
+            for name, stmt in hot_path_queries().items():
+                plans[name] = [row[0] for row in conn.execute(text("EXPLAIN " + _compile(stmt)))]
+        finally:
+            trans.rollback()
+    return plans
+
+
+@click.command("init-db")
+def init_db_command():
+    """Create or upgrade the schema; safe to run on every deploy."""
+    changes = init_db()
+    click.echo("Schema created/upgraded" + (": " + ", ".join(changes) if changes else "."))
+
+
+@click.command("create-admin")
+def create_admin_command():
+    """Create the default admin account if there is none."""
+    User.make_admin()
+
+
+@click.command("upgrade-indexes")
+def upgrade_indexes_command():
+    """Add columns and indexes declared in app/models.py that the database is missing."""
+    changes = upgrade_columns() + upgrade_indexes()
+    click.echo("Created: " + ", ".join(changes) if changes else "Schema is up to date.")
+
+
+@click.command("explain-indexes")
+def explain_indexes_command():
+    """Show query plans for the hot paths without and with the model indexes."""
+    before = explain_hot_paths(without_indexes=True)
+    after = explain_hot_paths()
+    for name in after:
+        click.echo(f"== {name}")
+        click.echo("   before: " + " | ".join(before[name]))
+        click.echo("   after:  " + " | ".join(after[name]))
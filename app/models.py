@@ -1,10 +1,11 @@
 import enum
 from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime
+from datetime import datetime, time
 from werkzeug.security import generate_password_hash
 from flask_login import UserMixin
+from app.database import RoutingSession
 
-db=SQLAlchemy()
+db=SQLAlchemy(session_options={"class_": RoutingSession})
 
 class UserRole(enum.Enum):
     ADMIN = "admin"
@@ -15,6 +16,8 @@ class AP_Status(enum.Enum):
     BOOKED = "booked"
     CANCELLED = "cancelled"
     COMPLETED = "completed"
+    # Date passed while still BOOKED; set by the lifecycle job (app.lifecycle)
+    NO_SHOW = "no_show"
 
 class Doc_Status(enum.Enum):
     AVAILABLE = "available"
@@ -56,7 +59,7 @@ class User(db.Model, UserMixin):
 class Patient(db.Model):
     __tablename__ = "patients"
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
     gender = db.Column(db.String(10), nullable=False)
     phone = db.Column(db.String(20), nullable=False, unique=True)
     address = db.Column(db.String(256), nullable=True)
@@ -69,14 +72,15 @@ class Patient(db.Model):
 class Doctor(db.Model):
     __tablename__ = "doctors"
     id = db.Column(db.String(16), primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
     qualification = db.Column(db.String(128), nullable=False, default="MBBS")
     experience = db.Column(db.Integer, nullable=False, default=1)
     full_name = db.Column(db.String(128), nullable=True)
     status = db.Column(db.Enum(Doc_Status), default=Doc_Status.AVAILABLE)
-    department_id = db.Column(db.Integer, db.ForeignKey("departments.id"))
+    department_id = db.Column(db.Integer, db.ForeignKey("departments.id"), index=True)
 
     appointments = db.relationship('Appointment', backref='doctor', lazy=True)
+    schedule = db.relationship('DoctorSchedule', backref='doctor', uselist=False)
 
 class Department(db.Model):
     __tablename__ = "departments"
@@ -96,13 +100,103 @@ class Appointment(db.Model):
     date = db.Column(db.Date)
     created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     status = db.Column(db.Enum(AP_Status), default=AP_Status.BOOKED)
+    # Index of the booked slot in the doctor's day (see app.booking); NULL for legacy rows
+    slot = db.Column(db.Integer, nullable=True)
+
+    treatments = db.relationship('Treatment', backref='appointment', lazy=True,
+                                 order_by='Treatment.created_at')
+
+    __table_args__ = (
+        # Doctor dashboard: WHERE doctor_id = ? ORDER BY date, time
+        db.Index("ix_appointments_doctor_date_time", "doctor_id", "date", "time"),
+        # Patient dashboard / history: WHERE patient_id = ? AND status = ? ORDER BY date
+        db.Index("ix_appointments_patient_status_date", "patient_id", "status", "date"),
+        # Upcoming (BOOKED) appointments only; a small slice of the table
+        db.Index(
+            "ix_appointments_booked_date", "date", "doctor_id",
+            sqlite_where=db.text("status = 'BOOKED'"),
+            postgresql_where=db.text("status = 'BOOKED'"),
+        ),
+        # One live appointment per doctor slot; cancelling frees the slot again
+        db.Index(
+            "uq_appointments_doctor_date_slot", "doctor_id", "date", "slot", unique=True,
+            sqlite_where=db.text("status != 'CANCELLED'"),
+            postgresql_where=db.text("status != 'CANCELLED'"),
+        ),
+    )
+
+class DoctorSchedule(db.Model):
+    __tablename__ = "doctor_schedules"
+    doctor_id = db.Column(db.String(16), db.ForeignKey("doctors.id"), primary_key=True)
+    start_time = db.Column(db.Time, nullable=False, default=time(9, 0))
+    end_time = db.Column(db.Time, nullable=False, default=time(17, 0))
+    slot_minutes = db.Column(db.Integer, nullable=False, default=30)
+    # Bit i set = works on weekday i (Monday = 0); default Monday to Friday
+    working_days = db.Column(db.Integer, nullable=False, default=0b0011111)
+
+class SlotDay(db.Model):
+    """Occupancy bitmap of one doctor's slots on one day (bit i = slot i taken)."""
+    __tablename__ = "slot_days"
+    doctor_id = db.Column(db.String(16), db.ForeignKey("doctors.id"), primary_key=True)
+    date = db.Column(db.Date, primary_key=True)
+    booked_mask = db.Column(db.BigInteger, nullable=False, default=0)
+
+class DaySchedule(db.Model):
+    """One doctor's appointments on one day, prebuilt by the lifecycle job (see app.schedules)."""
+    __tablename__ = "day_schedules"
+    doctor_id = db.Column(db.String(16), db.ForeignKey("doctors.id"), primary_key=True)
+    date = db.Column(db.Date, primary_key=True)
+    built_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    entries = db.Column(db.JSON, nullable=False)
+
+class DepartmentStats(db.Model):
+    """Doctors and treatments per department, kept current by app.stats."""
+    __tablename__ = "department_stats"
+    department_id = db.Column(db.Integer, db.ForeignKey("departments.id"), primary_key=True)
+    doctors = db.Column(db.Integer, nullable=False, default=0)
+    treatments = db.Column(db.Integer, nullable=False, default=0)
+
+class DoctorDayStats(db.Model):
+    """Appointments per doctor, day and status, kept current by app.stats."""
+    __tablename__ = "doctor_day_stats"
+    doctor_id = db.Column(db.String(16), db.ForeignKey("doctors.id"), primary_key=True)
+    date = db.Column(db.Date, primary_key=True)
+    status = db.Column(db.Enum(AP_Status), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+class DoctorDayTreatments(db.Model):
+    """Treatments and follow-ups per doctor and appointment day, kept current by app.stats."""
+    __tablename__ = "doctor_day_treatments"
+    doctor_id = db.Column(db.String(16), db.ForeignKey("doctors.id"), primary_key=True)
+    date = db.Column(db.Date, primary_key=True)
+    treatments = db.Column(db.Integer, nullable=False, default=0)
+    follow_ups = db.Column(db.Integer, nullable=False, default=0)
 
 class Treatment(db.Model):
     __tablename__ = "treatments"
     id = db.Column(db.Integer, primary_key=True)
-    appointment_id = db.Column(db.Integer, db.ForeignKey("appointments.id"))
+    appointment_id = db.Column(db.Integer, db.ForeignKey("appointments.id"), index=True)
     diagnosis = db.Column(db.String(256), nullable=False)
     prescription = db.Column(db.String(512), nullable=False)
-    notes = db.Column(db.String(5096), nullable=True)
+    # Long free text; only loaded when accessed
+    notes = db.deferred(db.Column(db.String(5096), nullable=True))
     follow_up = db.Column(db.Boolean, default=False)
-    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
\ No newline at end of file
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+class SearchDocument(db.Model):
+    """Denormalised search text per entity, kept in sync by app.search."""
+    __tablename__ = "search_documents"
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(16), nullable=False)
+    ref = db.Column(db.String(16), nullable=False)
+    body = db.Column(db.String(1024), nullable=False)
+
+    __table_args__ = (
+        db.UniqueConstraint("kind", "ref", name="uq_search_documents_kind_ref"),
+    )
+
+class CollectionVersion(db.Model):
+    """Change counter per API collection, used for ETags (see app.versions)."""
+    __tablename__ = "collection_versions"
+    name = db.Column(db.String(32), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
@@ -0,0 +1,120 @@
+import base64
+import json
+from flask import request
+
+DEFAULT_PAGE_SIZE = 25
+MAX_PAGE_SIZE = 100
+
+
+def encode_cursor(value):
+    """Opaque, URL-safe cursor for a sort key value."""
+    raw = json.dumps(value, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Sort key value of a cursor, or None if it is not one encode_cursor() could have made."""
+    padded = cursor + "=" * (-len(cursor) % 4)
+    try:
+        value = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        return None
+    # Lists, objects, floats and booleans decode fine but are no key of ours
+    if isinstance(value, bool) or not isinstance(value, (str, int)):
+        return None
+    return value
+
+
+def page_size_arg(default=DEFAULT_PAGE_SIZE):
+    """Read ?limit= from the request, clamped to 1..MAX_PAGE_SIZE."""
+    limit = request.args.get("limit", default, type=int) or default
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+class KeysetPage:
+    def __init__(self, items, next_cursor, prev_cursor, limit):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.limit = limit
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def to_dict(self):
+        return {
+            "next_cursor": self.next_cursor,
+            "prev_cursor": self.prev_cursor,
+            "limit": self.limit,
+        }
+
+
+def _keyset_window(key, descending):
+    """(where clause or None, order_by, backwards) for the request's ?after= / ?before= cursors."""
+    after = request.args.get("after")
+    before = request.args.get("before")
+    after_value = decode_cursor(after) if after else None
+    before_value = decode_cursor(before) if before else None
+
+    if before_value is not None:
+        # Walk backwards from the cursor; _keyset_page flips the rows back
+        ahead = key > before_value if descending else key < before_value
+        return ahead, key.asc() if descending else key.desc(), True
+    order = key.desc() if descending else key.asc()
+    if after_value is not None:
+        return (key < after_value if descending else key > after_value), order, False
+    return None, order, False
+
+
+def _keyset_page(rows, key, limit, backwards, from_cursor):
+    if backwards:
+        has_prev = len(rows) > limit
+        items = list(reversed(rows[:limit]))
+        has_next = True
+    else:
+        has_next = len(rows) > limit
+        items = rows[:limit]
+        has_prev = from_cursor
+
+    def cursor_for(item):
+        return encode_cursor(getattr(item, key.key))
+
+    next_cursor = cursor_for(items[-1]) if items and has_next else None
+    prev_cursor = cursor_for(items[0]) if items and has_prev else None
+    return KeysetPage(items, next_cursor, prev_cursor, limit)
+
+
+def keyset_paginate(query, key, descending=False, limit=None):
+    """
+    Page `query` on the unique column `key` using the ?after= / ?before=
+    cursors of the current request. Every page is a `WHERE key > :cursor
+    ORDER BY key LIMIT n` index range scan, so deep pages cost the same as
+    the first one (no OFFSET).
+    """
+    limit = limit or page_size_arg()
+    where, order, backwards = _keyset_window(key, descending)
+    if where is not None:
+        query = query.filter(where)
+    rows = query.order_by(order).limit(limit + 1).all()
+    return _keyset_page(rows, key, limit, backwards, where is not None)
+
+
+async def keyset_paginate_async(session, stmt, key, descending=False, limit=None):
+    """keyset_paginate() for a select() run on an AsyncSession."""
+    limit = limit or page_size_arg()
+    where, order, backwards = _keyset_window(key, descending)
+    if where is not None:
+        stmt = stmt.where(where)
+    rows = (await session.scalars(stmt.order_by(order).limit(limit + 1))).all()
+    return _keyset_page(rows, key, limit, backwards, where is not None)
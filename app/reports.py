@@ -0,0 +1,163 @@
+"""
+Management reports over the appointment history.
+
+`department_report()` returns per-department time series, by month or by
+week: appointment volumes by status, each department's share of the
+hospital's load, cancellation and no-show rates, treatments and the
+follow-up ratio.
+
+It never reads the raw appointments or treatments. The per-doctor-day
+summary tables kept by app.stats are summed per department and day in
+SQL (a year is a few thousand rows per department, whatever the size of
+the history), streamed in chunks, and the days are folded into buckets
+here. Reports are cached per parameter set for REPORT_TTL seconds in each
+worker.
+"""
+from datetime import date, timedelta
+from sqlalchemy import func, select
+from app.cache import TTLCache
+from app.models import db, AP_Status, Department, Doctor, DoctorDayStats, DoctorDayTreatments
+
+REPORT_TTL = 300
+BUCKETS = ("month", "week")
+DEFAULT_MONTHS = 12
+MAX_REPORT_DAYS = 366 * 5
+CHUNK_SIZE = 5000
+
+STATUS_KEYS = {status: status.name.lower() for status in AP_Status}
+COUNTS = ("appointments", *STATUS_KEYS.values(), "treatments", "follow_ups")
+
+report_cache = TTLCache(maxsize=128, ttl=REPORT_TTL)
+
+
+# ---------------- BUCKETS ----------------
+
+def _bucket_start(day, bucket):
+    if bucket == "week":
+        return day - timedelta(days=day.weekday())
+    return day.replace(day=1)
+
+
+def _next_bucket(start, bucket):
+    if bucket == "week":
+        return start + timedelta(days=7)
+    return date(start.year + start.month // 12, start.month % 12 + 1, 1)
+
+
+def _bucket_starts(start, end, bucket):
+    starts, current = [], _bucket_start(start, bucket)
+    while current <= end:
+        starts.append(current)
+        current = _next_bucket(current, bucket)
+    return starts
+
+
+def _label(start, bucket):
+    return start.isoformat() if bucket == "week" else start.strftime("%Y-%m")
+
+
+def parse_filters(start=None, end=None, bucket=None, department=None):
+    """Turn raw query args into department_report() kwargs; ValueError if invalid."""
+    end = date.fromisoformat(end) if end else date.today()
+    if start:
+        start = date.fromisoformat(start)
+    else:
+        # The current month and the DEFAULT_MONTHS - 1 before it
+        start = end.replace(day=1)
+        for _ in range(DEFAULT_MONTHS - 1):
+            start = (start - timedelta(days=1)).replace(day=1)
+    bucket = bucket or "month"
+    if bucket not in BUCKETS:
+        raise ValueError(f"Unknown bucket: {bucket}")
+    if start > end or (end - start).days > MAX_REPORT_DAYS:
+        raise ValueError("from must be before to, at most five years apart")
+    return {
+        "start": start,
+        "end": end,
+        "bucket": bucket,
+        "department_id": int(department) if department else None,
+    }
+
+
+# ---------------- REPORT ----------------
+
+def _ratio(numerator, denominator):
+    return round(numerator / denominator, 4) if denominator else None
+
+
+def _with_rates(series, totals=None):
+    n = len(series["appointments"])
+    series["cancellation_rate"] = [
+        _ratio(series["cancelled"][i], series["appointments"][i]) for i in range(n)
+    ]
+    # Of the appointments that were due: the ones nobody turned up for
+    series["no_show_rate"] = [
+        _ratio(series["no_show"][i], series["completed"][i] + series["no_show"][i]) for i in range(n)
+    ]
+    series["follow_up_ratio"] = [
+        _ratio(series["follow_ups"][i], series["treatments"][i]) for i in range(n)
+    ]
+    if totals is not None:
+        series["load_share"] = [
+            _ratio(series["appointments"][i], totals["appointments"][i]) for i in range(n)
+        ]
+    return series
+
+
+def _department_days(stmt):
+    return db.session.execute(stmt.execution_options(yield_per=CHUNK_SIZE))
+
+
+def _build(start, end, bucket, department_id):
+    starts = _bucket_starts(start, end, bucket)
+    position = {s: i for i, s in enumerate(starts)}
+    departments = Department.query.order_by(Department.id).all()
+    series = {d.id: {name: [0] * len(starts) for name in COUNTS} for d in departments}
+
+    # Every department is summed so load shares compare against the whole hospital
+    appointments = select(
+        Doctor.department_id, DoctorDayStats.date, DoctorDayStats.status, func.sum(DoctorDayStats.count)
+    ).join(Doctor, Doctor.id == DoctorDayStats.doctor_id)\
+        .where(DoctorDayStats.date >= start, DoctorDayStats.date <= end)\
+        .group_by(Doctor.department_id, DoctorDayStats.date, DoctorDayStats.status)
+    for dept_id, day, status, count in _department_days(appointments):
+        if dept_id in series:
+            i = position[_bucket_start(day, bucket)]
+            series[dept_id][STATUS_KEYS[status]][i] += count
+            series[dept_id]["appointments"][i] += count
+
+    treatments = select(
+        Doctor.department_id, DoctorDayTreatments.date,
+        func.sum(DoctorDayTreatments.treatments), func.sum(DoctorDayTreatments.follow_ups)
+    ).join(Doctor, Doctor.id == DoctorDayTreatments.doctor_id)\
+        .where(DoctorDayTreatments.date >= start, DoctorDayTreatments.date <= end)\
+        .group_by(Doctor.department_id, DoctorDayTreatments.date)
+    for dept_id, day, treated, follow_ups in _department_days(treatments):
+        if dept_id in series:
+            i = position[_bucket_start(day, bucket)]
+            series[dept_id]["treatments"][i] += treated
+            series[dept_id]["follow_ups"][i] += follow_ups
+
+    totals = {name: [sum(values) for values in zip(*(s[name] for s in series.values()))] or [0] * len(starts)
+              for name in COUNTS}
+    return {
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "bucket": bucket,
+        "buckets": [_label(s, bucket) for s in starts],
+        "totals": _with_rates(totals),
+        "departments": [
+            {"id": d.id, "name": d.name, **_with_rates(series[d.id], totals)}
+            for d in departments if department_id is None or d.id == department_id
+        ],
+    }
+
+
+def department_report(start, end, bucket="month", department_id=None):
+    """Per-department series for [start, end] (both inclusive), cached per parameter set."""
+    key = (start, end, bucket, department_id)
+    report = report_cache.get(key)
+    if report is None:
+        report = _build(start, end, bucket, department_id)
+        report_cache.set(key, report)
+    return report
@@ -1,54 +1,108 @@
-from flask import Blueprint, request, redirect, url_for, abort, render_template, flash
+from flask import Blueprint, current_app, request, redirect, url_for, abort, render_template, flash, jsonify, Response, stream_with_context
 from flask_login import login_required, current_user
-from app.models import User, Patient, Doctor, UserRole, Department, Appointment, Treatment, db, Doc_Status
-from werkzeug.security import generate_password_hash
+from app.models import User, Patient, Doctor, UserRole, Department, DepartmentStats, Appointment, Treatment, db, Doc_Status
+from app.hashing import hash_password, stats as hashing_stats
 from app.decorators import role_required 
+from app.pagination import keyset_paginate
+from app import identity
+from app.bulk_import import KINDS, FORMATS, format_for, import_records, open_text
+from app import exports, reports
+from app.search import department_options
+from app.database import reads_from_replica
+from sqlalchemy import func, select
+from sqlalchemy.orm import joinedload
 
 admin_bp = Blueprint("admin_bp", __name__, url_prefix="/admin")
 
+# Number of rows shown in each dashboard table; the "Show All" pages list the rest
+DASHBOARD_PAGE_SIZE = 10
+
+def dashboard_totals():
+    """Headline counters in a single round trip (one COUNT subquery per table)."""
+    counts = [
+        select(func.count()).select_from(model).scalar_subquery().label(name)
+        for name, model in (
+            ("doctors", Doctor),
+            ("patients", Patient),
+            ("departments", Department),
+            ("appointments", Appointment),
+        )
+    ]
+    return db.session.query(*counts).one()
+
 @admin_bp.route("/dashboard")
 @login_required # Protect the route
+@reads_from_replica
 def dashboard():
     if not current_user.is_admin_check: # Use your model property
         abort(403)
 
-    # Move queries INSIDE the function so they update
-    users = User.query.all()
-    patients = Patient.query.all()
-    doctors = Doctor.query.all()
-    departments = Department.query.all()
-    appointments = Appointment.query.all()
-    treatments = Treatment.query.all()
+    totals = dashboard_totals()
+
+    # Bounded pages, with the relationships the template touches loaded up front
+    doctors = Doctor.query.options(
+        joinedload(Doctor.user), joinedload(Doctor.department)
+    ).order_by(Doctor.id).limit(DASHBOARD_PAGE_SIZE).all()
+
+    patients = Patient.query.options(joinedload(Patient.user))\
+        .order_by(Patient.id.desc()).limit(DASHBOARD_PAGE_SIZE).all()
+
+    appointments = Appointment.query.options(
+        joinedload(Appointment.patient),
+        joinedload(Appointment.doctor).joinedload(Doctor.department)
+    ).order_by(Appointment.id.desc()).limit(DASHBOARD_PAGE_SIZE).all()
+
+    # Staff and treatment counts per department are precomputed (app.stats)
+    department_rows = db.session.query(
+        Department,
+        func.coalesce(DepartmentStats.doctors, 0),
+        func.coalesce(DepartmentStats.treatments, 0)
+    ).outerjoin(DepartmentStats, DepartmentStats.department_id == Department.id)\
+        .order_by(Department.id).limit(DASHBOARD_PAGE_SIZE).all()
 
     return render_template(
         "admin/dashboard.html", 
-        users=users, 
+        totals=totals,
         patients=patients, 
         doctors=doctors, 
-        departments=departments, 
-        appointments=appointments, 
-        treatments=treatments
+        department_rows=department_rows,
+        departments=department_options(),
+        appointments=appointments
     )
 
 @admin_bp.route("/doctors")
 @login_required
 @role_required(UserRole.ADMIN)
+@reads_from_replica
 def admin_doctors():
-    doctors = Doctor.query.all()
-    return render_template("doctors.html", doctors=doctors)
+    doctors = keyset_paginate(
+        Doctor.query.options(joinedload(Doctor.department)), Doctor.id
+    )
+    return render_template("doctors.html", doctors=doctors, totals=dashboard_totals())
 
 @admin_bp.route("/patients")
 @login_required
 @role_required(UserRole.ADMIN)
+@reads_from_replica
 def admin_patients():
-    patients = Patient.query.all()
+    patients = keyset_paginate(
+        Patient.query.options(joinedload(Patient.user)), Patient.id
+    )
     return render_template("admin/patients.html", patients=patients)
 
 @admin_bp.route("/appointments")
 @login_required
 @role_required(UserRole.ADMIN)
+@reads_from_replica
 def admin_appointments():
-    appointments = Appointment.query.all()
+    appointments = keyset_paginate(
+        Appointment.query.options(
+            joinedload(Appointment.patient),
+            joinedload(Appointment.doctor).joinedload(Doctor.department)
+        ),
+        Appointment.id,
+        descending=True
+    )
     return render_template("admin/appointments.html", appointments = appointments)
 
 
@@ -77,7 +131,7 @@ def add_doctor_post():
         # 2️⃣ Create User
         user = User(
             email=email,
-            password=generate_password_hash(request.form.get("password")),
+            password=hash_password(request.form.get("password")),
             role=UserRole.DOCTOR
         )
         db.session.add(user)
@@ -185,11 +239,72 @@ def admin_edit_doctor_post(doctor_id):
         doctor.status = status
         
         db.session.commit()
+        identity.invalidate(doctor.user_id)
         flash(f"Doctor {doctor.full_name} details are successfully edited", "success")
         return redirect(url_for("admin_bp.admin_doctors"))
     doctors = Doctor.query.all()
     return redirect(url_for('admin_bp.admin_doctors', doctors=doctors, departments=departments))
 
+@admin_bp.route("/metrics/hashing")
+@login_required
+@role_required(UserRole.ADMIN)
+def hashing_metrics():
+    # Queue depth, rejections and latency of the password hashing pool (this worker)
+    return jsonify(hashing_stats()), 200
+
+@admin_bp.route("/import/<kind>", methods=["POST"])
+@login_required
+@role_required(UserRole.ADMIN)
+def import_users(kind):
+    # Multipart "file" upload (CSV or NDJSON); returns the import report.
+    # Bigger uploads are the import-users command's job: 413 past IMPORT_MAX_BYTES
+    request.max_content_length = current_app.config["IMPORT_MAX_BYTES"]
+    upload = request.files.get("file")
+    if kind not in KINDS or upload is None:
+        abort(400)
+    fmt = request.args.get("format") or format_for(upload.filename)
+    if fmt not in FORMATS:
+        abort(400)
+    # Hashes queue behind logins instead of taking every pool process
+    return jsonify(import_records(kind, open_text(upload.stream), fmt, bounded=True)), 200
+
+@admin_bp.route("/export/<kind>")
+@login_required
+@role_required(UserRole.ADMIN)
+@reads_from_replica
+def export_records(kind):
+    # ?format=csv|ndjson&from=&to=&department=&status=, streamed in chunks
+    fmt = request.args.get("format", "csv")
+    if kind not in exports.KINDS or fmt not in exports.FORMATS:
+        abort(400)
+    try:
+        filters = exports.parse_filters(
+            request.args.get("from"), request.args.get("to"),
+            request.args.get("department"), request.args.get("status")
+        )
+    except ValueError:
+        abort(400)
+    return Response(
+        stream_with_context(exports.stream_export(kind, fmt, **filters)),
+        mimetype=exports.MIMETYPES[fmt],
+        headers={"Content-Disposition": f"attachment; filename={kind}.{fmt}"},
+    )
+
+@admin_bp.route("/reports/departments")
+@login_required
+@role_required(UserRole.ADMIN)
+@reads_from_replica
+def department_report():
+    # ?from=&to=&bucket=month|week&department=; defaults to the last 12 months
+    try:
+        filters = reports.parse_filters(
+            request.args.get("from"), request.args.get("to"),
+            request.args.get("bucket"), request.args.get("department")
+        )
+    except ValueError:
+        abort(400)
+    return jsonify(reports.department_report(**filters)), 200
+
 @admin_bp.route("/blacklist/<user_id>")
 @login_required
 @role_required(UserRole.ADMIN)
@@ -197,6 +312,7 @@ def blacklist(user_id):
     user = User.query.get_or_404(user_id)
     user.is_blocked = True
     db.session.commit()
+    identity.invalidate(user.id)
     flash(f"You have blacklisted {user.email}")
     return(redirect(url_for("admin_bp.dashboard")))
 
@@ -207,5 +323,6 @@ def unblacklist(user_id):
     user = User.query.get_or_404(user_id)
     user.is_blocked = False
     db.session.commit()
+    identity.invalidate(user.id)
     flash(f"You have unblacklisted {user.email}")
     return(redirect(url_for("admin_bp.dashboard")))
\ No newline at end of file
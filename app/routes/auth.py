@@ -1,9 +1,13 @@
-from flask import Blueprint, request, redirect, url_for, abort, render_template, flash
-from werkzeug.security import check_password_hash, generate_password_hash
+from flask import Blueprint, request, redirect, url_for, abort, render_template, flash, jsonify
+from app.hashing import hash_password, verify_and_upgrade
 from flask_login import login_user, current_user, login_required, logout_user
 from app.models import User, Patient, Doctor ,UserRole, Department, db
 from app.decorators import role_required
-from sqlalchemy import or_
+from app import identity, search as search_index
+from app.search import ranked
+from app.cache import TTLCache
+from app.database import reads_from_replica
+from sqlalchemy.orm import contains_eager
 
 auth_bp = Blueprint("auth_bp", __name__)
 
@@ -32,7 +36,7 @@ def register_post():
         # 1. Create User
         new_user = User(
             email=email,
-            password=generate_password_hash(password),
+            password=hash_password(password),
             role=UserRole.PATIENT
         )
         db.session.add(new_user)
@@ -66,7 +70,10 @@ def login_post():
         password = request.form.get("password")
         user = User.query.filter_by(email=email).first()
 
-        if user and check_password_hash(user.password, password):
+        if user and verify_and_upgrade(user, password):
+            # Stored hash may have been upgraded to the configured method
+            db.session.commit()
+            identity.invalidate(user.id)
             login_user(user)
             
             # Redirect based on role
@@ -125,45 +132,51 @@ def logout():
     flash("You have been logged out", "warning")
     return redirect(url_for("auth_bp.login"))
 
-@auth_bp.route("/search")
-@login_required
-def search():
-    q = request.args.get('q', '').strip()
-    dept_name = request.args.get('department', '')
-    role = current_user.role
+def _in_department(dept_name):
+    # Filters doctor documents inside the index query, before its LIMIT
+    def narrow(query, ref):
+        return query.join(Doctor, Doctor.id == ref).join(Department, Department.id == Doctor.department_id)\
+            .filter(Department.name == dept_name)
+    return narrow
+
+def search_results(role, q, dept_name, limit=search_index.DEFAULT_LIMIT):
+    """Role-specific search shared by /search and /search/typeahead."""
     results = []
 
     if role == UserRole.ADMIN:
-        # Join User with Patient and Doctor to get full names
-        query = User.query.outerjoin(Patient).outerjoin(Doctor)
+        # Users by email, phone or patient/doctor name
         if q:
-            query = query.filter(or_(
-                User.email.ilike(f"%{q}%"),
-                Patient.full_name.ilike(f"%{q}%"),
-                Doctor.full_name.ilike(f"%{q}%"),
-                Patient.phone.ilike(f"%{q}%")
-            ))
-        results = query.all()
+            results = ranked(User, search_index.search("user", q, limit=limit))
+        else:
+            results = User.query.order_by(User.id).limit(limit).all()
 
     # 2. DOCTOR LOGIC: Search Patients (Name, ID, Phone)
     elif role == UserRole.DOCTOR:
-        query = Patient.query
         if q:
-            query = query.filter(or_(
-                Patient.full_name.ilike(f"%{q}%"),
-                Patient.id.like(f"%{q}%"),
-                Patient.phone.like(f"%{q}%")
-            ))
-        results = query.all()
+            results = ranked(Patient, search_index.search("patient", q, limit=limit))
+        else:
+            results = Patient.query.order_by(Patient.id).limit(limit).all()
 
     # 3. PATIENT LOGIC: Search Doctors (Name, Specialization)
     elif role == UserRole.PATIENT:
-        query = Doctor.query.join(Department)
-        if q:
-            query = query.filter(Doctor.full_name.ilike(f"%{q}%"))
+        query = Doctor.query.join(Department).options(contains_eager(Doctor.department))
         if dept_name:
             query = query.filter(Department.name == dept_name)
-        results = query.all()
+        if q:
+            narrow = _in_department(dept_name) if dept_name else None
+            results = ranked(Doctor, search_index.search("doctor", q, limit=limit, narrow=narrow), query)
+        else:
+            results = query.order_by(Doctor.id).limit(limit).all()
+
+    return results
+
+@auth_bp.route("/search")
+@login_required
+@reads_from_replica
+def search():
+    q = request.args.get('q', '').strip()
+    dept_name = request.args.get('department', '')
+    results = search_results(current_user.role, q, dept_name)
 
     # AJAX check for the "Amazon-style" update
     is_ajax = request.headers.get('X-Requested-With') == 'XMLHttpRequest' #
@@ -171,5 +184,51 @@ def search():
         "searchbar.html", 
         results=results, 
         is_ajax=is_ajax, 
-        departments=Department.query.all() #
-    )
\ No newline at end of file
+        # The department dropdown is only part of the full (non-AJAX) render
+        departments=[] if is_ajax else search_index.department_options()
+    )
+
+
+# ---------------- TYPEAHEAD ----------------
+
+TYPEAHEAD_LIMIT = 8
+TYPEAHEAD_MAX_LIMIT = 20
+
+# Suggestions are cached per (role, query prefix, department) for a few seconds;
+# new or renamed records show up once the entry expires.
+typeahead_cache = TTLCache(maxsize=2048, ttl=15)
+
+def _suggestion(role, item):
+    if role == UserRole.ADMIN:
+        return {"id": item.id, "label": item.email, "detail": item.role.value}
+    if role == UserRole.DOCTOR:
+        return {
+            "id": item.id,
+            "label": item.full_name,
+            "detail": f"ID: #{item.id} | Phone: {item.phone}",
+            "url": url_for("doctor_bp.medical_history", patient_id=item.id),
+        }
+    return {
+        "id": item.id,
+        "label": item.full_name,
+        "detail": f"{item.department.name} — {item.qualification}",
+        "url": url_for("patient_bp.book_appointment", doctor_id=item.id),
+    }
+
+@auth_bp.route("/search/typeahead")
+@login_required
+@reads_from_replica
+def typeahead():
+    q = " ".join(request.args.get('q', '').lower().split())
+    dept_name = request.args.get('department', '')
+    limit = max(1, min(request.args.get('limit', TYPEAHEAD_LIMIT, type=int), TYPEAHEAD_MAX_LIMIT))
+    role = current_user.role
+
+    if not q and not dept_name:
+        return jsonify({"q": q, "results": []}), 200
+
+    def lookup():
+        return [_suggestion(role, item) for item in search_results(role, q, dept_name, limit=limit)]
+
+    results = typeahead_cache.get_or_set((role, q, dept_name, limit), lookup)
+    return jsonify({"q": q, "results": results}), 200
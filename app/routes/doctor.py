@@ -1,31 +1,66 @@
-from flask import Blueprint, request, redirect, url_for, abort, render_template, flash
+from flask import Blueprint, request, redirect, url_for, abort, render_template, flash, jsonify
 from flask_login import login_required, current_user
-from app.models import User, Patient, Doctor, UserRole, Department, Appointment, Treatment, db, Doc_Status, AP_Status
+from app.models import User, Patient, Doctor, UserRole, Department, Appointment, DoctorDayStats, Treatment, db, Doc_Status, AP_Status
 from app.decorators import role_required 
-from datetime import datetime
+from app import booking, history, identity
+from app.database import reads_from_replica
+from datetime import date, datetime, timedelta
 from itertools import groupby
+from sqlalchemy.orm import selectinload
 
 doctor_bp = Blueprint("doctor_bp", __name__, url_prefix="/doctor")
 
+# Dashboard window: today plus the next 7 days unless ?start= / ?days= say otherwise
+DASHBOARD_DAYS = 8
+MAX_DASHBOARD_DAYS = 31
+
 @doctor_bp.route("/dashboard")
 @login_required
 @role_required(UserRole.DOCTOR)
+@reads_from_replica
 def dashboard():
     doctor = current_user.doctor_profile
+
+    try:
+        start = date.fromisoformat(request.args.get("start", ""))
+    except ValueError:
+        start = date.today()
+    days = max(1, min(request.args.get("days", DASHBOARD_DAYS, type=int), MAX_DASHBOARD_DAYS))
+    end = start + timedelta(days=days)
+    in_window = (
+        Appointment.doctor_id == doctor.id,
+        Appointment.date >= start,
+        Appointment.date < end,
+    )
+
     # Order by date so groupby works correctly
-    appointments_query = Appointment.query.filter_by(doctor_id=doctor.id)\
+    appointments_query = Appointment.query.filter(*in_window)\
+        .options(selectinload(Appointment.patient))\
         .order_by(Appointment.date.asc(), Appointment.time.asc()).all()
     
     # Group appointments by date
     # This creates a structure like: { datetime.date(2023, 10, 1): [appt1, appt2], ... }
     grouped_appointments = {}
-    for date, group in groupby(appointments_query, lambda x: x.date):
-        grouped_appointments[date] = list(group)
+    for day, group in groupby(appointments_query, lambda x: x.date):
+        grouped_appointments[day] = list(group)
+
+    # Per-day totals by status, precomputed (app.stats)
+    day_counts = {}
+    for day, status, count in db.session.query(DoctorDayStats.date, DoctorDayStats.status, DoctorDayStats.count)\
+            .filter(DoctorDayStats.doctor_id == doctor.id, DoctorDayStats.date >= start,
+                    DoctorDayStats.date < end, DoctorDayStats.count > 0):
+        day_counts.setdefault(day, {})[status.name] = count
 
     return render_template(
         "doctor/dashboard.html", 
         grouped_appointments=grouped_appointments,
-        doctor=doctor
+        day_counts=day_counts,
+        doctor=doctor,
+        window_start=start,
+        window_end=end - timedelta(days=1),
+        window_days=days,
+        prev_start=start - timedelta(days=days),
+        next_start=end
     )
 
 @doctor_bp.route("/appointment/<int:appointment_id>/status", methods=["POST"])
@@ -41,8 +76,14 @@ def update_appointment_status(appointment_id):
 
     new_status = request.form.get("status")
     if new_status in AP_Status.__members__:
-        appointment.status = AP_Status[new_status]
+        try:
+            booking.change_status(appointment, AP_Status[new_status])
+        except booking.SlotUnavailable as e:
+            db.session.rollback()
+            flash(str(e), "danger")
+            return redirect(url_for("doctor_bp.dashboard"))
         db.session.commit()
+        history.invalidate(appointment.patient_id)
         flash(f"Appointment marked as {new_status.lower()}.", "success")
     
     return redirect(url_for("doctor_bp.dashboard"))
@@ -64,10 +105,16 @@ def add_treatment(appointment_id):
         )
         
         # Automatically mark appointment as completed when treatment is added
-        appointment.status = AP_Status.COMPLETED
+        try:
+            booking.change_status(appointment, AP_Status.COMPLETED)
+        except booking.SlotUnavailable as e:
+            db.session.rollback()
+            flash(str(e), "danger")
+            return redirect(url_for("doctor_bp.dashboard"))
         
         db.session.add(new_treatment)
         db.session.commit()
+        history.record_treatment(new_treatment, appointment)
         flash("Treatment records updated.", "success")
         return redirect(url_for("doctor_bp.dashboard"))
 
@@ -76,16 +123,25 @@ def add_treatment(appointment_id):
 @doctor_bp.route("/patient/<int:patient_id>/history")
 @login_required
 @role_required(UserRole.DOCTOR)
+@reads_from_replica
 def medical_history(patient_id):
     # Goal: View complete patient medical history
     patient = Patient.query.get_or_404(patient_id)
     
-    # Join Treatment with Appointment to find all previous records for this patient
-    history = db.session.query(Treatment).join(Appointment).filter(
-        Appointment.patient_id == patient_id
-    ).order_by(Treatment.created_at.desc()).all()
+    # Cached, denormalised timeline of every treatment for this patient, newest first
+    page = history.timeline_page(patient_id)
+
+    return render_template("doctor/medical_history.html", patient=patient, history=page)
 
-    return render_template("doctor/medical_history.html", patient=patient, history=history)
+@doctor_bp.route("/treatment/<int:treatment_id>/notes")
+@login_required
+@role_required(UserRole.DOCTOR)
+def treatment_notes(treatment_id):
+    # Notes can be long, so the history page fetches them only when expanded
+    row = db.session.query(Treatment.notes).filter(Treatment.id == treatment_id).first()
+    if row is None:
+        abort(404)
+    return jsonify({"notes": row.notes or ""}), 200
 
 @doctor_bp.route("/update-availability", methods=["POST"])
 @login_required
@@ -98,6 +154,7 @@ def update_availability():
     if new_status in Doc_Status.__members__:
         doctor.status = Doc_Status[new_status]
         db.session.commit()
+        identity.invalidate(current_user.id)
         flash("Your availability status has been updated.", "info")
     
     return redirect(url_for("doctor_bp.dashboard"))
\ No newline at end of file
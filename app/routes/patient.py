@@ -3,11 +3,16 @@ from flask_login import login_required, current_user
 from app.models import db, User, Patient, Doctor, Department, Appointment, Treatment, AP_Status, Doc_Status, UserRole
 from datetime import datetime
 from app.decorators import role_required
+from app import booking, history, identity
+from app.database import reads_from_replica
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload, selectinload
 
 patient_bp = Blueprint("patient_bp", __name__, url_prefix="/patient")
 
 @patient_bp.route("/dashboard")
 @login_required
+@reads_from_replica
 def dashboard():
     patient = current_user.patient_profile
     
@@ -15,19 +20,22 @@ def dashboard():
     upcoming = Appointment.query.filter(
         Appointment.patient_id == patient.id,
         Appointment.status == AP_Status.BOOKED
-    ).order_by(Appointment.date.asc()).all()
+    ).options(joinedload(Appointment.doctor))\
+        .order_by(Appointment.date.asc()).all()
 
 
-    # Past Appointments with Treatments
+    # Past Appointments with Treatments (treatments batched in one IN query)
     past = Appointment.query.filter(
         Appointment.patient_id == patient.id,
         Appointment.status == AP_Status.COMPLETED
-    ).order_by(Appointment.date.desc()).all()
+    ).options(joinedload(Appointment.doctor), selectinload(Appointment.treatments))\
+        .order_by(Appointment.date.desc()).all()
 
     return render_template("patient/dashboard.html", upcoming=upcoming, past=past)
 
 @patient_bp.route("/doctors", methods=["GET"])
 @login_required
+@reads_from_replica
 def search_doctors():
     q = request.args.get('q', '').strip()
     dept_id = request.args.get('dept_id', type=int)
@@ -47,6 +55,7 @@ def search_doctors():
 @login_required
 def book_appointment(doctor_id):
     doctor = Doctor.query.get_or_404(doctor_id)
+    schedule = booking.schedule_for(doctor)
     
     if request.method == "POST":
         date_str = request.form.get("date")
@@ -57,19 +66,34 @@ def book_appointment(doctor_id):
             flash("Doctor is currently unavailable.", "danger")
             return redirect(url_for('patient_bp.search_doctors'))
 
-        new_appt = Appointment(
-            patient_id=current_user.patient_profile.id,
-            doctor_id=doctor.id,
-            date=datetime.strptime(date_str, '%Y-%m-%d').date(),
-            time=datetime.strptime(time_str, '%H:%M'),
-            status=AP_Status.BOOKED
-        )
-        db.session.add(new_appt)
-        db.session.commit()
+        day = datetime.strptime(date_str, '%Y-%m-%d').date()
+        slot = booking.slot_for_time(schedule, datetime.strptime(time_str, '%H:%M').time())
+        if slot is None:
+            flash("Please pick one of the doctor's appointment slots.", "warning")
+            return redirect(url_for('patient_bp.book_appointment', doctor_id=doctor.id))
+
+        try:
+            booking.book_slot(current_user.patient_profile.id, doctor, day, slot)
+            db.session.commit()
+        except booking.SlotUnavailable as e:
+            db.session.rollback()
+            flash(str(e), "danger")
+            return redirect(url_for('patient_bp.book_appointment', doctor_id=doctor.id))
+        except IntegrityError:
+            # The unique (doctor, date, slot) index caught a race the bitmap missed
+            db.session.rollback()
+            flash("That slot has just been taken, please pick another.", "danger")
+            return redirect(url_for('patient_bp.book_appointment', doctor_id=doctor.id))
+
         flash("Appointment booked successfully!", "success")
         return redirect(url_for('patient_bp.dashboard'))
 
-    return render_template("patient/book.html", doctor=doctor)
+    return render_template(
+        "patient/book.html",
+        doctor=doctor,
+        schedule=schedule,
+        free_slots=booking.next_free_slots([doctor], n=8)
+    )
 
 @patient_bp.route("/cancel/<int:appt_id>", methods=["POST"])
 @login_required
@@ -78,8 +102,9 @@ def cancel_appointment(appt_id):
     if appt.patient_id != current_user.patient_profile.id:
         abort(403)
     
-    appt.status = AP_Status.CANCELLED
+    booking.change_status(appt, AP_Status.CANCELLED)
     db.session.commit()
+    history.invalidate(appt.patient_id)
     flash("Appointment cancelled.", "info")
     return redirect(url_for('patient_bp.dashboard'))
 
@@ -92,12 +117,14 @@ def profile():
         patient.phone = request.form.get("phone")
         patient.address = request.form.get("address")
         db.session.commit()
+        identity.invalidate(current_user.id)
         flash("Profile updated.", "success")
         return redirect(url_for('patient_bp.profile'))
     return render_template("patient/profile.html", patient=patient)
 
 @patient_bp.route("/history")
 @login_required
+@reads_from_replica
 def medical_history():
     # Automatically identify the patient from the session
     patient = current_user.patient_profile
@@ -110,6 +137,9 @@ def medical_history():
     history = Appointment.query.filter_by(
         patient_id=patient.id, 
         status=AP_Status.COMPLETED
+    ).options(
+        joinedload(Appointment.doctor).joinedload(Doctor.department),
+        selectinload(Appointment.treatments)
     ).order_by(Appointment.date.desc()).all()
 
     return render_template("patient/medical_history.html", history=history, patient=patient)
\ No newline at end of file
@@ -0,0 +1,105 @@
+"""
+Prebuilt per-doctor day schedules.
+
+The lifecycle job (app.lifecycle) snapshots every doctor's live
+appointments for the coming day(s) into `day_schedules`: one row per
+doctor and day with the appointments in time order and the patients'
+names, so a day sheet is one primary-key read instead of a join over the
+appointments table.
+
+A snapshot is dropped as soon as an appointment of its doctor-day changes:
+
+  * ORM writes are picked up by a session `after_flush` hook;
+  * statements that bypass the unit of work (bulk inserts, set-based
+    UPDATE/DELETE) must call `invalidate()` themselves.
+
+Days without a snapshot are built from the appointments table on read.
+"""
+from datetime import date, datetime
+from itertools import groupby
+from sqlalchemy import delete, event, insert, inspect, select, tuple_
+from app.models import db, Appointment, AP_Status, DaySchedule, Doctor, Doc_Status, Patient
+
+
+def _schedule_query(day):
+    return db.session.query(
+        Appointment.id, Appointment.doctor_id, Appointment.slot, Appointment.time,
+        Appointment.status, Appointment.patient_id, Patient.full_name
+    ).outerjoin(Patient, Patient.id == Appointment.patient_id)\
+        .filter(Appointment.date == day, Appointment.status != AP_Status.CANCELLED)\
+        .order_by(Appointment.doctor_id, Appointment.time)
+
+
+def _entry(row):
+    return {
+        "appointment_id": row.id,
+        "time": row.time.strftime("%H:%M") if row.time else None,
+        "slot": row.slot,
+        "patient_id": row.patient_id,
+        "patient": row.full_name,
+        "status": row.status.name,
+    }
+
+
+def build_day(day):
+    """Replace the snapshots of `day` for every available doctor (caller commits); returns rows written."""
+    by_doctor = {
+        doctor_id: [_entry(row) for row in rows]
+        for doctor_id, rows in groupby(_schedule_query(day), key=lambda row: row.doctor_id)
+    }
+    doctor_ids = set(by_doctor) | set(
+        db.session.scalars(select(Doctor.id).where(Doctor.status == Doc_Status.AVAILABLE))
+    )
+    db.session.execute(delete(DaySchedule).where(DaySchedule.date == day))
+    built_at = datetime.utcnow()
+    if doctor_ids:
+        db.session.execute(insert(DaySchedule), [
+            {"doctor_id": doctor_id, "date": day, "built_at": built_at, "entries": by_doctor.get(doctor_id, [])}
+            for doctor_id in sorted(doctor_ids)
+        ])
+    return len(doctor_ids)
+
+
+def purge_before(day):
+    """Drop snapshots of days before `day` (caller commits); returns rows deleted."""
+    return db.session.execute(delete(DaySchedule).where(DaySchedule.date < day)).rowcount
+
+
+def day_schedule(doctor_id, day):
+    """(entries, built_at) for one doctor-day; built_at is None when built live."""
+    snapshot = db.session.get(DaySchedule, (doctor_id, day))
+    if snapshot is not None:
+        return snapshot.entries, snapshot.built_at
+    return [_entry(row) for row in _schedule_query(day).filter(Appointment.doctor_id == doctor_id)], None
+
+
+# ---------------- INVALIDATION ----------------
+
+def _invalidate(conn, pairs):
+    # Only today and later can have a snapshot worth keeping
+    today = date.today()
+    pairs = {(doctor_id, day) for doctor_id, day in pairs if doctor_id and day and day >= today}
+    if pairs:
+        table = DaySchedule.__table__
+        conn.execute(delete(table).where(tuple_(table.c.doctor_id, table.c.date).in_(sorted(pairs))))
+
+
+def invalidate(pairs):
+    """Drop the snapshots of these (doctor_id, date) pairs (caller commits)."""
+    _invalidate(db.session.connection(), pairs)
+
+
+@event.listens_for(db.session, "after_flush")
+def _invalidate_flushed(session, flush_context):
+    pairs = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if not isinstance(obj, Appointment):
+            continue
+        pairs.add((obj.doctor_id, obj.date))
+        # A moved appointment also leaves its old doctor-day
+        attrs = inspect(obj).attrs
+        for doctor_id in attrs.doctor_id.history.deleted or [obj.doctor_id]:
+            for day in attrs.date.history.deleted or [obj.date]:
+                pairs.add((doctor_id, day))
+    if pairs:
+        _invalidate(session.connection(), pairs)
@@ -0,0 +1,278 @@
+"""
+Search index for the live /search box.
+
+Every User, Patient and Doctor gets one row in `search_documents` holding
+its searchable text (names, email, phone, id). The rows are rewritten from
+a session `after_flush` hook, so they stay in sync with every write path.
+
+  * SQLite: an external-content FTS5 table with the trigram tokenizer sits
+    on top of `search_documents` (kept in sync by triggers) and results are
+    ranked with bm25.
+  * PostgreSQL: a pg_trgm GIN index on `search_documents.body`, ranked by
+    similarity().
+  * Anything else falls back to LIKE over the (narrow) documents table.
+"""
+import click
+from sqlalchemy import column, event, func, inspect, table, text
+from sqlalchemy.orm import object_session
+from app.models import db, SearchDocument, User, Patient, Doctor, Department
+
+FTS_TABLE = "search_documents_fts"
+MIN_TRIGRAM = 3  # FTS5 trigram queries need at least 3 characters per term
+DEFAULT_LIMIT = 50
+
+# Lightweight handle on the FTS5 table; its hidden column shares the table name
+_fts = table(FTS_TABLE, column("rowid"), column("rank"), column(FTS_TABLE))
+
+# Attributes whose change means the entity's search text must be rebuilt
+INDEXED_ATTRS = {
+    User: ("email",),
+    Patient: ("full_name", "phone", "user_id"),
+    Doctor: ("full_name", "user_id"),
+}
+
+
+# ---------------- DOCUMENTS ----------------
+
+def _join(*parts):
+    return " ".join(str(p) for p in parts if p).lower()
+
+
+def _user_body(user, patient, doctor):
+    return _join(
+        user.email,
+        patient and patient.full_name,
+        patient and patient.phone,
+        doctor and doctor.full_name,
+    )
+
+
+def _user_document(user, **profiles):
+    # Profiles being flushed are passed in explicitly: the user's own
+    # relationship attributes may still hold their pre-flush (empty) value.
+    patient = profiles["patient"] if "patient" in profiles else user.patient_profile
+    doctor = profiles["doctor"] if "doctor" in profiles else user.doctor_profile
+    return "user", str(user.id), _user_body(user, patient, doctor)
+
+
+def _owner(profile):
+    # Freshly inserted profiles do not lazy-load `user` yet; the identity map does
+    if profile.user is not None or profile.user_id is None:
+        return profile.user
+    return object_session(profile).get(User, profile.user_id)
+
+
+def documents_for(obj, deleted=False):
+    """(kind, ref, body) rows describing one entity, including its owning user."""
+    if isinstance(obj, User):
+        return [_user_document(obj)]
+    if isinstance(obj, Patient):
+        docs = [("patient", str(obj.id), _join(obj.full_name, obj.id, obj.phone))]
+        user = _owner(obj)
+        if user is not None:
+            docs.append(_user_document(user, patient=None if deleted else obj))
+        return docs
+    if isinstance(obj, Doctor):
+        docs = [("doctor", str(obj.id), _join(obj.full_name, obj.id))]
+        user = _owner(obj)
+        if user is not None:
+            docs.append(_user_document(user, doctor=None if deleted else obj))
+        return docs
+    return []
+
+
+def _touches_index(obj):
+    state = inspect(obj)
+    return any(state.attrs[name].history.has_changes() for name in INDEXED_ATTRS[type(obj)])
+
+
+def _write_documents(conn, docs):
+    documents = SearchDocument.__table__
+    for kind, ref, body in docs:
+        conn.execute(documents.delete().where(documents.c.kind == kind, documents.c.ref == ref))
+        conn.execute(documents.insert().values(kind=kind, ref=ref, body=body))
+
+
+def _delete_documents(conn, keys):
+    documents = SearchDocument.__table__
+    for kind, ref in keys:
+        conn.execute(documents.delete().where(documents.c.kind == kind, documents.c.ref == ref))
+
+
+def _kind_of(obj):
+    return {User: "user", Patient: "patient", Doctor: "doctor"}[type(obj)]
+
+
+@event.listens_for(db.session, "after_flush")
+def _sync_search_documents(session, flush_context):
+    tracked = tuple(INDEXED_ATTRS)
+    changed = [o for o in session.new if isinstance(o, tracked)]
+    changed += [o for o in session.dirty if isinstance(o, tracked) and _touches_index(o)]
+    deleted = [o for o in session.deleted if isinstance(o, tracked)]
+    if not (changed or deleted):
+        return
+
+    conn = session.connection()
+    deleted_keys = {(_kind_of(o), str(o.id)) for o in deleted}
+    docs = {}
+    for obj, is_deleted in [(o, False) for o in changed] + [(o, True) for o in deleted]:
+        # Deleted profiles still rewrite their owner's user document
+        for kind, ref, body in documents_for(obj, deleted=is_deleted):
+            if (kind, ref) not in deleted_keys:
+                docs[(kind, ref)] = (kind, ref, body)
+
+    _delete_documents(conn, deleted_keys)
+    _write_documents(conn, docs.values())
+
+
+def bulk_documents(user_id, email, kind, profile_id, full_name, phone=None):
+    """Documents for a user and its profile inserted with Core, where no flush hook runs."""
+    return [
+        ("user", str(user_id), _join(email, full_name, phone)),
+        (kind, str(profile_id), _join(full_name, profile_id, phone)),
+    ]
+
+
+def insert_documents(docs):
+    """Add documents for brand-new entities in one executemany."""
+    if docs:
+        db.session.execute(SearchDocument.__table__.insert(),
+                           [{"kind": kind, "ref": ref, "body": body} for kind, ref, body in docs])
+
+
+# ---------------- SCHEMA ----------------
+
+def _dialect():
+    return db.engine.dialect.name
+
+
+def ensure_search_index():
+    """Create the backend-specific index structures and backfill if empty."""
+    with db.engine.begin() as conn:
+        if _dialect() == "sqlite":
+            conn.execute(text(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+                "body, content='search_documents', content_rowid='id', tokenize='trigram')"
+            ))
+            conn.execute(text(
+                f"CREATE TRIGGER IF NOT EXISTS search_documents_ai AFTER INSERT ON search_documents BEGIN "
+                f"INSERT INTO {FTS_TABLE}(rowid, body) VALUES (new.id, new.body); END"
+            ))
+            conn.execute(text(
+                f"CREATE TRIGGER IF NOT EXISTS search_documents_ad AFTER DELETE ON search_documents BEGIN "
+                f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, body) VALUES ('delete', old.id, old.body); END"
+            ))
+            conn.execute(text(
+                f"CREATE TRIGGER IF NOT EXISTS search_documents_au AFTER UPDATE ON search_documents BEGIN "
+                f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, body) VALUES ('delete', old.id, old.body); "
+                f"INSERT INTO {FTS_TABLE}(rowid, body) VALUES (new.id, new.body); END"
+            ))
+        elif _dialect() == "postgresql":
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_search_documents_body_trgm "
+                "ON search_documents USING gin (body gin_trgm_ops)"
+            ))
+
+    if SearchDocument.query.first() is None and User.query.first() is not None:
+        rebuild_search_index()
+
+
+def _source_documents(chunk_size):
+    users = User.query.options(
+        db.selectinload(User.patient_profile), db.selectinload(User.doctor_profile)
+    ).order_by(User.id)
+    for u in users.yield_per(chunk_size):
+        yield "user", str(u.id), _user_body(u, u.patient_profile, u.doctor_profile)
+    for p in Patient.query.order_by(Patient.id).yield_per(chunk_size):
+        yield "patient", str(p.id), _join(p.full_name, p.id, p.phone)
+    for d in Doctor.query.order_by(Doctor.id).yield_per(chunk_size):
+        yield "doctor", str(d.id), _join(d.full_name, d.id)
+
+
+def rebuild_search_index(chunk_size=1000):
+    """Rewrite every search document from the source tables."""
+    documents = SearchDocument.__table__
+    conn = db.session.connection()
+    conn.execute(documents.delete())
+    count, batch = 0, []
+    for kind, ref, body in _source_documents(chunk_size):
+        batch.append({"kind": kind, "ref": ref, "body": body})
+        if len(batch) >= chunk_size:
+            conn.execute(documents.insert(), batch)
+            count, batch = count + len(batch), []
+    if batch:
+        conn.execute(documents.insert(), batch)
+        count += len(batch)
+    db.session.commit()
+    return count
+
+
+@click.command("rebuild-search-index")
+def rebuild_search_index_command():
+    """Rebuild the /search index from the users, patients and doctors tables."""
+    ensure_search_index()
+    click.echo(f"Indexed {rebuild_search_index()} documents.")
+
+
+# ---------------- QUERY ----------------
+
+def _like(term):
+    escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def search(kind, q, limit=DEFAULT_LIMIT, narrow=None):
+    """
+    Refs of `kind` documents matching every term of `q`, best match first.
+    `narrow(query, ref)` may join and filter the document query on its ref
+    column; it runs before the LIMIT, so the top `limit` matches are taken
+    among the narrowed ones.
+    """
+    terms = q.lower().split()
+    if not terms:
+        return []
+
+    doc = SearchDocument
+    query = db.session.query(doc.ref).filter(doc.kind == kind)
+    if narrow is not None:
+        query = narrow(query, doc.ref)
+
+    if _dialect() == "sqlite":
+        long_terms = [t for t in terms if len(t) >= MIN_TRIGRAM]
+        short_terms = [t for t in terms if len(t) < MIN_TRIGRAM]
+        for t in short_terms:
+            query = query.filter(doc.body.like(_like(t), escape="\\"))
+        if long_terms:
+            match = " ".join('"' + t.replace('"', '""') + '"' for t in long_terms)
+            query = query.join(_fts, _fts.c.rowid == doc.id)\
+                .filter(_fts.c[FTS_TABLE].op("MATCH")(match))\
+                .order_by(_fts.c.rank)
+        else:
+            query = query.order_by(func.length(doc.body))
+    elif _dialect() == "postgresql":
+        for t in terms:
+            query = query.filter(doc.body.ilike(_like(t), escape="\\"))
+        query = query.order_by(func.similarity(doc.body, q.lower()).desc())
+    else:
+        for t in terms:
+            query = query.filter(doc.body.like(_like(t), escape="\\"))
+        query = query.order_by(func.length(doc.body))
+
+    return [ref for (ref,) in query.limit(limit)]
+
+
+def department_options():
+    """(id, name) of every department, by name, for the search bar's dropdown."""
+    return db.session.query(Department.id, Department.name).order_by(Department.name).all()
+
+
+def ranked(model, refs, query=None):
+    """Load `model` rows for `refs` (optionally narrowed by `query`), keeping search rank order."""
+    if not refs:
+        return []
+    key_type = str if model is Doctor else int
+    keys = [key_type(r) for r in refs]
+    query = query if query is not None else model.query
+    by_id = {row.id: row for row in query.filter(model.id.in_(keys))}
+    return [by_id[k] for k in keys if k in by_id]
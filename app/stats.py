@@ -0,0 +1,270 @@
+"""
+Summary tables behind the dashboards, kept current as rows change.
+
+  * department_stats: doctors and treatments per department;
+  * doctor_day_stats: appointments per doctor, day and status;
+  * doctor_day_treatments: treatments and follow-ups per doctor and day
+    of their appointment.
+
+They are maintained like the collection versions (app.versions), inside
+the writer's transaction:
+
+  * ORM writes are turned into +1/-1 deltas by a session `after_flush`
+    hook;
+  * statements that bypass the unit of work (bulk inserts, set-based
+    UPDATE/DELETE) must report theirs with `add_appointments()`,
+    `add_doctors()`, `add_treatments()` or `forget_treatments()`.
+
+Each delta is one `INSERT ... ON CONFLICT DO UPDATE SET n = n + :delta`
+(see app.database.increment), so two writers creating the same row do not
+collide. `flask rebuild-stats` recomputes all three from the raw rows.
+"""
+from collections import Counter
+import click
+from sqlalchemy import case, delete, event, func, insert, inspect, select
+from app.database import increment
+from app.models import db, Appointment, Department, DepartmentStats, Doctor, DoctorDayStats, DoctorDayTreatments, Treatment
+
+SUMMARY_TABLES = ("department_stats", "doctor_day_stats", "doctor_day_treatments")
+
+
+def _apply(conn, model, key, deltas):
+    increment(conn, model.__table__, key, deltas)
+
+
+def _apply_appointments(conn, counts):
+    for (doctor_id, day, status), delta in sorted(counts.items(), key=lambda item: str(item[0])):
+        if delta and doctor_id and day and status:
+            _apply(conn, DoctorDayStats, {"doctor_id": doctor_id, "date": day, "status": status}, {"count": delta})
+
+
+def _apply_departments(conn, doctors, treatments):
+    for department_id in sorted((set(doctors) | set(treatments)) - {None}):
+        deltas = {name: counts[department_id] for name, counts in
+                  (("doctors", doctors), ("treatments", treatments)) if counts[department_id]}
+        if deltas:
+            _apply(conn, DepartmentStats, {"department_id": department_id}, deltas)
+
+
+def _place_treatments(conn, treated):
+    """(appointment_id, follow_up) -> delta as (doctor_id, date, follow_up) -> delta."""
+    ids = {appointment_id for appointment_id, _ in treated if appointment_id is not None}
+    places = dict(
+        (appointment_id, (doctor_id, day)) for appointment_id, doctor_id, day in conn.execute(
+            select(Appointment.id, Appointment.doctor_id, Appointment.date).where(Appointment.id.in_(ids))
+        )
+    ) if ids else {}
+    placed = Counter()
+    for (appointment_id, follow_up), delta in treated.items():
+        if appointment_id in places:
+            placed[(*places[appointment_id], bool(follow_up))] += delta
+    return placed
+
+
+def _stored_treatments(conn, *where):
+    """Treatments in the database matching `where`, as (doctor_id, date, follow_up) -> count."""
+    rows = conn.execute(
+        select(Appointment.doctor_id, Appointment.date, Treatment.follow_up, func.count())
+        .select_from(Treatment)
+        .join(Appointment, Appointment.id == Treatment.appointment_id)
+        .where(*where)
+        .group_by(Appointment.doctor_id, Appointment.date, Treatment.follow_up)
+    )
+    return Counter({(doctor_id, day, bool(follow_up)): count for doctor_id, day, follow_up, count in rows})
+
+
+def _apply_treatments(conn, placed):
+    """Apply (doctor_id, date, follow_up) -> delta to doctor_day_treatments and department_stats."""
+    days = {}
+    doctors = Counter()
+    for (doctor_id, day, follow_up), delta in placed.items():
+        if not (delta and doctor_id and day):
+            continue
+        deltas = days.setdefault((doctor_id, day), Counter())
+        deltas["treatments"] += delta
+        if follow_up:
+            deltas["follow_ups"] += delta
+        doctors[doctor_id] += delta
+    for (doctor_id, day), deltas in sorted(days.items()):
+        deltas = {name: delta for name, delta in deltas.items() if delta}
+        if deltas:
+            _apply(conn, DoctorDayTreatments, {"doctor_id": doctor_id, "date": day}, deltas)
+
+    departments = Counter()
+    if doctors:
+        for doctor_id, department_id in conn.execute(
+            select(Doctor.id, Doctor.department_id).where(Doctor.id.in_(list(doctors)))
+        ):
+            departments[department_id] += doctors[doctor_id]
+    _apply_departments(conn, Counter(), departments)
+
+
+def _forget_treatments(conn, appointment_ids):
+    stored = _stored_treatments(conn, Appointment.id.in_(list(appointment_ids)))
+    _apply_treatments(conn, Counter({key: -count for key, count in stored.items()}))
+
+
+def _doctor_treatments(conn, doctor_id):
+    return sum(_stored_treatments(conn, Appointment.doctor_id == doctor_id).values())
+
+
+# ---------------- WRITES ----------------
+
+def add_appointments(rows, sign=1):
+    """Count (doctor_id, date, status) rows written by a set-based statement (caller commits)."""
+    counts = Counter()
+    for row in rows:
+        counts[tuple(row)] += sign
+    _apply_appointments(db.session.connection(), counts)
+
+
+def add_doctors(department_ids, sign=1):
+    """Count doctors inserted (or deleted, sign=-1) in bulk, by department (caller commits)."""
+    doctors = Counter()
+    for department_id in department_ids:
+        doctors[department_id] += sign
+    _apply_departments(db.session.connection(), doctors, Counter())
+
+
+def add_treatments(rows, sign=1):
+    """Count (appointment_id, follow_up) treatments inserted (or deleted, sign=-1) in bulk (caller commits)."""
+    conn = db.session.connection()
+    treated = Counter()
+    for appointment_id, follow_up in rows:
+        treated[(appointment_id, bool(follow_up))] += sign
+    _apply_treatments(conn, _place_treatments(conn, treated))
+
+
+def forget_treatments(appointment_ids):
+    """Stop counting the treatments of appointments about to be deleted in bulk (caller commits)."""
+    _forget_treatments(db.session.connection(), appointment_ids)
+
+
+def _before(obj, attr):
+    """Value of `attr` as it was before this flush."""
+    history = inspect(obj).attrs[attr].history
+    return history.deleted[0] if history.deleted else getattr(obj, attr)
+
+
+# Assigning to an expired attribute (e.g. after a commit) records no old
+# value unless active history is on, and the hooks below (and those in
+# app.schedules) need it to take a row out of its old key
+for _attribute in (Appointment.doctor_id, Appointment.date, Appointment.status,
+                   Doctor.department_id, Treatment.appointment_id, Treatment.follow_up):
+    event.listen(_attribute, "set", lambda *args: None, active_history=True)
+
+
+@event.listens_for(db.session, "before_flush")
+def _count_deleted_treatments(session, flush_context, instances):
+    # A deleted appointment's treatments are only reachable while its row exists
+    deleted = [obj.id for obj in session.deleted if isinstance(obj, Appointment) and obj.id is not None]
+    if deleted:
+        _forget_treatments(session.connection(), deleted)
+
+
+@event.listens_for(db.session, "after_flush")
+def _count_flushed(session, flush_context):
+    appointments, doctors, treatments = Counter(), Counter(), Counter()
+    treated, placed = Counter(), Counter()
+    for objects, sign, value in ((session.new, 1, getattr), (session.deleted, -1, _before)):
+        for obj in objects:
+            if isinstance(obj, Appointment):
+                appointments[(value(obj, "doctor_id"), value(obj, "date"), value(obj, "status"))] += sign
+            elif isinstance(obj, Doctor):
+                doctors[value(obj, "department_id")] += sign
+            elif isinstance(obj, Treatment):
+                treated[(value(obj, "appointment_id"), bool(value(obj, "follow_up")))] += sign
+    for obj in session.dirty:
+        if isinstance(obj, Appointment):
+            before = (_before(obj, "doctor_id"), _before(obj, "date"), _before(obj, "status"))
+            after = (obj.doctor_id, obj.date, obj.status)
+            if before != after:
+                appointments[before] -= 1
+                appointments[after] += 1
+            if before[:2] != after[:2]:
+                # Its treatments are counted on the day the appointment is on
+                for (_, _, follow_up), count in _stored_treatments(
+                        session.connection(), Appointment.id == obj.id).items():
+                    placed[(*before[:2], follow_up)] -= count
+                    placed[(*after[:2], follow_up)] += count
+        elif isinstance(obj, Doctor) and _before(obj, "department_id") != obj.department_id:
+            # The doctor's past treatments move to the new department with them
+            moved = _doctor_treatments(session.connection(), obj.id)
+            doctors[_before(obj, "department_id")] -= 1
+            doctors[obj.department_id] += 1
+            treatments[_before(obj, "department_id")] -= moved
+            treatments[obj.department_id] += moved
+        elif isinstance(obj, Treatment):
+            before = (_before(obj, "appointment_id"), bool(_before(obj, "follow_up")))
+            after = (obj.appointment_id, bool(obj.follow_up))
+            if before != after:
+                treated[before] -= 1
+                treated[after] += 1
+
+    if not (appointments or doctors or treatments or treated or placed):
+        return
+    conn = session.connection()
+    _apply_appointments(conn, appointments)
+    _apply_departments(conn, doctors, treatments)
+    if treated:
+        placed.update(_place_treatments(conn, treated))
+    _apply_treatments(conn, placed)
+
+
+# ---------------- REBUILD ----------------
+
+def rebuild_stats():
+    """Recompute the summary tables from the raw rows in one transaction; returns their row counts."""
+    db.session.execute(delete(DoctorDayStats))
+    db.session.execute(delete(DoctorDayTreatments))
+    db.session.execute(delete(DepartmentStats))
+
+    columns = (Appointment.doctor_id, Appointment.date, Appointment.status)
+    day_rows = db.session.execute(
+        insert(DoctorDayStats).from_select(
+            ["doctor_id", "date", "status", "count"],
+            select(*columns, func.count()).where(Appointment.doctor_id.isnot(None), Appointment.date.isnot(None))
+            .group_by(*columns)
+        )
+    ).rowcount
+
+    treatment_rows = db.session.execute(
+        insert(DoctorDayTreatments).from_select(
+            ["doctor_id", "date", "treatments", "follow_ups"],
+            select(
+                Appointment.doctor_id, Appointment.date, func.count(),
+                func.sum(case((Treatment.follow_up, 1), else_=0))
+            ).select_from(Treatment)
+            .join(Appointment, Appointment.id == Treatment.appointment_id)
+            .where(Appointment.doctor_id.isnot(None), Appointment.date.isnot(None))
+            .group_by(Appointment.doctor_id, Appointment.date)
+        )
+    ).rowcount
+
+    doctors = dict(db.session.execute(
+        select(Doctor.department_id, func.count()).group_by(Doctor.department_id)
+    ).all())
+    treatments = dict(db.session.execute(
+        select(Doctor.department_id, func.count())
+        .select_from(Treatment)
+        .join(Appointment, Appointment.id == Treatment.appointment_id)
+        .join(Doctor, Doctor.id == Appointment.doctor_id)
+        .group_by(Doctor.department_id)
+    ).all())
+    department_ids = db.session.scalars(select(Department.id)).all()
+    if department_ids:
+        db.session.execute(insert(DepartmentStats), [
+            {"department_id": department_id, "doctors": doctors.get(department_id, 0),
+             "treatments": treatments.get(department_id, 0)}
+            for department_id in department_ids
+        ])
+    db.session.commit()
+    return {"doctor_day_stats": day_rows, "doctor_day_treatments": treatment_rows,
+            "department_stats": len(department_ids)}
+
+
+@click.command("rebuild-stats")
+def rebuild_stats_command():
+    """Recompute the dashboard summary tables from the raw rows."""
+    counts = rebuild_stats()
+    click.echo(", ".join(f"{table}: {rows} rows" for table, rows in counts.items()))
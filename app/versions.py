@@ -0,0 +1,129 @@
+"""
+Collection version counters for conditional GETs.
+
+Each API collection ("doctors", "appointments", ...) has a counter in
+`collection_versions` that is bumped inside the transaction of every write
+to it:
+
+  * ORM writes are picked up by a session `after_flush` hook, using the
+    model -> collections map below;
+  * statements that bypass the unit of work (bulk inserts, set-based
+    UPDATE/DELETE) must call `bump()` themselves.
+
+Readers keep the counters in a short-lived per-worker cache, so answering
+If-None-Match with 304 normally does not touch the database. A commit in
+this worker drops its cached counters at once; other workers notice within
+VERSION_TTL seconds. Counters are read (and cached) per bind: a request
+served from the read replica is tagged with the replica's counters, which
+match the rows it reads even while the replica lags.
+"""
+import hashlib
+from functools import wraps
+from flask import current_app, request, make_response
+from sqlalchemy import event, select
+from app.cache import TTLCache
+from app.database import REPLICA_BIND, increment, read_bind
+from app.models import db, CollectionVersion, Doctor, Department, Appointment, Patient, User
+
+VERSION_TTL = 2
+
+# Collections whose representations include data from each model
+COLLECTIONS = {
+    Doctor: ("doctors", "appointments", "identities"),
+    Department: ("doctors",),
+    Appointment: ("appointments",),
+    Patient: ("appointments", "identities"),
+    # Not an API collection: the stamp app.identity checks its cached users against
+    User: ("identities",),
+}
+
+version_cache = TTLCache(maxsize=64, ttl=VERSION_TTL)
+
+
+# ---------------- WRITES ----------------
+
+def _bump(conn, names):
+    for name in sorted(names):
+        increment(conn, CollectionVersion.__table__, {"name": name}, {"version": 1})
+
+
+def bump(*names):
+    """Bump collections changed by a statement the flush hook cannot see (caller commits)."""
+    _bump(db.session.connection(), names)
+    db.session.info.setdefault("bumped_collections", set()).update(names)
+
+
+@event.listens_for(db.session, "after_flush")
+def _bump_flushed(session, flush_context):
+    names = set()
+    for obj in list(session.new) + list(session.deleted):
+        names.update(COLLECTIONS.get(type(obj), ()))
+    for obj in session.dirty:
+        if type(obj) in COLLECTIONS and session.is_modified(obj, include_collections=False):
+            names.update(COLLECTIONS[type(obj)])
+    if names:
+        _bump(session.connection(), names)
+        session.info.setdefault("bumped_collections", set()).update(names)
+
+
+@event.listens_for(db.session, "after_commit")
+def _forget_committed(session):
+    for name in session.info.pop("bumped_collections", ()):
+        for bind in (None, REPLICA_BIND):
+            version_cache.pop((bind, name))
+
+
+@event.listens_for(db.session, "after_rollback")
+def _forget_rolled_back(session):
+    session.info.pop("bumped_collections", None)
+
+
+# ---------------- READS ----------------
+
+def current_version(name, primary=False):
+    """Version of `name` in the database this request reads from (the primary if `primary`)."""
+    bind = None if primary else read_bind()
+    version = version_cache.get((bind, name))
+    if version is None:
+        # One query refreshes every counter
+        rows = db.session.execute(
+            select(CollectionVersion.name, CollectionVersion.version),
+            bind_arguments={"bind": db.engines[bind]},
+        ).all()
+        for row_name, row_version in rows:
+            version_cache.set((bind, row_name), row_version)
+        version = dict(rows).get(name, 0)
+        version_cache.set((bind, name), version)
+    return version
+
+
+def etag_for(names):
+    """Strong ETag for this request's representation of `names` at their current versions."""
+    versions = ".".join(f"{name}{current_version(name)}" for name in names)
+    variant = hashlib.sha1(request.full_path.encode()).hexdigest()[:12]
+    return f"{versions}-{variant}"
+
+
+def conditional(*names, cache_control="no-cache"):
+    """
+    Tag 200 responses with an ETag built from the collections' versions and
+    answer a matching If-None-Match with 304 before the view runs. On a
+    replica-routed view it goes below @reads_from_replica, so the versions
+    come from the database the body is read from.
+    """
+    def wrapper(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            # Read before the view, from the same database, so the tag is never newer than the body
+            tag = etag_for(names)
+            if request.if_none_match.contains(tag):
+                response = make_response("", 304)
+            else:
+                response = make_response(current_app.ensure_sync(f)(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(tag)
+            response.headers["Cache-Control"] = cache_control
+            return response
+        return decorated
+    return wrapper
@@ -0,0 +1,127 @@
+"""
+Concurrency benchmark: sync /api/v1 against async /api/async/v1.
+
+    python -m benchmarks.concurrency
+    python -m benchmarks.concurrency --scale medium --concurrency 1 --concurrency 64 --requests 2000
+
+The app is served from a separate process by werkzeug's threaded server,
+the way the development server runs it, against a database generated with
+seed.py (cached in --data-dir, shared with benchmarks.routes). For every
+concurrency level each endpoint pair gets --requests GETs from that many
+client threads; the run reports requests per second and latency
+percentiles side by side. Nothing is budgeted: the numbers are for
+comparing the two blueprints on the server you deploy.
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from benchmarks.routes import ROOT, SCALES, build_app, percentile
+
+SERVER = """
+import sys
+from werkzeug.serving import make_server
+from app import create_app
+make_server("127.0.0.1", int(sys.argv[1]), create_app(), threaded=True).serve_forever()
+"""
+
+ENDPOINTS = [
+    ("doctors", "/api/v1/doctors", "/api/async/v1/doctors"),
+    ("appointment", "/api/v1/appointments/{appointment}", "/api/async/v1/appointments/{appointment}"),
+]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port):
+    env = dict(os.environ, SQL_INSTRUMENTATION="False")
+    server = subprocess.Popen([sys.executable, "-c", SERVER, str(port)], cwd=ROOT, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/login", timeout=1).read()
+            return server
+        except OSError:
+            if server.poll() is not None:
+                raise SystemExit("benchmark server exited during startup")
+            time.sleep(0.1)
+    server.kill()
+    raise SystemExit("benchmark server did not start within 30s")
+
+
+def fetch(url):
+    started = time.perf_counter()
+    with urllib.request.urlopen(url, timeout=30) as response:
+        response.read()
+        if response.status != 200:
+            raise SystemExit(f"GET {url} returned {response.status}")
+    return (time.perf_counter() - started) * 1000
+
+
+def run(url, concurrency, requests):
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        # Warm up every client thread (and the async engine) before timing
+        list(pool.map(fetch, [url] * concurrency))
+        started = time.perf_counter()
+        timings = list(pool.map(fetch, [url] * requests))
+        elapsed = time.perf_counter() - started
+    return {
+        "rps": round(requests / elapsed, 1),
+        "p50_ms": round(statistics.median(timings), 2),
+        "p99_ms": round(percentile(timings, 99), 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--scale", choices=SCALES, default="small")
+    parser.add_argument("--concurrency", type=int, action="append", help="Repeatable; default 1, 8, 32.")
+    parser.add_argument("--requests", type=int, default=500, help="Timed requests per endpoint and level.")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--data-dir", default=tempfile.gettempdir(), help="Where generated databases are cached.")
+    parser.add_argument("--json", dest="json_path", help="Also write the results to this file.")
+    args = parser.parse_args()
+
+    app = build_app(args.scale, args.data_dir, args.seed)
+    from app.models import db, Appointment
+    with app.app_context():
+        ids = {"appointment": db.session.query(Appointment.id).order_by(Appointment.id).limit(1).scalar()}
+
+    port = free_port()
+    server = start_server(port)
+    results = {}
+    try:
+        print(f"{'endpoint':12} {'clients':>7} {'sync rps':>9} {'async rps':>9} "
+              f"{'sync p50':>9} {'async p50':>9} {'sync p99':>9} {'async p99':>9}")
+        for concurrency in args.concurrency or [1, 8, 32]:
+            for name, sync_path, async_path in ENDPOINTS:
+                sync = run(f"http://127.0.0.1:{port}{sync_path.format(**ids)}", concurrency, args.requests)
+                asynchronous = run(f"http://127.0.0.1:{port}{async_path.format(**ids)}", concurrency, args.requests)
+                results.setdefault(name, {})[concurrency] = {"sync": sync, "async": asynchronous}
+                print(f"{name:12} {concurrency:>7} {sync['rps']:>9} {asynchronous['rps']:>9} "
+                      f"{sync['p50_ms']:>9} {asynchronous['p50_ms']:>9} "
+                      f"{sync['p99_ms']:>9} {asynchronous['p99_ms']:>9}")
+    finally:
+        server.terminate()
+        server.wait()
+
+    if args.json_path:
+        Path(args.json_path).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+"""
+Route benchmarks with committed query-count and latency budgets.
+
+    python -m benchmarks.routes                      # small scale
+    python -m benchmarks.routes --scale small --scale medium
+    python -m benchmarks.routes --scale large --iterations 50 --json results.json
+
+For every scale a SQLite database is generated once with seed.py (cached
+in --data-dir) and the app is built against it with create_app(). Each
+route is requested through the Flask test client as the role that uses
+it: a few warm-up requests, then --iterations timed ones. For each route
+the run reports latency percentiles and the largest number of SQL
+statements any single request issued (warm-ups included, so cold-cache
+paths count too).
+
+Budgets live in benchmarks/budgets.json. Query budgets are the same at
+every scale: a route whose query count grows with the data is a
+regression. Routes that log in allow one statement for the identity stamp
+(app.identity), which a worker re-reads once per VERSION_TTL and which
+may land on any of them. Latency budgets are per scale. The run exits with status 1
+if any route goes over budget.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from sqlalchemy import event, func
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+BUDGETS = Path(__file__).with_name("budgets.json")
+
+SCALES = {
+    "small": {"doctors": 20, "patients": 500, "appointments": 5000,
+              "days_back": 60, "days_ahead": 30},
+    "medium": {"doctors": 100, "patients": 10000, "appointments": 100000,
+               "days_back": 180, "days_ahead": 30},
+    "large": {"doctors": 300, "patients": 100000, "appointments": 1000000,
+              "days_back": 365, "days_ahead": 30},
+}
+
+ADMIN = ("admin@homa.com", "admin123")
+DOCTOR = ("sarah.chen@homa.com", "doc123")
+PATIENT = ("john.doe@gmail.com", "patient123")
+
+
+def routes(ids):
+    """(name, login, url) for every benchmarked route."""
+    return [
+        ("admin_bp.dashboard", ADMIN, "/admin/dashboard"),
+        ("admin_bp.admin_appointments", ADMIN, "/admin/appointments"),
+        ("admin_bp.department_report", ADMIN, "/admin/reports/departments"),
+        ("doctor_bp.dashboard", DOCTOR, "/doctor/dashboard"),
+        ("doctor_bp.medical_history", DOCTOR, f"/doctor/patient/{ids['busiest_patient']}/history"),
+        ("patient_bp.dashboard", PATIENT, "/patient/dashboard"),
+        ("patient_bp.medical_history", PATIENT, "/patient/history"),
+        ("patient_bp.search_doctors", PATIENT, "/patient/doctors?q=dr"),
+        ("auth_bp.search", ADMIN, "/search?q=patel"),
+        ("auth_bp.typeahead", ADMIN, "/search/typeahead?q=pat"),
+        ("api_bp.get_doctors", None, "/api/v1/doctors"),
+        ("api_bp.get_doctor_slots", None, f"/api/v1/doctors/{ids['doctor']}/slots"),
+    ]
+
+
+# ---------------- DATASET ----------------
+
+def build_app(scale, data_dir, seed):
+    path = Path(data_dir) / f"homa-bench-{scale}-{seed}.sqlite3"
+    fresh = not path.exists()
+    os.environ["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{path}"
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+    os.environ.setdefault("HASH_WORKERS", "0")
+    # One JSON line per request would be timed along with the routes
+    os.environ.setdefault("SQL_LOG_LEVEL", "WARNING")
+
+    from app import create_app
+    import seed as seeder
+    app = create_app()
+    if fresh:
+        try:
+            seeder.seed_database(app, seed=seed, **SCALES[scale])
+        except BaseException:
+            path.unlink(missing_ok=True)
+            raise
+    else:
+        # A database cached by an older checkout gets the deploy-time upgrade
+        from app.migrations import init_db
+        with app.app_context():
+            init_db()
+    return app
+
+
+def dataset_ids(app):
+    from app.models import db, Appointment, Doctor, User
+    with app.app_context():
+        busiest = db.session.query(Appointment.patient_id, func.count())\
+            .group_by(Appointment.patient_id).order_by(func.count().desc()).first()
+        doctor = Doctor.query.join(User).filter(User.email == DOCTOR[0]).one()
+        return {"busiest_patient": busiest[0], "doctor": doctor.id}
+
+
+# ---------------- MEASURING ----------------
+
+class QueryCounter:
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self._count)
+
+    def _count(self, *args, **kwargs):
+        self.count += 1
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def client_for(app, login, clients):
+    if login not in clients:
+        client = app.test_client()
+        if login:
+            client.post("/login", data={"email": login[0], "password": login[1]})
+        clients[login] = client
+    return clients[login]
+
+
+def measure(app, iterations, warmup):
+    from app.models import db
+    with app.app_context():
+        counter = QueryCounter(db.engine)
+    clients, results = {}, {}
+
+    for name, login, url in routes(dataset_ids(app)):
+        client = client_for(app, login, clients)
+        timings, max_queries = [], 0
+        for i in range(warmup + iterations):
+            counter.count = 0
+            started = time.perf_counter()
+            response = client.get(url)
+            elapsed = (time.perf_counter() - started) * 1000
+            if response.status_code != 200:
+                raise SystemExit(f"{name}: GET {url} returned {response.status_code}")
+            max_queries = max(max_queries, counter.count)
+            if i >= warmup:
+                timings.append(elapsed)
+        results[name] = {
+            "url": url,
+            "queries": max_queries,
+            "p50_ms": round(statistics.median(timings), 2),
+            "p95_ms": round(percentile(timings, 95), 2),
+            "p99_ms": round(percentile(timings, 99), 2),
+            "max_ms": round(max(timings), 2),
+        }
+    return results
+
+
+def over_budget(scale, results, budgets):
+    failures = []
+    for name, result in results.items():
+        budget = budgets.get(name)
+        if budget is None:
+            failures.append(f"{name}: no budget in {BUDGETS.name}")
+            continue
+        if result["queries"] > budget["queries"]:
+            failures.append(f"{name}: {result['queries']} queries > budget {budget['queries']}")
+        limit = budget.get("p95_ms", {}).get(scale)
+        if limit is not None and result["p95_ms"] > limit:
+            failures.append(f"{name}: p95 {result['p95_ms']}ms > budget {limit}ms at {scale} scale")
+    return failures
+
+
+def report(scale, results):
+    print(f"\n== {scale}")
+    print(f"{'route':34} {'queries':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for name, r in results.items():
+        print(f"{name:34} {r['queries']:>7} {r['p50_ms']:>8} {r['p95_ms']:>8} {r['p99_ms']:>8} {r['max_ms']:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--scale", action="append", choices=SCALES, help="Repeatable; default small.")
+    parser.add_argument("--iterations", type=int, default=30)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--data-dir", default=tempfile.gettempdir(), help="Where generated databases are cached.")
+    parser.add_argument("--json", dest="json_path", help="Also write the results to this file.")
+    args = parser.parse_args()
+
+    from app.cache import reset_caches
+    budgets = json.loads(BUDGETS.read_text())
+    all_results, failures = {}, []
+    for scale in args.scale or ["small"]:
+        # Another scale's database must not be served from the previous one's caches
+        reset_caches()
+        app = build_app(scale, args.data_dir, args.seed)
+        results = measure(app, args.iterations, args.warmup)
+        report(scale, results)
+        all_results[scale] = results
+        failures += over_budget(scale, results, budgets)
+
+    if args.json_path:
+        Path(args.json_path).write_text(json.dumps(all_results, indent=2))
+    if failures:
+        print("\nOver budget:")
+        for failure in failures:
+            print("  " + failure)
+        sys.exit(1)
+    print("\nAll routes within budget.")
+
+
+if __name__ == "__main__":
+    main()
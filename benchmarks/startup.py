@@ -0,0 +1,90 @@
+"""
+Worker startup benchmark: cold import, create_app() and first request.
+
+    python -m benchmarks.startup
+    python -m benchmarks.startup --runs 10 --url /api/v1/doctors
+
+Every run is a fresh interpreter, so module imports are really cold (the
+OS file cache aside). The child times `import app`, `create_app()` and the
+first request through the test client, which is where lazy engine and
+pool setup is paid. The database is initialised once beforehand with
+`init_db()`. Medians go against the "startup" budget in budgets.json; the
+run exits with status 1 if one is exceeded.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+BUDGETS = Path(__file__).with_name("budgets.json")
+
+CHILD = """
+import json, sys, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+application = app.create_app()
+created = time.perf_counter()
+response = application.test_client().get(sys.argv[1])
+finished = time.perf_counter()
+assert response.status_code == 200, response.status_code
+print(json.dumps({
+    "import_ms": (imported - started) * 1000,
+    "create_app_ms": (created - imported) * 1000,
+    "first_request_ms": (finished - created) * 1000,
+    "total_ms": (finished - started) * 1000,
+}))
+"""
+
+
+def prepare_database(path):
+    env = dict(os.environ, SQLALCHEMY_DATABASE_URI=f"sqlite:///{path}")
+    subprocess.run(
+        [sys.executable, "-c", "from app import create_app; from app.migrations import init_db\n"
+                               "app = create_app()\nwith app.app_context(): init_db()"],
+        cwd=ROOT, env=env, check=True, capture_output=True,
+    )
+    return env
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--url", default="/login", help="Path of the first request.")
+    args = parser.parse_args()
+
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+    with tempfile.TemporaryDirectory() as tmp:
+        env = prepare_database(Path(tmp) / "startup.sqlite3")
+        samples = []
+        for _ in range(args.runs):
+            out = subprocess.run([sys.executable, "-c", CHILD, args.url], cwd=ROOT, env=env,
+                                 check=True, capture_output=True, text=True).stdout
+            samples.append(json.loads(out.strip().splitlines()[-1]))
+
+    budget = json.loads(BUDGETS.read_text()).get("startup", {})
+    failures = []
+    print(f"{'phase':18} {'median ms':>10} {'max ms':>10} {'budget':>8}")
+    for phase in ("import_ms", "create_app_ms", "first_request_ms", "total_ms"):
+        values = [s[phase] for s in samples]
+        median = statistics.median(values)
+        limit = budget.get(phase)
+        print(f"{phase:18} {median:>10.1f} {max(values):>10.1f} {limit if limit is not None else '-':>8}")
+        if limit is not None and median > limit:
+            failures.append(f"{phase}: median {median:.1f}ms > budget {limit}ms")
+
+    if failures:
+        print("\nOver budget:")
+        for failure in failures:
+            print("  " + failure)
+        sys.exit(1)
+    print("\nStartup within budget.")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,4 +3,10 @@ from app import create_app
 app = create_app()
 
 if (__name__ == "__main__"):
+    # Development server: make sure the schema and admin exist first
+    from app.migrations import init_db
+    from app.models import User
+    with app.app_context():
+        init_db()
+        User.make_admin()
     app.run()
\ No newline at end of file
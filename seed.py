@@ -1,5 +1,23 @@
-from datetime import datetime, date, timedelta
+"""
+Deterministic synthetic data for development and load testing.
+
+    python seed.py                                   # small demo database
+    python seed.py --doctors 250 --patients 100000 --appointments 1000000
+
+The same --seed (and --today) always produces the same rows. Rows are built
+in Python and written with executemany in chunks, with explicit primary
+keys so no RETURNING round trips are needed. Every account of a role shares
+one precomputed password hash. The slot bitmaps and the search index are
+rebuilt once at the end.
+
+Demo logins: admin@homa.com / admin123, the first doctors and patients
+below with doc123 / patient123.
+"""
+import argparse
 import random
+import time as timer
+from datetime import datetime, date, timedelta
+from itertools import accumulate
 
 from app import create_app
 from app.models import (
@@ -10,196 +28,311 @@ from app.models import (
     Patient,
     Appointment,
     Treatment,
+    DoctorSchedule,
     UserRole,
     Doc_Status,
     AP_Status
 )
-from werkzeug.security import generate_password_hash
+from app.booking import DEFAULT_SCHEDULE, rebuild_slot_days, slot_count, slot_start, works_on
+from app.hashing import hash_password
+from app.migrations import init_db
+from app.search import rebuild_search_index
+from app.stats import rebuild_stats
+
+# (name, description, share of the doctors)
+DEPARTMENTS = [
+    ("General Medicine", "Primary healthcare services.", 0.22),
+    ("Pediatrics", "Medical care for infants and children.", 0.12),
+    ("Cardiology", "Heart health and cardiovascular care.", 0.10),
+    ("Orthopedics", "Bone and joint care.", 0.10),
+    ("Gynecology", "Women's reproductive health.", 0.09),
+    ("Dermatology", "Skin, hair and nail conditions.", 0.07),
+    ("Neurology", "Nervous system and brain disorders.", 0.06),
+    ("ENT", "Ear, nose and throat.", 0.06),
+    ("Ophthalmology", "Eye care and vision.", 0.06),
+    ("Psychiatry", "Mental health care.", 0.05),
+    ("Oncology", "Cancer diagnosis and treatment.", 0.04),
+    ("Nephrology", "Kidney care.", 0.03),
+]
+
+DEMO_DOCTORS = [
+    ("Dr. Sarah Chen", "MBBS, MD (Cardiology)", "sarah.chen@homa.com", "Cardiology"),
+    ("Dr. James Wilson", "MBBS, DCH", "j.wilson@homa.com", "Pediatrics"),
+    ("Dr. Elena Rodriguez", "MBBS, DM (Neurology)", "elena.rod@homa.com", "Neurology"),
+    ("Dr. Marcus Thorne", "MBBS, MS (Ortho)", "m.thorne@homa.com", "Orthopedics"),
+    ("Dr. Alan Grant", "MBBS", "a.grant@homa.com", "General Medicine"),
+]
+
+DEMO_PATIENTS = [
+    ("John Doe", 34, "Male", "O+", "john.doe@gmail.com"),
+    ("Jane Smith", 29, "Female", "A-", "jane.smith@yahoo.com"),
+    ("Robert Brown", 52, "Male", "B+", "r.brown@outlook.com"),
+    ("Emily White", 19, "Female", "AB+", "e.white@provider.com"),
+    ("Michael Scott", 45, "Male", "O-", "m.scott@dunder.com"),
+]
+
+FIRST_NAMES = [
+    "Aarav", "Aisha", "Ben", "Chloe", "Daniel", "Divya", "Emma", "Farah", "George", "Hannah",
+    "Ishaan", "Julia", "Karan", "Lena", "Liam", "Maya", "Noah", "Olivia", "Priya", "Rahul",
+    "Sara", "Tom", "Uma", "Victor", "Wei", "Yusuf", "Zara", "Arjun", "Meera", "Omar",
+]
+LAST_NAMES = [
+    "Patel", "Smith", "Khan", "Garcia", "Nguyen", "Sharma", "Brown", "Silva", "Kim", "Müller",
+    "Rossi", "Iyer", "Okafor", "Cohen", "Tanaka", "Reddy", "Jones", "Lopez", "Singh", "Martin",
+]
+QUALIFICATIONS = ["MBBS", "MBBS, MD", "MBBS, MS", "MBBS, DNB", "MBBS, DM"]
+BLOOD_GROUPS = ["O+", "A+", "B+", "AB+", "O-", "A-", "B-", "AB-"]
+BLOOD_WEIGHTS = [37, 28, 20, 5, 4, 3, 2, 1]
+
+DIAGNOSES = [
+    "Common Cold", "Hypertension", "Migraine", "Type 2 Diabetes", "Joint Pain",
+    "Asthma", "Gastritis", "Dermatitis", "Anxiety", "Back Pain",
+]
+PRESCRIPTIONS = [
+    "Paracetamol 500mg twice daily", "Amlodipine 5mg once daily", "Ibuprofen after meals",
+    "Metformin 500mg twice daily", "Physiotherapy and pain relievers", "Salbutamol inhaler as needed",
+    "Pantoprazole 40mg before breakfast", "Topical hydrocortisone", "Counselling, review in 4 weeks",
+]
+NOTES = "Patient advised rest, hydration, and follow-up if symptoms persist."
+
+# Status mix for appointments that are already in the past / still ahead
+PAST_STATUSES = ([AP_Status.COMPLETED, AP_Status.CANCELLED, AP_Status.BOOKED], [82, 14, 4])
+FUTURE_STATUSES = ([AP_Status.BOOKED, AP_Status.CANCELLED], [88, 12])
+
+
+class Generator:
+    def __init__(self, seed, today, days_back, days_ahead, chunk_size):
+        self.rng = random.Random(seed)
+        self.today = today
+        self.chunk_size = chunk_size
+        self.schedule = DoctorSchedule(**DEFAULT_SCHEDULE)
+        self.slots_per_day = slot_count(self.schedule)
+        first = today - timedelta(days=days_back)
+        self.days = [
+            first + timedelta(days=i) for i in range(days_back + days_ahead + 1)
+            if works_on(self.schedule, first + timedelta(days=i))
+        ]
+        self.booked = {}  # (doctor index, day index) -> bitmask of taken slots
 
-app = create_app()
+    def _insert(self, model, rows):
+        for i in range(0, len(rows), self.chunk_size):
+            db.session.execute(model.__table__.insert(), rows[i:i + self.chunk_size])
 
+    def _next_id(self, model):
+        return (db.session.query(db.func.max(model.id)).scalar() or 0) + 1
 
-def seed_database():
+    # ---------------- PEOPLE ----------------
+
+    def departments(self):
+        rows = [
+            {"name": name, "description": desc, "is_active": True}
+            for name, desc, _ in DEPARTMENTS
+        ]
+        self._insert(Department, rows)
+        return {d.name: d.id for d in Department.query}
+
+    def doctors(self, count, department_ids):
+        password = hash_password("doc123")
+        names = [name for name, _, _ in DEPARTMENTS]
+        shares = [share for _, _, share in DEPARTMENTS]
+        user_id = self._next_id(User)
+        users, doctors = [], []
+
+        for i in range(count):
+            if i < len(DEMO_DOCTORS):
+                full_name, qualification, email, dept = DEMO_DOCTORS[i]
+            else:
+                first, last = self.rng.choice(FIRST_NAMES), self.rng.choice(LAST_NAMES)
+                full_name = f"Dr. {first} {last}"
+                qualification = self.rng.choice(QUALIFICATIONS)
+                email = f"dr.{first}.{last}.{i}@homa.com".lower()
+                dept = self.rng.choices(names, shares)[0]
+            users.append({"id": user_id, "email": email, "password": password, "role": UserRole.DOCTOR})
+            doctors.append({
+                "id": f"DOC-{department_ids[dept]}-{user_id}",
+                "user_id": user_id,
+                "full_name": full_name,
+                "qualification": qualification,
+                "experience": self.rng.randint(1, 30),
+                "status": Doc_Status.AVAILABLE if self.rng.random() < 0.95 else Doc_Status.LEAVE,
+                "department_id": department_ids[dept],
+            })
+            user_id += 1
+
+        self._insert(User, users)
+        self._insert(Doctor, doctors)
+        return [d["id"] for d in doctors]
+
+    def patients(self, count):
+        password = hash_password("patient123")
+        user_id = self._next_id(User)
+        patient_id = self._next_id(Patient)
+        first_patient = patient_id
+        users, patients = [], []
+
+        for i in range(count):
+            if i < len(DEMO_PATIENTS):
+                full_name, age, gender, blood, email = DEMO_PATIENTS[i]
+            else:
+                first, last = self.rng.choice(FIRST_NAMES), self.rng.choice(LAST_NAMES)
+                full_name = f"{first} {last}"
+                age = min(95, max(1, int(self.rng.gauss(40, 20))))
+                gender = self.rng.choice(["Male", "Female"])
+                blood = self.rng.choices(BLOOD_GROUPS, BLOOD_WEIGHTS)[0]
+                email = f"{first}.{last}.{i}@example.com".lower()
+            users.append({"id": user_id, "email": email, "password": password, "role": UserRole.PATIENT})
+            patients.append({
+                "id": patient_id,
+                "user_id": user_id,
+                "full_name": full_name,
+                "age": age,
+                "gender": gender,
+                "blood_group": blood,
+                "phone": f"555-{patient_id:07d}",
+            })
+            user_id += 1
+            patient_id += 1
+            if len(patients) >= self.chunk_size:
+                self._insert(User, users)
+                self._insert(Patient, patients)
+                users, patients = [], []
+
+        self._insert(User, users)
+        self._insert(Patient, patients)
+        return list(range(first_patient, patient_id))
+
+    # ---------------- APPOINTMENTS ----------------
+
+    def _free_slot(self, doctor, day):
+        """A random free slot of the doctor on that day, claimed; None if the day is full."""
+        mask = self.booked.get((doctor, day), 0)
+        free = [s for s in range(self.slots_per_day) if not mask & (1 << s)]
+        if not free:
+            return None
+        slot = self.rng.choice(free)
+        self.booked[(doctor, day)] = mask | (1 << slot)
+        return slot
+
+    def appointments(self, count, doctor_ids, patient_ids):
+        rng = self.rng
+        # Popularity is skewed: some doctors and some patients account for most visits
+        doctor_weights = list(accumulate(rng.lognormvariate(0, 0.6) for _ in doctor_ids))
+        patient_weights = list(accumulate(rng.paretovariate(1.5) for _ in patient_ids))
+        capacity = len(doctor_ids) * len(self.days) * self.slots_per_day
+        if count > capacity * 0.9:
+            raise SystemExit(f"{count} appointments do not fit in {capacity} slots; add doctors or days")
+
+        appointment_id = self._next_id(Appointment)
+        treatment_id = self._next_id(Treatment)
+        appointments, treatments = [], []
+        made = 0
+        # Nothing is booked after the dataset's "now": future visits were booked before today
+        booked_by = datetime.combine(self.today, datetime.min.time())
+
+        while made < count:
+            n = min(self.chunk_size, count - made)
+            doctors = rng.choices(range(len(doctor_ids)), cum_weights=doctor_weights, k=n)
+            patients = rng.choices(patient_ids, cum_weights=patient_weights, k=n)
+            for doctor, patient_id in zip(doctors, patients):
+                day_index = rng.randrange(len(self.days))
+                day = self.days[day_index]
+                statuses, weights = PAST_STATUSES if day < self.today else FUTURE_STATUSES
+                status = rng.choices(statuses, weights)[0]
+                if status == AP_Status.CANCELLED:
+                    # Cancelled rows keep their slot number but do not hold it
+                    slot = rng.randrange(self.slots_per_day)
+                else:
+                    slot = self._free_slot(doctor, day_index)
+                    if slot is None:
+                        continue
+                starts_at = datetime.combine(day, slot_start(self.schedule, slot))
+                # Most bookings are made a few days ahead, some weeks ahead
+                lead = timedelta(days=min(90, rng.expovariate(1 / 6)), minutes=rng.randrange(1440))
+                appointments.append({
+                    "id": appointment_id,
+                    "patient_id": patient_id,
+                    "doctor_id": doctor_ids[doctor],
+                    "date": day,
+                    "time": starts_at,
+                    "slot": slot,
+                    "created_at": min(starts_at, booked_by) - lead,
+                    "status": status,
+                })
+                if status == AP_Status.COMPLETED:
+                    for _ in range(2 if rng.random() < 0.1 else 1):
+                        treatments.append({
+                            "id": treatment_id,
+                            "appointment_id": appointment_id,
+                            "diagnosis": rng.choice(DIAGNOSES),
+                            "prescription": rng.choice(PRESCRIPTIONS),
+                            "notes": NOTES if rng.random() < 0.3 else None,
+                            "follow_up": rng.random() < 0.25,
+                            "created_at": starts_at + timedelta(minutes=20),
+                        })
+                        treatment_id += 1
+                appointment_id += 1
+                made += 1
+
+            self._insert(Appointment, appointments)
+            self._insert(Treatment, treatments)
+            db.session.commit()
+            appointments, treatments = [], []
+        return made
+
+
+def seed_database(app=None, doctors=5, patients=5, appointments=10, seed=42,
+                  today=None, days_back=14, days_ahead=14, chunk_size=10000):
+    app = app or create_app()
     with app.app_context():
         print("🌱 Starting database seeding...")
+        init_db()
 
-        # -----------------------
         # Prevent duplicate seeding
-        # -----------------------
         if Department.query.first():
             print("⚠️ Database already seeded. Skipping.")
             return
 
-        # -----------------------
-        # Create Admin
-        # -----------------------
+        started = timer.perf_counter()
         User.make_admin()
-
-        # -----------------------
-        # Departments
-        # -----------------------
-        dept_data = [
-            ("Cardiology", "Heart health and cardiovascular care."),
-            ("Pediatrics", "Medical care for infants and children."),
-            ("Neurology", "Nervous system and brain disorders."),
-            ("Orthopedics", "Bone and joint care."),
-            ("General Medicine", "Primary healthcare services."),
-        ]
-
-        departments = []
-        for name, desc in dept_data:
-            dept = Department(name=name, description=desc)
-            db.session.add(dept)
-            departments.append(dept)
-
-        db.session.flush()  # generate IDs
-
-        # -----------------------
-        # Doctors
-        # -----------------------
-        doctors_data = [
-            ("Dr. Sarah Chen", "MBBS, MD (Cardiology)", "sarah.chen@homa.com", 0),
-            ("Dr. James Wilson", "MBBS, DCH", "j.wilson@homa.com", 1),
-            ("Dr. Elena Rodriguez", "MBBS, DM (Neurology)", "elena.rod@homa.com", 2),
-            ("Dr. Marcus Thorne", "MBBS, MS (Ortho)", "m.thorne@homa.com", 3),
-            ("Dr. Alan Grant", "MBBS", "a.grant@homa.com", 4),
-        ]
-
-        doctors = []
-
-        for idx, (name, qualification, email, dept_idx) in enumerate(doctors_data, start=1):
-            user = User(
-                email=email,
-                password=generate_password_hash("doc123"),
-                role=UserRole.DOCTOR
-            )
-            db.session.add(user)
-            db.session.flush()
-
-            doctor = Doctor(
-                id=f"DOC-{dept_idx}-{user.id}",
-                user_id=user.id,
-                full_name=name,
-                qualification=qualification,
-                experience=random.randint(3, 15),
-                status=Doc_Status.AVAILABLE,
-                department_id=departments[dept_idx].id
-            )
-            db.session.add(doctor)
-            doctors.append(doctor)
-
-        # -----------------------
-        # Patients
-        # -----------------------
-        patients_data = [
-            ("John Doe", 34, "Male", "O+", "john.doe@gmail.com"),
-            ("Jane Smith", 29, "Female", "A-", "jane.smith@yahoo.com"),
-            ("Robert Brown", 52, "Male", "B+", "r.brown@outlook.com"),
-            ("Emily White", 19, "Female", "AB+", "e.white@provider.com"),
-            ("Michael Scott", 45, "Male", "O-", "m.scott@dunder.com"),
-        ]
-
-        patients = []
-
-        for name, age, gender, blood, email in patients_data:
-            user = User(
-                email=email,
-                password=generate_password_hash("patient123"),
-                role=UserRole.PATIENT
-            )
-            db.session.add(user)
-            db.session.flush()
-
-            patient = Patient(
-                user_id=user.id,
-                full_name=name,
-                age=age,
-                gender=gender,
-                blood_group=blood,
-                phone=f"555-{user.id:03d}"
-            )
-            db.session.add(patient)
-            patients.append(patient)
-
-        db.session.flush()
-
-        # -----------------------
-        # Appointments
-        # -----------------------
-        appointments = []
-
-        status_pool = (
-            [AP_Status.COMPLETED] * 4 +
-            [AP_Status.BOOKED] * 3 +
-            [AP_Status.CANCELLED] * 3
-        )
-
-        random.shuffle(status_pool)
-
-        for status in status_pool:
-            patient = random.choice(patients)
-            doctor = random.choice(doctors)
-
-            if status == AP_Status.COMPLETED:
-                ap_date = date.today() - timedelta(days=random.randint(1, 14))
-            else:
-                ap_date = date.today() + timedelta(days=random.randint(1, 14))
-
-            appointment = Appointment(
-                patient_id=patient.id,
-                doctor_id=doctor.id,
-                date=ap_date,
-                time=datetime.utcnow(),
-                status=status
-            )
-            db.session.add(appointment)
-            appointments.append(appointment)
-
-        db.session.flush()
-
-        # -----------------------
-        # Treatments (COMPLETED only)
-        # -----------------------
-        diagnoses = [
-            "Common Cold",
-            "Hypertension",
-            "Migraine",
-            "Type 2 Diabetes",
-            "Joint Pain"
-        ]
-
-        prescriptions = [
-            "Paracetamol 500mg twice daily",
-            "Amlodipine 5mg once daily",
-            "Ibuprofen after meals",
-            "Metformin 500mg twice daily",
-            "Physiotherapy and pain relievers"
-        ]
-
-        for ap in appointments:
-            if ap.status == AP_Status.COMPLETED:
-                treatment = Treatment(
-                    appointment_id=ap.id,
-                    diagnosis=random.choice(diagnoses),
-                    prescription=random.choice(prescriptions),
-                    notes="Patient advised rest, hydration, and follow-up if symptoms persist.",
-                    follow_up=random.choice([True, False])
-                )
-                db.session.add(treatment)
-
-        # -----------------------
-        # Commit
-        # -----------------------
+        gen = Generator(seed, today or date.today(), days_back, days_ahead, chunk_size)
+        department_ids = gen.departments()
+        doctor_ids = gen.doctors(doctors, department_ids)
+        patient_ids = gen.patients(patients)
         db.session.commit()
+        made = gen.appointments(appointments, doctor_ids, patient_ids)
+        treatments = Treatment.query.count()
+
+        rebuild_slot_days()
+        rebuild_search_index()
+        rebuild_stats()
+        elapsed = timer.perf_counter() - started
 
-        print("✅ Database seeded successfully!")
+        print(f"✅ Database seeded successfully in {elapsed:.1f}s!")
         print("   - 1 Admin")
-        print("   - 5 Departments")
-        print("   - 5 Doctors")
-        print("   - 5 Patients")
-        print("   - 10 Appointments (Booked / Completed / Cancelled)")
-        print("   - Treatments for completed appointments only")
+        print(f"   - {len(department_ids)} Departments")
+        print(f"   - {len(doctor_ids)} Doctors")
+        print(f"   - {len(patient_ids)} Patients")
+        print(f"   - {made} Appointments (Booked / Completed / Cancelled)")
+        print(f"   - {treatments} Treatments for completed appointments")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fill an empty database with synthetic data.")
+    parser.add_argument("--doctors", type=int, default=5)
+    parser.add_argument("--patients", type=int, default=5)
+    parser.add_argument("--appointments", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=42, help="Random seed; same seed, same data.")
+    parser.add_argument("--today", type=date.fromisoformat, help="Anchor date (YYYY-MM-DD), default today.")
+    parser.add_argument("--days-back", type=int, default=14, help="History length in days.")
+    parser.add_argument("--days-ahead", type=int, default=14, help="How far ahead bookings go.")
+    parser.add_argument("--chunk-size", type=int, default=10000)
+    args = parser.parse_args()
+    seed_database(
+        doctors=args.doctors, patients=args.patients, appointments=args.appointments,
+        seed=args.seed, today=args.today, days_back=args.days_back,
+        days_ahead=args.days_ahead, chunk_size=args.chunk_size,
+    )
 
 
 if __name__ == "__main__":
-    seed_database()
+    main()
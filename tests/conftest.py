@@ -0,0 +1,109 @@
+"""
+Shared fixtures: an app on a fresh SQLite file per test, with the schema
+from init_db(), and a small hospital to book against.
+"""
+from datetime import date, timedelta
+import pytest
+from werkzeug.security import generate_password_hash
+
+PASSWORD = "secret123"
+# Fast hashes; the hashing pool itself is exercised inline (HASH_WORKERS=0)
+HASH_METHOD = "pbkdf2:sha256:1000"
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.setenv("SQLALCHEMY_DATABASE_URI", f"sqlite:///{tmp_path / 'homa.sqlite3'}")
+    monkeypatch.setenv("SECRET_KEY", "test")
+    monkeypatch.setenv("HASH_WORKERS", "0")
+    monkeypatch.setenv("PASSWORD_HASH_METHOD", HASH_METHOD)
+    monkeypatch.delenv("DATABASE_REPLICA_URI", raising=False)
+
+    from app import create_app
+    from app.migrations import init_db
+    from app.models import db
+    from app.cache import reset_caches
+
+    reset_caches()
+    app = create_app()
+    app.config["TESTING"] = True
+    with app.app_context():
+        init_db()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+    reset_caches()
+
+
+@pytest.fixture
+def ctx(app):
+    """An app context for calling the modules directly."""
+    with app.app_context():
+        yield app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def hospital(app):
+    """One department with two doctors on the default schedule, and two patients; returns their ids."""
+    from app.models import db, User, Doctor, Patient, Department, UserRole, Doc_Status
+
+    with app.app_context():
+        department = Department(name="Cardiology")
+        db.session.add(department)
+        db.session.flush()
+        ids = {"department": department.id, "doctors": [], "patients": [], "patient_emails": []}
+        for n in range(2):
+            user = User(email=f"doctor{n}@homa.test", password=generate_password_hash(PASSWORD, HASH_METHOD),
+                        role=UserRole.DOCTOR)
+            db.session.add(user)
+            db.session.flush()
+            doctor = Doctor(id=f"DOC-{department.id}-{user.id}", user_id=user.id, full_name=f"Dr. {n}",
+                            department_id=department.id, status=Doc_Status.AVAILABLE)
+            db.session.add(doctor)
+            ids["doctors"].append(doctor.id)
+        for n in range(2):
+            email = f"patient{n}@homa.test"
+            user = User(email=email, password=generate_password_hash(PASSWORD, HASH_METHOD),
+                        role=UserRole.PATIENT)
+            db.session.add(user)
+            db.session.flush()
+            patient = Patient(user_id=user.id, full_name=f"Patient {n}", gender="F",
+                              phone=f"555-000{n}", age=30 + n)
+            db.session.add(patient)
+            db.session.flush()
+            ids["patients"].append(patient.id)
+            ids["patient_emails"].append(email)
+        db.session.commit()
+    return ids
+
+
+@pytest.fixture
+def admin_client(app, client):
+    """The test client, logged in as an admin."""
+    from app.models import db, User, UserRole
+
+    with app.app_context():
+        db.session.add(User(email="admin@homa.test", password=generate_password_hash(PASSWORD, HASH_METHOD),
+                            role=UserRole.ADMIN))
+        db.session.commit()
+    login(client, "admin@homa.test")
+    return client
+
+
+def working_day(days_ahead=7):
+    """The first Monday-to-Friday day at least `days_ahead` days from today."""
+    day = date.today() + timedelta(days=days_ahead)
+    while day.weekday() >= 5:
+        day += timedelta(days=1)
+    return day
+
+
+def login(client, email, password=PASSWORD):
+    return client.post("/login", data={"email": email, "password": password})
@@ -0,0 +1,118 @@
+from datetime import date, timedelta
+import pytest
+from app.models import db, Appointment, AP_Status, Treatment
+from conftest import working_day
+from test_stats import _assert_matches_rebuild
+
+
+def _create(hospital, slot_time="10:00", day=None, doctor=0, patient=0):
+    return {
+        "patient_id": hospital["patients"][patient],
+        "doctor_id": hospital["doctors"][doctor],
+        "date": (day or working_day()).isoformat(),
+        "time": slot_time,
+    }
+
+
+def _batch(client, **body):
+    response = client.post("/api/v1/appointments/batch", json=body)
+    return response.status_code, response.get_json()
+
+
+def _statuses(results):
+    return [r["status"] for r in results]
+
+
+def test_create_reports_each_item(client, hospital):
+    status, body = _batch(client, create=[
+        _create(hospital, "10:00"),
+        _create(hospital, "10:00", patient=1),   # same slot again
+        _create(hospital, "10:10"),              # not a slot boundary
+        {**_create(hospital), "doctor_id": "DOC-404"},
+        {"doctor_id": hospital["doctors"][0]},   # no date or time
+    ])
+    assert status == 200
+    assert _statuses(body["create"]) == [201, 409, 400, 404, 400]
+    assert body["create"][0]["id"]
+
+
+def test_update_and_delete(app, client, hospital):
+    _, created = _batch(client, create=[_create(hospital, "09:00"), _create(hospital, "09:30")])
+    first, second = (r["id"] for r in created["create"])
+
+    status, body = _batch(
+        client,
+        update=[{"id": first, "status": "CANCELLED"}, {"id": 999999, "status": "CANCELLED"},
+                {"id": second, "status": "LOST"}],
+        delete=[second, 999999],
+    )
+    assert status == 200
+    assert _statuses(body["update"]) == [200, 404, 400]
+    assert _statuses(body["delete"]) == [204, 404]
+    with app.app_context():
+        assert db.session.get(Appointment, first).status == AP_Status.CANCELLED
+        assert db.session.get(Appointment, second) is None
+
+
+def test_uncancelling_into_a_retaken_slot_conflicts(client, hospital):
+    _, created = _batch(client, create=[_create(hospital, "11:00")])
+    first = created["create"][0]["id"]
+    _batch(client, update=[{"id": first, "status": "CANCELLED"}])
+    _, retaken = _batch(client, create=[_create(hospital, "11:00", patient=1)])
+    assert _statuses(retaken["create"]) == [201]
+
+    _, body = _batch(client, update=[{"id": first, "status": "BOOKED"}])
+    assert _statuses(body["update"]) == [409]
+
+
+def test_too_many_operations(app, client, hospital):
+    app.config["API_BATCH_MAX"] = 2
+    status, _ = _batch(client, delete=[1, 2, 3])
+    assert status == 413
+
+
+@pytest.mark.parametrize("change", [
+    {"patient_id": None},
+    {"patient_id": 999999},
+    {"patient_id": "1"},
+    {"date": (date.today() - timedelta(days=30)).isoformat()},
+])
+def test_create_rejects_unknown_patients_and_past_slots(app, client, hospital, change):
+    status, body = _batch(client, create=[{**_create(hospital), **change}])
+    assert status == 200
+    assert _statuses(body["create"]) == [400]
+    with app.app_context():
+        assert Appointment.query.count() == 0
+
+
+def test_ids_must_be_integers(client, hospital):
+    _, created = _batch(client, create=[_create(hospital)])
+    appt_id = created["create"][0]["id"]
+
+    status, body = _batch(client, update=[{"id": [appt_id], "status": "CANCELLED"}, {"id": True, "status": "BOOKED"},
+                                          "junk", {"id": appt_id, "status": "COMPLETED"}],
+                          delete=[{"id": appt_id}, "1"])
+    assert status == 200
+    assert _statuses(body["update"]) == [400, 400, 400, 200]
+    assert _statuses(body["delete"]) == [400, 400]
+
+
+def test_malformed_batches(client, hospital):
+    assert client.post("/api/v1/appointments/batch", json=[1, 2]).status_code == 400
+    assert _batch(client, create={"patient_id": 1})[0] == 400
+
+
+def test_deleting_a_treated_appointment_detaches_its_treatments(app, client, hospital):
+    _, created = _batch(client, create=[_create(hospital, "09:00")])
+    appt_id = created["create"][0]["id"]
+    with app.app_context():
+        db.session.add(Treatment(appointment_id=appt_id, diagnosis="Flu", prescription="Rest"))
+        db.session.commit()
+
+    assert _statuses(_batch(client, delete=[appt_id])[1]["delete"]) == [204]
+    # SQLite hands the freed id to the next row
+    _, created = _batch(client, create=[_create(hospital, "09:00", patient=1)])
+    with app.app_context():
+        assert db.session.get(Appointment, created["create"][0]["id"]).treatments == []
+        assert Treatment.query.one().appointment_id is None
+        _assert_matches_rebuild()
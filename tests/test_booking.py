@@ -0,0 +1,137 @@
+from datetime import date, datetime, time, timedelta
+import pytest
+from app import booking
+from app.models import db, Appointment, AP_Status, Doctor, SlotDay
+from conftest import working_day
+
+
+def _doctor(hospital, n=0):
+    return db.session.get(Doctor, hospital["doctors"][n])
+
+
+def _mask(doctor_id, day):
+    row = db.session.get(SlotDay, (doctor_id, day))
+    return row.booked_mask if row else 0
+
+
+def test_book_slot_claims_the_slot(ctx, hospital):
+    day = working_day()
+    appt = booking.book_slot(hospital["patients"][0], _doctor(hospital), day, 3)
+    db.session.commit()
+
+    assert appt.status == AP_Status.BOOKED
+    assert appt.time.time() == time(10, 30)
+    assert _mask(hospital["doctors"][0], day) == 1 << 3
+
+
+def test_book_slot_rejects_a_taken_slot(ctx, hospital):
+    day = working_day()
+    booking.book_slot(hospital["patients"][0], _doctor(hospital), day, 3)
+    db.session.commit()
+
+    with pytest.raises(booking.SlotUnavailable):
+        booking.book_slot(hospital["patients"][1], _doctor(hospital), day, 3)
+
+
+@pytest.mark.parametrize("day, slot", [
+    (date.today() - timedelta(days=30), 0),  # in the past
+    (working_day() + timedelta(days=5 - working_day().weekday()), 0),  # a Saturday
+    (working_day(), 16),  # after the end of the day
+])
+def test_book_slot_rejects_slots_the_doctor_does_not_have(ctx, hospital, day, slot):
+    with pytest.raises(booking.SlotUnavailable):
+        booking.book_slot(hospital["patients"][0], _doctor(hospital), day, slot)
+
+
+def test_cancelling_frees_the_slot(ctx, hospital):
+    day = working_day()
+    appt = booking.book_slot(hospital["patients"][0], _doctor(hospital), day, 2)
+    booking.change_status(appt, AP_Status.CANCELLED)
+    db.session.commit()
+    assert _mask(hospital["doctors"][0], day) == 0
+
+    booking.book_slot(hospital["patients"][1], _doctor(hospital), day, 2)
+    db.session.commit()
+    with pytest.raises(booking.SlotUnavailable):
+        booking.change_status(appt, AP_Status.BOOKED)
+
+
+def test_next_free_slots_skips_taken_slots(ctx, hospital):
+    day = working_day()
+    doctor = _doctor(hospital)
+    booking.book_slot(hospital["patients"][0], doctor, day, 0)
+    db.session.commit()
+
+    slots = booking.next_free_slots([doctor], n=2, start=day)
+    assert [(s.date, s.slot) for s in slots] == [(day, 1), (day, 2)]
+
+
+def test_rebuild_slot_days_matches_live_appointments(ctx, hospital):
+    day = working_day()
+    booking.book_slot(hospital["patients"][0], _doctor(hospital), day, 1)
+    cancelled = booking.book_slot(hospital["patients"][1], _doctor(hospital), day, 4)
+    booking.change_status(cancelled, AP_Status.CANCELLED)
+    db.session.commit()
+
+    assert booking.rebuild_slot_days() == 1
+    assert _mask(hospital["doctors"][0], day) == 1 << 1
+    assert Appointment.query.count() == 2
+
+
+def _put(client, appt_id, **body):
+    return client.put(f"/api/v1/appointments/{appt_id}", json=body)
+
+
+def test_moving_to_the_same_date_is_a_no_op(app, client, hospital):
+    day = working_day()
+    with app.app_context():
+        appt_id = booking.book_slot(hospital["patients"][0], _doctor(hospital), day, 3).id
+        db.session.commit()
+
+    assert _put(client, appt_id, date=day.isoformat()).status_code == 200
+    with app.app_context():
+        assert _mask(hospital["doctors"][0], day) == 1 << 3
+
+
+def test_moving_keeps_the_slot_on_the_new_day(app, client, hospital):
+    day, new_day = working_day(), working_day(14)
+    with app.app_context():
+        appt_id = booking.book_slot(hospital["patients"][0], _doctor(hospital), day, 3).id
+        db.session.commit()
+
+    assert _put(client, appt_id, date=new_day.isoformat()).status_code == 200
+    with app.app_context():
+        assert (_mask(hospital["doctors"][0], day), _mask(hospital["doctors"][0], new_day)) == (0, 1 << 3)
+
+
+@pytest.mark.parametrize("new_day", [
+    date.today() - timedelta(days=400),
+    working_day() + timedelta(days=5 - working_day().weekday()),  # a Saturday
+])
+def test_moving_to_a_day_without_the_slot_is_rejected(app, client, hospital, new_day):
+    day = working_day()
+    with app.app_context():
+        appt_id = booking.book_slot(hospital["patients"][0], _doctor(hospital), day, 3).id
+        db.session.commit()
+
+    assert _put(client, appt_id, date=new_day.isoformat()).status_code == 400
+    with app.app_context():
+        assert db.session.get(Appointment, appt_id).date == day
+
+
+def test_rebuild_backfills_legacy_slots(ctx, hospital):
+    day = working_day()
+    doctor_id = hospital["doctors"][0]
+    legacy = [
+        Appointment(patient_id=hospital["patients"][0], doctor_id=doctor_id, date=day,
+                    time=datetime.combine(day, t), status=AP_Status.BOOKED)
+        for t in (time(9, 30), time(9, 30), time(9, 45))  # a double booking and an off-grid time
+    ]
+    db.session.add_all(legacy)
+    db.session.commit()
+
+    booking.rebuild_slot_days()
+    assert [db.session.get(Appointment, a.id).slot for a in legacy] == [1, None, None]
+    assert _mask(doctor_id, day) == 1 << 1
+    with pytest.raises(booking.SlotUnavailable):
+        booking.book_slot(hospital["patients"][1], _doctor(hospital), day, 1)
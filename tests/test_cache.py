@@ -0,0 +1,12 @@
+from app import history, identity, reports, versions
+from app.cache import TTLCache, reset_caches
+from app.routes import auth
+
+
+def test_reset_caches_empties_every_cache():
+    caches = [identity.identity_cache, history.history_cache, reports.report_cache, versions.version_cache,
+              auth.typeahead_cache, TTLCache()]
+    for cache in caches:
+        cache.set("key", "value")
+    reset_caches()
+    assert all(cache.get("key") is None for cache in caches)
@@ -0,0 +1,82 @@
+import csv
+import io
+import json
+from datetime import datetime, time, timedelta
+import pytest
+from app.models import db, Appointment, AP_Status, Department, Doctor, Treatment, User, UserRole
+from conftest import working_day
+
+
+@pytest.fixture
+def visits(app, hospital):
+    """A completed visit with a treatment, a booked one a week later, and a cancelled one in another department."""
+    day = working_day()
+    with app.app_context():
+        surgery = Department(name="Surgery")
+        user = User(email="surgeon@homa.test", password="x", role=UserRole.DOCTOR)
+        db.session.add_all([surgery, user])
+        db.session.flush()
+        surgeon = Doctor(id=f"DOC-{surgery.id}-{user.id}", user_id=user.id, full_name="Dr. Cut",
+                         department_id=surgery.id)
+        db.session.add(surgeon)
+        rows = [
+            (hospital["doctors"][0], day, AP_Status.COMPLETED),
+            (hospital["doctors"][1], day + timedelta(days=7), AP_Status.BOOKED),
+            (surgeon.id, day, AP_Status.CANCELLED),
+        ]
+        appointments = [Appointment(patient_id=hospital["patients"][0], doctor_id=doctor_id, date=when,
+                                    time=datetime.combine(when, time(9)), status=status)
+                        for doctor_id, when, status in rows]
+        db.session.add_all(appointments)
+        db.session.flush()
+        db.session.add(Treatment(appointment_id=appointments[0].id, diagnosis="Flu", prescription="Rest"))
+        db.session.commit()
+        return {"day": day, "appointments": [a.id for a in appointments], "surgery": surgery.id}
+
+
+def _export(client, kind, **args):
+    response = client.get(f"/admin/export/{kind}", query_string=args)
+    assert response.status_code == 200
+    return response
+
+
+def _csv_ids(response):
+    return [int(row["id"]) for row in csv.DictReader(io.StringIO(response.get_data(as_text=True)))]
+
+
+def test_csv_export(admin_client, visits):
+    response = _export(admin_client, "appointments")
+    assert response.mimetype == "text/csv"
+    assert "appointments.csv" in response.headers["Content-Disposition"]
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    assert [int(row["id"]) for row in rows] == visits["appointments"]
+    assert rows[0]["status"] == "COMPLETED" and rows[0]["department"] == "Cardiology"
+    assert rows[0]["date"] == visits["day"].isoformat()
+
+
+def test_ndjson_export(admin_client, visits):
+    response = _export(admin_client, "treatments", format="ndjson")
+    assert response.mimetype == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert len(lines) == 1
+    assert lines[0]["appointment_id"] == visits["appointments"][0]
+    assert lines[0]["diagnosis"] == "Flu" and lines[0]["follow_up"] is False
+
+
+def test_filters(admin_client, visits):
+    ids = visits["appointments"]
+    day = visits["day"].isoformat()
+    assert _csv_ids(_export(admin_client, "appointments", **{"from": day, "to": day})) == [ids[0], ids[2]]
+    assert _csv_ids(_export(admin_client, "appointments", department=visits["surgery"])) == [ids[2]]
+    assert _csv_ids(_export(admin_client, "appointments", status="booked")) == [ids[1]]
+
+
+@pytest.mark.parametrize("args", [
+    {"from": "yesterday"}, {"to": "2024-13-01"}, {"department": "cardio"}, {"status": "LOST"}, {"format": "xml"},
+])
+def test_bad_filters_are_rejected(admin_client, visits, args):
+    assert admin_client.get("/admin/export/appointments", query_string=args).status_code == 400
+
+
+def test_unknown_kind(admin_client, visits):
+    assert admin_client.get("/admin/export/patients").status_code == 400
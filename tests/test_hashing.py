@@ -0,0 +1,49 @@
+import time
+import pytest
+from app import hashing
+from conftest import HASH_METHOD
+
+
+def _slow(seconds):
+    time.sleep(seconds)
+
+
+def test_a_hash_that_takes_too_long_is_busy(monkeypatch):
+    monkeypatch.setattr(hashing, "TIMEOUT_SECONDS", 0.2)
+    pool = hashing.HashingPool(workers=1, max_pending=1, method=HASH_METHOD)
+    try:
+        with pytest.raises(hashing.HashingBusy):
+            pool._run(_slow, 1)
+        assert pool.stats()["rejected"] == 1
+
+        # The abandoned job still occupies the pool process, so it keeps its slot
+        assert pool.stats()["in_flight"] == 1
+        with pytest.raises(hashing.HashingBusy):
+            pool.hash("next")
+        time.sleep(1.2)
+        assert pool.stats()["in_flight"] == 0
+        assert pool.hash("next")
+    finally:
+        pool.shutdown()
+
+
+def test_default_pool_splits_the_cpus_between_web_workers(monkeypatch):
+    monkeypatch.setattr(hashing.os, "cpu_count", lambda: 8)
+    monkeypatch.setenv("WEB_CONCURRENCY", "4")
+    assert hashing.HashingPool().workers == 2
+    monkeypatch.setenv("WEB_CONCURRENCY", "16")
+    assert hashing.HashingPool().workers == 1
+    monkeypatch.delenv("WEB_CONCURRENCY")
+    assert hashing.HashingPool().workers == 8
+
+
+def test_reconfiguring_shuts_the_old_pool_down(app):
+    old = hashing.HashingPool(workers=1, method=HASH_METHOD)
+    old.hash("warm up")
+    executor = old._executor
+    hashing.pool = old
+
+    hashing.configure(app)
+    assert hashing.pool is not old and old._executor is None
+    with pytest.raises(RuntimeError):
+        executor.submit(_slow, 0)
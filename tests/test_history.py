@@ -0,0 +1,71 @@
+from datetime import date, datetime, time, timedelta
+import pytest
+from app import history, lifecycle
+from app.models import db, Appointment, AP_Status, Treatment
+
+
+@pytest.fixture
+def treated(app, hospital):
+    """A past BOOKED appointment of patient 0 that already has a treatment; returns its id."""
+    day = date.today() - timedelta(days=3)
+    with app.app_context():
+        appt = Appointment(patient_id=hospital["patients"][0], doctor_id=hospital["doctors"][0], date=day,
+                           time=datetime.combine(day, time(9)), status=AP_Status.BOOKED)
+        db.session.add(appt)
+        db.session.flush()
+        db.session.add(Treatment(appointment_id=appt.id, diagnosis="Flu", prescription="Rest"))
+        db.session.commit()
+        return appt.id
+
+
+def _statuses(patient_id):
+    return [entry["status"] for entry in history.timeline(patient_id).entries]
+
+
+def test_a_change_made_by_another_worker_is_picked_up(app, hospital, treated):
+    patient_id = hospital["patients"][0]
+    with app.test_request_context():
+        assert _statuses(patient_id) == ["booked"]
+        # What another worker still holds after this one writes without telling it
+        stale = history.history_cache.get(patient_id)
+
+        db.session.get(Appointment, treated).status = AP_Status.CANCELLED
+        db.session.commit()
+        history.history_cache.set(patient_id, stale)
+
+        assert _statuses(patient_id) == ["cancelled"]
+
+
+def test_lifecycle_no_shows_reach_cached_timelines(app, hospital, treated):
+    patient_id = hospital["patients"][0]
+    with app.test_request_context():
+        assert _statuses(patient_id) == ["booked"]
+        assert lifecycle.expire_stale(date.today()) == 1
+        assert _statuses(patient_id) == ["no_show"]
+
+
+def test_new_bookings_keep_timelines_cached(app, hospital, treated):
+    patient_id = hospital["patients"][0]
+    with app.test_request_context():
+        history.timeline(patient_id)
+        cached = history.history_cache.get(patient_id)
+        db.session.add(Appointment(patient_id=patient_id, doctor_id=hospital["doctors"][1], date=date.today()))
+        db.session.commit()
+        history.timeline(patient_id)
+        assert history.history_cache.get(patient_id) is cached
+
+
+def test_recorded_treatments_are_folded_in(app, hospital, treated):
+    patient_id = hospital["patients"][0]
+    with app.test_request_context():
+        history.timeline(patient_id)
+        appt = db.session.get(Appointment, treated)
+        treatment = Treatment(appointment_id=appt.id, diagnosis="Cough", prescription="Tea")
+        appt.status = AP_Status.COMPLETED
+        db.session.add(treatment)
+        db.session.commit()
+        history.record_treatment(treatment, appt)
+
+        folded = history.history_cache.get(patient_id)
+        assert history.timeline(patient_id) is folded[1]
+        assert [e["diagnosis"] for e in folded[1].entries] == ["Cough", "Flu"]
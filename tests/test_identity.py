@@ -0,0 +1,29 @@
+from app import identity
+from app.models import db, Patient, User
+
+
+def _user_id(hospital):
+    return db.session.get(Patient, hospital["patients"][0]).user_id
+
+
+def test_hits_are_served_from_the_cache(app, hospital):
+    with app.test_request_context():
+        user_id = _user_id(hospital)
+        identity.load_identity(user_id)
+        first = identity.identity_cache.get(user_id)
+        identity.load_identity(user_id)
+        assert identity.identity_cache.get(user_id) is first
+
+
+def test_a_change_made_by_another_worker_is_picked_up(app, hospital):
+    with app.test_request_context():
+        user_id = _user_id(hospital)
+        identity.load_identity(user_id)
+        # What another worker still holds after this one writes without telling it
+        stale = identity.identity_cache.get(user_id)
+
+        db.session.get(User, user_id).is_blocked = True
+        db.session.commit()
+        identity.identity_cache.set(user_id, stale)
+
+        assert identity.load_identity(user_id).is_blocked
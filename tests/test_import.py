@@ -0,0 +1,67 @@
+import io
+import threading
+import pytest
+from app import hashing
+from app.bulk_import import NOT_IMPORTED, import_records
+from app.models import User, UserRole
+from conftest import HASH_METHOD
+
+CSV = "email,password,full_name,gender,phone,age\n" + "".join(
+    f"new{n}@homa.test,pw{n},New {n},F,555-1{n:03},40\n" for n in range(3)
+)
+
+
+def _upload(client, body):
+    return client.post("/admin/import/patients", data={"file": (io.BytesIO(body.encode()), "patients.csv")},
+                       content_type="multipart/form-data")
+
+
+def test_upload_is_imported(app, admin_client):
+    response = _upload(admin_client, CSV)
+    assert response.status_code == 200 and response.get_json() == {"imported": 3, "errors": []}
+    with app.app_context():
+        assert User.query.filter_by(role=UserRole.PATIENT).count() == 3
+
+
+def test_oversized_upload_is_rejected(app, admin_client):
+    app.config["IMPORT_MAX_BYTES"] = len(CSV) // 2
+    assert _upload(admin_client, CSV).status_code == 413
+    with app.app_context():
+        assert User.query.filter_by(role=UserRole.PATIENT).count() == 0
+
+
+def test_bounded_batches_wait_for_queue_slots():
+    pool = hashing.HashingPool(workers=0, max_pending=1, method=HASH_METHOD)
+    pool._slots.acquire()
+    # A login frees its slot while the batch is waiting for it
+    threading.Timer(0.2, pool._slots.release).start()
+    assert len(pool.hash_many(["a", "b"], bounded=True)) == 2
+    assert pool.stats()["completed"] == 2 and pool.stats()["rejected"] == 0
+
+
+def test_bounded_batches_give_up_when_the_queue_stays_full(monkeypatch):
+    monkeypatch.setattr(hashing, "TIMEOUT_SECONDS", 0.1)
+    pool = hashing.HashingPool(workers=0, max_pending=1, method=HASH_METHOD)
+    pool._slots.acquire()
+    with pytest.raises(hashing.HashingBusy):
+        pool.hash_many(["a"], bounded=True)
+
+
+def test_a_busy_queue_returns_a_partial_report(app, monkeypatch):
+    calls = []
+
+    def hash_many(passwords, bounded=False):
+        # The first chunk gets through; then the logins take every slot
+        calls.append(1)
+        if len(calls) > 1:
+            raise hashing.HashingBusy("Too many password operations in progress")
+        return [f"hash:{p}" for p in passwords]
+
+    monkeypatch.setattr(hashing.pool, "hash_many", hash_many)
+    rows = CSV + "".join(f"late{n}@homa.test,pw,Late {n},F,555-2{n:03},40\n" for n in range(3))
+    with app.app_context():
+        report = import_records("patients", io.StringIO(rows), "csv", chunk_size=2, bounded=True)
+        assert report["imported"] == 2
+        assert [e["line"] for e in report["errors"]] == [4, 5, 6, 7]
+        assert {e["error"] for e in report["errors"]} == {NOT_IMPORTED}
+        assert User.query.filter_by(role=UserRole.PATIENT).count() == 2
@@ -0,0 +1,41 @@
+import json
+import logging
+import time
+import pytest
+from flask import g
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from app import instrumentation
+from app.models import db
+
+
+def test_request_summary_reaches_the_log(client, hospital, caplog):
+    # Nothing configured by the deployment: the app must still give the logger somewhere to write
+    assert instrumentation.logger.handlers and instrumentation.logger.isEnabledFor(logging.INFO)
+
+    with caplog.at_level(logging.INFO, logger="homa.sql"):
+        client.get("/api/v1/doctors")
+    summary = json.loads(next(r.getMessage() for r in caplog.records if r.name == "homa.sql"))
+    assert summary["event"] == "request_sql" and summary["route"] == "api_bp.get_doctors"
+    assert summary["queries"] >= 1
+
+
+def test_log_level_comes_from_config(monkeypatch, app):
+    monkeypatch.setenv("SQL_LOG_LEVEL", "WARNING")
+    from app import create_app
+    create_app()
+    assert not instrumentation.logger.isEnabledFor(logging.INFO)
+    instrumentation.logger.setLevel(app.config["SQL_LOG_LEVEL"])
+
+
+def test_failed_statements_do_not_skew_later_timings(app):
+    with app.test_request_context():
+        g.sql_stats = instrumentation.RequestStats()
+        with db.engine.connect() as conn:
+            with pytest.raises(OperationalError):
+                conn.execute(text("SELECT * FROM no_such_table"))
+            time.sleep(0.2)
+            conn.execute(text("SELECT 1"))
+            # Nothing of the failed statement is left on the pooled connection
+            assert not conn.info.get("query_started")
+        assert g.sql_stats.count == 1 and g.sql_stats.total < 0.1
@@ -0,0 +1,64 @@
+import pytest
+from app.models import db, Doctor, User, UserRole
+from app.pagination import decode_cursor, encode_cursor
+
+
+@pytest.fixture
+def doctors(app, hospital):
+    """Five doctors in id order."""
+    with app.app_context():
+        for n in range(3):
+            user = User(email=f"extra{n}@homa.test", password="x", role=UserRole.DOCTOR)
+            db.session.add(user)
+            db.session.flush()
+            db.session.add(Doctor(id=f"DOC-9-{user.id}", user_id=user.id, full_name=f"Extra {n}",
+                                  department_id=hospital["department"]))
+        db.session.commit()
+        return [d.id for d in Doctor.query.order_by(Doctor.id)]
+
+
+def _page(client, **args):
+    response = client.get("/api/v1/doctors", query_string=args)
+    assert response.status_code == 200
+    body = response.get_json()
+    return [d["id"] for d in body["doctors"]], body
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor("DOC-1-2")) == "DOC-1-2"
+    assert decode_cursor(encode_cursor(42)) == 42
+
+
+def test_pages_forward_and_back(client, doctors):
+    first, body = _page(client, limit=2)
+    assert first == doctors[:2] and body["prev_cursor"] is None
+
+    second, body = _page(client, limit=2, after=body["next_cursor"])
+    assert second == doctors[2:4]
+
+    last, body = _page(client, limit=2, after=body["next_cursor"])
+    assert last == doctors[4:] and body["next_cursor"] is None
+
+    back, _ = _page(client, limit=2, before=body["prev_cursor"])
+    assert back == doctors[2:4]
+
+
+def test_garbage_cursor_starts_from_the_first_page(client, doctors):
+    ids, _ = _page(client, limit=2, after="not a cursor!")
+    assert ids == doctors[:2]
+
+
+@pytest.mark.parametrize("value", [[1], {"id": 1}, 1.5, True, None])
+def test_non_scalar_cursors_are_invalid(value):
+    assert decode_cursor(encode_cursor(value)) is None
+
+
+def test_non_scalar_cursor_starts_from_the_first_page(client, doctors):
+    ids, _ = _page(client, limit=2, after=encode_cursor([1]))
+    assert ids == doctors[:2]
+
+
+def test_non_scalar_cursor_on_the_async_api(client, doctors):
+    response = client.get("/api/async/v1/doctors", query_string={"limit": 2, "after": encode_cursor({"id": 1})})
+    assert response.status_code == 200
+    assert [d["id"] for d in response.get_json()["doctors"]] == doctors[:2]
@@ -0,0 +1,40 @@
+import pytest
+from app import booking
+from app.models import db, AP_Status, Doctor, Treatment
+from benchmarks.routes import QueryCounter
+from conftest import login, working_day
+
+
+def _add_visits(hospital, days_ahead, count):
+    """`count` completed visits with a treatment each, plus one upcoming visit, on the day `days_ahead` away."""
+    day = working_day(days_ahead)
+    for slot in range(count):
+        doctor = db.session.get(Doctor, hospital["doctors"][slot % 2])
+        appt = booking.book_slot(hospital["patients"][0], doctor, day, slot)
+        db.session.flush()
+        appt.status = AP_Status.COMPLETED
+        db.session.add(Treatment(appointment_id=appt.id, diagnosis="Flu", prescription="Rest"))
+    booking.book_slot(hospital["patients"][0], db.session.get(Doctor, hospital["doctors"][0]), day, count)
+    db.session.commit()
+
+
+def _queries(app, client, url):
+    with app.app_context():
+        counter = QueryCounter(db.engine)
+    response = client.get(url)
+    assert response.status_code == 200
+    return counter.count
+
+
+@pytest.mark.parametrize("url", ["/patient/dashboard", "/patient/history"])
+def test_statement_count_does_not_grow_with_the_history(app, client, hospital, url):
+    login(client, hospital["patient_emails"][0])
+    with app.app_context():
+        _add_visits(hospital, 7, 2)
+    client.get(url)  # warm the identity and version caches
+    few = _queries(app, client, url)
+
+    with app.app_context():
+        _add_visits(hospital, 14, 6)
+    client.get(url)
+    assert _queries(app, client, url) == few
@@ -0,0 +1,46 @@
+import sqlite3
+import pytest
+from app.database import REPLICA_BIND
+from app.models import db, Department
+
+
+@pytest.fixture
+def lagging_replica(app, hospital, tmp_path, monkeypatch):
+    """An app whose replica is a snapshot of the primary taken now; later writes only reach the primary."""
+    primary = app.config["SQLALCHEMY_DATABASE_URI"].removeprefix("sqlite:///")
+    replica = tmp_path / "replica.sqlite3"
+    with sqlite3.connect(primary) as src, sqlite3.connect(replica) as dst:
+        src.backup(dst)
+    monkeypatch.setenv("DATABASE_REPLICA_URI", f"sqlite:///{replica}")
+
+    from app import create_app
+    replicated = create_app()
+    replicated.debug = True
+    with replicated.app_context():
+        db.session.get(Department, hospital["department"]).name = "Neurology"
+        db.session.commit()
+    yield replicated
+    with replicated.app_context():
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+    # db is module-global: later apps without the bind must not try to create its tables
+    db.metadatas.pop(REPLICA_BIND, None)
+
+
+def test_etag_matches_the_replica_the_body_came_from(lagging_replica):
+    client = lagging_replica.test_client()
+    response = client.get("/api/v1/doctors")
+    assert {d["specialization"] for d in response.get_json()["doctors"]} == {"Cardiology"}
+
+    # The primary has moved on; the replica's body must not carry the primary's version
+    with lagging_replica.test_request_context():
+        from app import versions
+        primary_version = versions.current_version("doctors")
+    assert not response.headers["ETag"].strip('"').startswith(f"doctors{primary_version}-")
+
+
+def test_replica_queries_are_instrumented(lagging_replica):
+    response = lagging_replica.test_client().get("/api/v1/doctors")
+    # The version counters and the page, both read from the replica
+    assert response.headers["X-DB-Queries"] == "2"
@@ -0,0 +1,37 @@
+from app.models import db, Department, Doctor, User, UserRole
+from app.routes.auth import search_results
+
+
+def _doctor(department_id, n, name):
+    user = User(email=f"doctor-{department_id}-{n}@homa.test", password="x", role=UserRole.DOCTOR)
+    db.session.add(user)
+    db.session.flush()
+    db.session.add(Doctor(id=f"DOC-{department_id}-{user.id}", user_id=user.id, full_name=name,
+                          department_id=department_id))
+
+
+def test_department_filter_applies_before_the_limit(ctx, hospital):
+    surgery = Department(name="Surgery")
+    db.session.add(surgery)
+    db.session.flush()
+    # Many short, better-ranked matches elsewhere, and two long ones in Cardiology
+    for n in range(60):
+        _doctor(surgery.id, n, f"Dr. Smith {n}")
+    for n in range(2):
+        _doctor(hospital["department"], n, f"Dr. Anna Maria Smith-Whitworth Cardiology Fellow {n}")
+    db.session.commit()
+
+    results = search_results(UserRole.PATIENT, "smith", "Cardiology", limit=8)
+    assert len(results) == 2
+    assert {d.department.name for d in results} == {"Cardiology"}
+    assert len(search_results(UserRole.PATIENT, "smith", "", limit=8)) == 8
+
+
+def test_search_bar_lists_departments_by_name(app, admin_client, hospital):
+    with app.app_context():
+        db.session.add(Department(name="Anaesthesia", description="x" * 1000))
+        db.session.commit()
+    for url in ("/admin/dashboard", "/search"):
+        page = admin_client.get(url).get_data(as_text=True)
+        assert page.index('<option value="Anaesthesia">') < page.index('<option value="Cardiology">')
+        assert "x" * 1000 not in page
@@ -0,0 +1,76 @@
+from sqlalchemy import event, select
+from app import booking, stats
+from app.models import db, Appointment, AP_Status, DepartmentStats, Doctor, DoctorDayStats, DoctorDayTreatments, \
+    Treatment
+from conftest import working_day
+
+
+def _snapshot():
+    """Every summary row, zero counts dropped (a rebuild does not keep them)."""
+    days = {(r.doctor_id, r.date, r.status): r.count for r in DoctorDayStats.query if r.count}
+    treated = {(r.doctor_id, r.date): (r.treatments, r.follow_ups) for r in DoctorDayTreatments.query
+               if r.treatments or r.follow_ups}
+    departments = {r.department_id: (r.doctors, r.treatments) for r in DepartmentStats.query}
+    return days, treated, departments
+
+
+def _assert_matches_rebuild():
+    incremental = _snapshot()
+    stats.rebuild_stats()
+    assert incremental == _snapshot()
+
+
+def test_orm_writes_match_a_rebuild(ctx, hospital):
+    day = working_day()
+    doctor = db.session.get(Doctor, hospital["doctors"][0])
+    done = booking.book_slot(hospital["patients"][0], doctor, day, 0)
+    moved = booking.book_slot(hospital["patients"][1], doctor, day, 1)
+    cancelled = booking.book_slot(hospital["patients"][1], doctor, day, 2)
+    db.session.commit()
+
+    done.status = AP_Status.COMPLETED
+    db.session.add_all([
+        Treatment(appointment_id=done.id, diagnosis="Flu", prescription="Rest", follow_up=True),
+        Treatment(appointment_id=moved.id, diagnosis="Cold", prescription="Tea"),
+    ])
+    booking.change_status(cancelled, AP_Status.CANCELLED)
+    booking.move_to_date(moved, working_day(14))
+    db.session.commit()
+
+    assert db.session.get(DoctorDayStats, (doctor.id, day, AP_Status.COMPLETED)).count == 1
+    assert db.session.get(DoctorDayTreatments, (doctor.id, day)).follow_ups == 1
+    _assert_matches_rebuild()
+
+    db.session.delete(db.session.get(Appointment, done.id).treatments[0])
+    db.session.delete(cancelled)
+    db.session.commit()
+    _assert_matches_rebuild()
+
+
+def test_batch_writes_match_a_rebuild(app, client, hospital):
+    day = working_day().isoformat()
+    response = client.post("/api/v1/appointments/batch", json={"create": [
+        {"patient_id": hospital["patients"][0], "doctor_id": hospital["doctors"][n % 2], "date": day,
+         "time": f"{9 + n}:00"} for n in range(4)
+    ]})
+    ids = [r["id"] for r in response.get_json()["create"]]
+    client.post("/api/v1/appointments/batch", json={
+        "update": [{"id": ids[0], "status": "COMPLETED"}, {"id": ids[1], "status": "CANCELLED"}],
+        "delete": [ids[2]],
+    })
+
+    with app.app_context():
+        assert db.session.scalar(select(DepartmentStats.doctors)) == 2
+        _assert_matches_rebuild()
+
+
+def test_counters_are_one_upsert_per_key(ctx, hospital):
+    key = {"doctor_id": hospital["doctors"][0], "date": working_day(), "status": AP_Status.BOOKED}
+    statements = []
+    event.listen(db.engine, "before_cursor_execute", lambda conn, cursor, sql, *args: statements.append(sql))
+    stats.add_appointments([tuple(key.values())] * 2)
+    stats.add_appointments([tuple(key.values())], sign=-1)
+
+    # No UPDATE-then-INSERT: the first two writers of a new key cannot collide
+    assert len(statements) == 2 and all("ON CONFLICT" in sql for sql in statements)
+    assert db.session.scalar(select(DoctorDayStats.count).filter_by(**key)) == 1
@@ -0,0 +1,25 @@
+from sqlalchemy import event
+from app import versions
+from app.models import db
+
+
+def test_bump_is_one_upsert_per_collection(ctx):
+    statements = []
+    event.listen(db.engine, "before_cursor_execute", lambda conn, cursor, sql, *args: statements.append(sql))
+    versions.bump("doctors", "appointments")
+    versions.bump("doctors")
+    db.session.commit()
+
+    assert len(statements) == 3 and all("ON CONFLICT" in sql for sql in statements)
+    assert (versions.current_version("doctors"), versions.current_version("appointments")) == (2, 1)
+
+
+def test_etag_changes_after_a_write(client, hospital):
+    first = client.get("/api/v1/doctors")
+    assert client.get("/api/v1/doctors", headers={"If-None-Match": first.headers["ETag"]}).status_code == 304
+
+    response = client.post("/api/v1/doctors", json={
+        "email": "new@homa.test", "password": "pw", "full_name": "Dr. New", "department_id": hospital["department"],
+    })
+    assert response.status_code == 201
+    assert client.get("/api/v1/doctors", headers={"If-None-Match": first.headers["ETag"]}).status_code == 200